@@ -0,0 +1,122 @@
+"""
+Compare the old tuple -> pandas.DataFrame path with the Arrow-native path used
+by utils.db.fetch_arrow / run_sql, on synthetic rows shaped like the
+main.py demand listing (ints, names, TEXT, DATE, DATETIME and ENUM columns).
+
+Only the in-process conversion is timed: both paths receive the same
+cursor.fetchmany() tuples, so network and server time are identical.
+st.dataframe() serialises pandas frames to Arrow internally, so the
+"tuples -> DataFrame -> Arrow" column is the real cost of the old path.
+
+Usage:
+    python benchmarks/bench_arrow_results.py [--rows 10000 100000 1000000] [--json out.json]
+"""
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+from mysql.connector import FieldFlag, FieldType
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.columnar import batches_to_table, rows_to_record_batch  # noqa: E402
+
+BATCH_SIZE = 10000
+
+DESCRIPTION = [
+    ("ID", FieldType.LONG, None, None, None, None, 0, FieldFlag.PRI_KEY, 63),
+    ("DemandName", FieldType.VAR_STRING, None, None, None, None, 0, 0, 255),
+    ("Description", FieldType.BLOB, None, None, None, None, 1, FieldFlag.BLOB, 255),
+    ("ReceivedDate", FieldType.DATE, None, None, None, None, 0, 0, 63),
+    ("Status", FieldType.STRING, None, None, None, None, 0, FieldFlag.ENUM, 255),
+    ("Phase", FieldType.STRING, None, None, None, None, 0, FieldFlag.ENUM, 255),
+    ("TimeRaised", FieldType.DATETIME, None, None, None, None, 1, 0, 63),
+    ("Company", FieldType.VAR_STRING, None, None, None, None, 1, 0, 255),
+]
+COLUMNS = [column[0] for column in DESCRIPTION]
+
+
+def synthetic_rows(count, seed=7):
+    rng = random.Random(seed)
+    start = datetime.datetime(2022, 1, 1)
+    statuses = ["Active", "Paused", "Abandoned"]
+    phases = ["Identify", "Discovery", "Planning", "Delivery", "Live"]
+    rows = []
+    for i in range(count):
+        raised = start + datetime.timedelta(minutes=rng.randrange(1_000_000))
+        rows.append((
+            i + 1,
+            f"Demand {i}",
+            "Lorem ipsum dolor sit amet " * rng.randint(1, 6),
+            raised.date(),
+            rng.choice(statuses),
+            rng.choice(phases),
+            raised,
+            f"Company {rng.randrange(60)}",
+        ))
+    return rows
+
+
+def batches(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def tuples_to_dataframe(rows):
+    # The old path: fetchall() tuples, then pd.DataFrame, then st.dataframe's own Arrow conversion.
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    return pa.Table.from_pandas(df)
+
+
+def tuples_to_arrow(rows):
+    return batches_to_table([rows_to_record_batch(DESCRIPTION, batch) for batch in batches(rows)])
+
+
+def tuples_to_arrow_to_pandas(rows):
+    return tuples_to_arrow(rows).to_pandas()
+
+
+def best_of(fn, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rows':>10} {'tuples->DF->Arrow':>18} {'tuples->Arrow':>14} {'Arrow->pandas':>14} {'speedup':>8}")
+    for count in args.rows:
+        rows = synthetic_rows(count)
+        repeat = 1 if count >= 1_000_000 else args.repeat
+        baseline = best_of(tuples_to_dataframe, rows, repeat)
+        arrow = best_of(tuples_to_arrow, rows, repeat)
+        arrow_pandas = best_of(tuples_to_arrow_to_pandas, rows, repeat)
+        results.append({
+            "rows": count,
+            "tuples_to_dataframe_to_arrow_s": baseline,
+            "tuples_to_arrow_s": arrow,
+            "tuples_to_arrow_to_pandas_s": arrow_pandas,
+        })
+        print(f"{count:>10} {baseline:>17.3f}s {arrow:>13.3f}s {arrow_pandas:>13.3f}s {baseline / arrow:>7.2f}x")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
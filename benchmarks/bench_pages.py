@@ -0,0 +1,180 @@
+"""
+Time the data functions behind each page against the seeded benchmark database.
+
+Each case runs --repeat times after one warm-up call; the SQL Agent result
+cache is cleared before every run_sql call so the database path is measured.
+Results are written as JSON, and --compare prints the change against an
+earlier run so regressions stand out.
+
+Usage:
+    python benchmarks/seed_data.py          # once
+    python benchmarks/bench_pages.py [--repeat 10] [--json bench.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+from common import add_connection_args, configure_db
+
+from utils import db, queries  # noqa: E402
+
+# Analytics questions of the kind the SQL Agent produces
+SQL_AGENT_QUERIES = {
+    "run_sql_active_by_company": """
+        SELECT c.Name AS Company, COUNT(*) AS ActiveDemands
+        FROM Demand d JOIN Company c ON d.CompanyID = c.ID
+        WHERE d.Status = 'Active'
+        GROUP BY c.Name ORDER BY ActiveDemands DESC
+    """,
+    "run_sql_pending_issues_per_pm": """
+        SELECT e.Name AS ProjectManager, COUNT(*) AS PendingIssues
+        FROM Issues i
+        JOIN Demand d ON i.DemandID = d.ID
+        JOIN Employee e ON d.ProjectManagerID = e.ID
+        WHERE i.Status = 'Pending'
+        GROUP BY e.Name ORDER BY PendingIssues DESC
+    """,
+    "run_sql_recent_status_updates": """
+        SELECT d.Name, s.Date, s.Description
+        FROM Status s JOIN Demand d ON s.DemandID = d.ID
+        ORDER BY s.Date DESC
+    """,
+}
+
+
+def pick_fixtures():
+    """A project manager with many demands and that PM's busiest demand."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT E.Email, COUNT(*) AS n FROM Demand D JOIN Employee E ON D.ProjectManagerID = E.ID
+            GROUP BY E.Email ORDER BY n DESC LIMIT 1
+        """)
+        pm_email, _ = cursor.fetchone()
+        cursor.execute("""
+            SELECT DemandID, COUNT(*) AS n FROM Milestone GROUP BY DemandID ORDER BY n DESC LIMIT 1
+        """)
+        demand_id, _ = cursor.fetchone()
+        cursor.execute("SELECT DATE(MAX(Date)) FROM Milestone WHERE DemandID = %s", (demand_id,))
+        (busy_day,) = cursor.fetchone()
+    finally:
+        db.release_connection(cursor, conn)
+    return pm_email, demand_id, busy_day or date.today()
+
+
+def row_count(result):
+    if hasattr(result, "num_rows"):
+        return result.num_rows
+    if isinstance(result, tuple) and len(result) == 2:
+        columns, rows = result
+        if columns is None:
+            raise RuntimeError(rows)
+        return len(rows)
+    return len(result) if hasattr(result, "__len__") else 1
+
+
+def build_cases(pm_email, demand_id, busy_day):
+    def run_sql(query):
+        def call():
+            db._result_cache().clear()
+            return db.run_sql(query, stream=True)
+        return call
+
+    cases = {
+        "fetch_all_demands": queries.all_demands,
+        "fetch_issues_admin": lambda: queries.issues(None, True),
+        "fetch_issues_pm": lambda: queries.issues(pm_email, False),
+        "fetch_issues_pending_admin": lambda: queries.issues(None, True, only_pending=True),
+        "fetch_risks_admin": lambda: queries.risks(None, True),
+        "fetch_risks_pm": lambda: queries.risks(pm_email, False),
+        "get_employee_id": lambda: queries.employee_id(pm_email),
+        "get_milestones": lambda: queries.milestones(demand_id),
+        "get_status_updates": lambda: queries.status_updates(demand_id),
+        "get_next_available_datetime": lambda: queries.next_available_datetime(demand_id, busy_day),
+    }
+    cases.update({name: run_sql(query) for name, query in SQL_AGENT_QUERIES.items()})
+    return cases
+
+
+def measure(fn, repeat):
+    rows = row_count(fn())  # warm-up: pool connections, buffer pool, caches
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "rows": rows,
+        "runs": repeat,
+        "min_s": timings[0],
+        "median_s": statistics.median(timings),
+        "p95_s": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+        "mean_s": statistics.fmean(timings),
+    }
+
+
+def compare(results, baseline_path, threshold):
+    baseline = {case["name"]: case for case in json.loads(Path(baseline_path).read_text())["results"]}
+    regressions = 0
+    print(f"\n{'case':<32} {'baseline':>10} {'now':>10} {'change':>8}")
+    for case in results:
+        before = baseline.get(case["name"])
+        if not before:
+            continue
+        change = case["median_s"] / before["median_s"] - 1 if before["median_s"] else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        regressions += bool(flag)
+        print(f"{case['name']:<32} {before['median_s'] * 1000:>8.1f}ms {case['median_s'] * 1000:>8.1f}ms {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--only", nargs="+", help="run only these cases")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare medians against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="median slowdown reported as a regression (default 0.2 = 20%%)")
+    add_connection_args(parser)
+    args = parser.parse_args()
+
+    configure_db(args)
+    pm_email, demand_id, busy_day = pick_fixtures()
+    cases = build_cases(pm_email, demand_id, busy_day)
+    if args.only:
+        cases = {name: fn for name, fn in cases.items() if name in args.only}
+
+    results = []
+    print(f"{'case':<32} {'rows':>8} {'median':>10} {'p95':>10}")
+    for name, fn in cases.items():
+        result = {"name": name, **measure(fn, args.repeat)}
+        results.append(result)
+        print(f"{name:<32} {result['rows']:>8} {result['median_s'] * 1000:>8.1f}ms {result['p95_s'] * 1000:>8.1f}ms")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "host": args.host,
+                "database": args.database,
+                "repeat": args.repeat,
+                "fixtures": {"pm_email": pm_email, "demand_id": demand_id, "busy_day": str(busy_day)},
+            },
+            "results": results,
+        }, indent=2))
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Measure how much question-aware schema pruning shrinks the SQL Agent prompt,
+and whether the pruned schema still covers what a correct answer needs.
+
+For each question in sql_agent_questions.json the full and the pruned schema
+block are rendered and their size compared. "Covered" means every table and
+column the reference SQL uses is still in the pruned block, i.e. the model
+was shown enough to write that query. Token counts are approximate (words
+and punctuation marks, which tracks BPE counts closely for schema text).
+
+By default the schema comes from the migrations, so no database is needed;
+--live introspects the benchmark database instead.
+
+Usage:
+    python benchmarks/bench_schema_pruning.py [--live] [--json out.json] [--verbose]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from common import add_connection_args, configure_db
+
+from utils import prompts  # noqa: E402
+from utils.migrate import expected_schema  # noqa: E402
+from utils.sqltext import referenced_tables, tokenize  # noqa: E402
+
+QUESTIONS = Path(__file__).resolve().parent / "sql_agent_questions.json"
+
+
+def missing_from(pruned, schema, sql):
+    """Tables and Table.Column references of `sql` that the pruned schema lacks."""
+    by_lower = {table.lower(): table for table in schema}
+    tables = [by_lower[t] for t in referenced_tables(sql) if t in by_lower]
+    missing = [t for t in tables if t not in pruned]
+    words = {text.strip("`") for kind, text in tokenize(sql) if kind in ("word", "ident")}
+    for column in sorted(words):
+        owners = [t for t in tables if column in schema[t]["columns"]]
+        if owners and not any(column in pruned.get(t, {}).get("columns", {}) for t in owners):
+            missing.append(f"{owners[0]}.{column}")
+    return missing
+
+
+def load_schema(args):
+    if not args.live:
+        return expected_schema(normalize=False)
+    from utils import db
+
+    configure_db(args)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        return prompts.introspect(cursor)
+    finally:
+        db.release_connection(cursor, conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="introspect the benchmark database instead of reading the migrations")
+    parser.add_argument("--questions", default=str(QUESTIONS))
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="print the tables picked for each question")
+    add_connection_args(parser)
+    args = parser.parse_args()
+
+    schema = {t: spec for t, spec in load_schema(args).items() if t not in prompts.INTERNAL_TABLES}
+    full_tokens = prompts.approx_tokens(prompts.render_schema(schema))
+    questions = json.loads(Path(args.questions).read_text())
+
+    results = []
+    print(f"{'question':<58} {'tables':>6} {'tokens':>7} {'saved':>6}  covered")
+    for case in questions:
+        started = time.perf_counter()
+        pruned = prompts.prune_schema(schema, case["question"])
+        elapsed = time.perf_counter() - started
+        tokens = prompts.approx_tokens(prompts.render_schema(pruned))
+        missing = missing_from(pruned, schema, case["sql"])
+        results.append({
+            "question": case["question"],
+            "tables": sorted(pruned),
+            "tokens": tokens,
+            "saved": 1 - tokens / full_tokens,
+            "covered": not missing,
+            "missing": missing,
+            "prune_ms": elapsed * 1000,
+        })
+        status = "yes" if not missing else "NO: " + ", ".join(missing)
+        print(f"{case['question'][:58]:<58} {len(pruned):>6} {tokens:>7} {1 - tokens / full_tokens:>6.0%}  {status}")
+        if args.verbose:
+            print(f"    {', '.join(sorted(pruned))}")
+
+    covered = sum(r["covered"] for r in results)
+    summary = {
+        "questions": len(results),
+        "full_schema_tokens": full_tokens,
+        "median_pruned_tokens": statistics.median(r["tokens"] for r in results),
+        "mean_saved": statistics.fmean(r["saved"] for r in results),
+        "coverage": covered / len(results),
+        "mean_prune_ms": statistics.fmean(r["prune_ms"] for r in results),
+    }
+    print(
+        f"\nfull schema ~{full_tokens} tokens; pruned median ~{summary['median_pruned_tokens']:.0f} "
+        f"({summary['mean_saved']:.0%} saved on average); covered {covered}/{len(results)}; "
+        f"pruning takes {summary['mean_prune_ms']:.2f}ms"
+    )
+    if args.json:
+        Path(args.json).write_text(json.dumps({"summary": summary, "results": results}, indent=2))
+    return 0 if covered == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Offline accuracy and latency suite for the SQL Agent.
+
+Every question in sql_agent_questions.json is sent through utils.llm.call_llm
+exactly as the page sends it, and for each one the suite reports:
+
+    valid     the answer contains a SELECT that MySQL runs without error
+    correct   it returns the same rows as the reference SQL (column names,
+              column order and row order are ignored)
+    tokens    approximate prompt size (system prompt with the pruned schema + question)
+    latency   LLM time, query time and their sum
+
+Where the answers come from (--llm):
+
+    stub      benchmarks/stub_llm_server.py, started in-process; it answers
+              with the reference SQL, so this measures the plumbing (default)
+    live      the endpoint in .streamlit/secrets.toml (or --api-url/--model/--api-key)
+    record    like live, and every response is saved under --fixtures
+    replay    only the saved responses; no network, no API key
+
+The prompt schema is pinned to the migrations so fixtures recorded on one
+machine replay on another; --live-schema introspects the database instead
+(record and replay must then agree on it). With --no-db, queries are not
+run: validity only checks that a SELECT came back and correctness is not
+measured.
+
+Usage:
+    python benchmarks/seed_data.py          # once
+    python benchmarks/bench_sql_agent.py --llm record --api-url ... --model ... --api-key ...
+    python benchmarks/bench_sql_agent.py --llm replay [--replay-latency] [--json out.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import math
+import statistics
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from common import ROOT, add_connection_args, configure_db
+
+import stub_llm_server  # noqa: E402
+from utils import db, llm, llm_transport, prompts  # noqa: E402
+from utils.helpers import extract_sql_from_response  # noqa: E402
+from utils.migrate import expected_schema  # noqa: E402
+from utils.sqltext import is_select  # noqa: E402
+
+QUESTIONS = Path(__file__).resolve().parent / "sql_agent_questions.json"
+FIXTURES = Path(__file__).resolve().parent / "llm_fixtures"
+PROMPT = str(ROOT / "prompts" / "sql_assistant.txt")
+REPLAY_URL = "http://llm-replay.invalid/v1/chat/completions"
+
+
+def configure_llm(args):
+    """Point utils.llm at the endpoint and transport --llm asks for; returns the stub server, if any."""
+    if args.llm == "stub":
+        server = stub_llm_server.serve(latency=args.stub_latency)
+        llm.configure(stub_llm_server.url(server), args.model or "stub")
+        return server
+    if args.api_url or args.model:
+        llm.configure(args.api_url or REPLAY_URL, args.model or "replay", args.api_key or "")
+    if args.llm in ("record", "replay"):
+        llm_transport.configure(args.llm, args.fixtures, replay_latency=args.replay_latency)
+    return None
+
+
+def _value(value):
+    """A comparable form of one result cell: numbers by value, dates as ISO text, bytes decoded."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8", "replace")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "isoformat"):  # pandas Timestamp
+        return value.isoformat()
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return round(float(value), 6)
+    if hasattr(value, "item"):  # numpy scalar
+        return _value(value.item())
+    return str(value)
+
+
+def result_rows(df):
+    """Rows of a run_sql DataFrame as a sorted list of tuples, each row's cells sorted too."""
+    rows = [tuple(sorted((_value(v) for v in row), key=repr)) for row in df.itertuples(index=False, name=None)]
+    return sorted(rows, key=repr)
+
+
+def run(sql):
+    """(DataFrame or None, error, seconds) for one query, bypassing the result cache."""
+    db._result_cache().clear()
+    started = time.perf_counter()
+    columns, result = db.run_sql(sql, stream=True)
+    elapsed = time.perf_counter() - started
+    return (result, None, elapsed) if columns else (None, str(result), elapsed)
+
+
+def evaluate(case, args, references):
+    question = case["question"]
+    messages = llm._messages(question, PROMPT, [])
+    outcome = {
+        "question": question,
+        "prompt_tokens": sum(prompts.approx_tokens(m["content"]) for m in messages),
+        "sql": None,
+        "valid": False,
+        "correct": None,
+        "error": None,
+        "llm_s": 0.0,
+        "sql_s": 0.0,
+    }
+
+    started = time.perf_counter()
+    response = llm.call_llm(question, prompt_path=PROMPT, use_cache=False)
+    outcome["llm_s"] = time.perf_counter() - started
+    sql = extract_sql_from_response(response)
+    outcome["sql"] = sql
+    if response.startswith("LLM Error"):
+        outcome["error"] = response
+    elif not sql or sql.strip().upper() == "INVALID QUERY":
+        outcome["error"] = "no SQL in the answer"
+    elif not is_select(sql):
+        outcome["error"] = "not a SELECT"
+    elif args.no_db:
+        outcome["valid"] = True
+    else:
+        df, error, outcome["sql_s"] = run(sql)
+        outcome["valid"] = error is None
+        outcome["error"] = error
+        if df is not None:
+            if question not in references:
+                expected, ref_error, _ = run(case["sql"])
+                if ref_error:
+                    raise RuntimeError(f"Reference SQL failed for {question!r}: {ref_error}")
+                references[question] = result_rows(expected)
+            outcome["correct"] = result_rows(df) == references[question]
+            if df.attrs.get("truncated"):
+                outcome["error"] = "result truncated; compared the first rows only"
+    outcome["total_s"] = outcome["llm_s"] + outcome["sql_s"]
+    return outcome
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize(results, no_db):
+    totals = [r["total_s"] for r in results]
+    summary = {
+        "questions": len(results),
+        "validity": sum(r["valid"] for r in results) / len(results),
+        "accuracy": None if no_db else sum(bool(r["correct"]) for r in results) / len(results),
+        "median_prompt_tokens": statistics.median(r["prompt_tokens"] for r in results),
+        "median_llm_s": statistics.median(r["llm_s"] for r in results),
+        "median_total_s": statistics.median(totals),
+        "p95_total_s": percentile(totals, 0.95),
+    }
+    return summary
+
+
+def compare(summary, baseline_path, threshold):
+    """Print the change against an earlier --json run; returns the number of regressions."""
+    before = json.loads(Path(baseline_path).read_text())["summary"]
+    regressions = 0
+    print(f"\n{'metric':<22} {'baseline':>10} {'now':>10}")
+    for metric in ("validity", "accuracy"):
+        if before.get(metric) is None or summary[metric] is None:
+            continue
+        flag = "  REGRESSION" if summary[metric] < before[metric] else ""
+        regressions += bool(flag)
+        print(f"{metric:<22} {before[metric]:>10.0%} {summary[metric]:>10.0%}{flag}")
+    for metric in ("median_total_s", "p95_total_s"):
+        change = summary[metric] / before[metric] - 1 if before[metric] else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        regressions += bool(flag)
+        print(f"{metric:<22} {before[metric] * 1000:>8.1f}ms {summary[metric] * 1000:>8.1f}ms {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", choices=("stub", "live", "record", "replay"), default="stub")
+    parser.add_argument("--fixtures", default=str(FIXTURES), help="where record saves and replay reads responses")
+    parser.add_argument("--replay-latency", action="store_true", help="wait as long as the recorded response took")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds the stub waits before answering")
+    parser.add_argument("--api-url", help="chat completions URL (default: secrets.toml)")
+    parser.add_argument("--model", help="model name (default: secrets.toml; replay needs the recorded one)")
+    parser.add_argument("--api-key")
+    parser.add_argument("--questions", default=str(QUESTIONS))
+    parser.add_argument("--live-schema", action="store_true", help="build prompts from the database instead of the migrations")
+    parser.add_argument("--no-db", action="store_true", help="do not run any SQL; validity is checked on the text only")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="latency increase reported as a regression (default 0.2 = 20%%)")
+    add_connection_args(parser)
+    args = parser.parse_args()
+
+    if not args.no_db:
+        configure_db(args)
+    if not args.live_schema:
+        prompts.pin_schema(expected_schema(normalize=False))
+    server = configure_llm(args)
+
+    questions = json.loads(Path(args.questions).read_text())
+    results, references = [], {}
+    print(f"{'question':<52} {'tokens':>6} {'valid':>5} {'correct':>7} {'llm':>9} {'total':>9}")
+    try:
+        for case in questions:
+            outcome = evaluate(case, args, references)
+            results.append(outcome)
+            correct = "-" if outcome["correct"] is None else "yes" if outcome["correct"] else "NO"
+            print(
+                f"{case['question'][:52]:<52} {outcome['prompt_tokens']:>6} {'yes' if outcome['valid'] else 'NO':>5} "
+                f"{correct:>7} {outcome['llm_s'] * 1000:>7.0f}ms {outcome['total_s'] * 1000:>7.0f}ms"
+            )
+            if outcome["error"]:
+                print(f"    {outcome['error'].splitlines()[0][:100]}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    summary = summarize(results, args.no_db)
+    accuracy = "not measured" if summary["accuracy"] is None else f"{summary['accuracy']:.0%}"
+    print(
+        f"\nvalid {summary['validity']:.0%}, correct {accuracy} of {summary['questions']} questions; "
+        f"prompt ~{summary['median_prompt_tokens']:.0f} tokens (median); "
+        f"latency median {summary['median_total_s'] * 1000:.0f}ms, p95 {summary['p95_total_s'] * 1000:.0f}ms"
+    )
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "llm": args.llm,
+                "schema": "live" if args.live_schema else "migrations",
+                "database": None if args.no_db else args.database,
+            },
+            "summary": summary,
+            "results": results,
+        }, indent=2))
+    if args.compare:
+        return 1 if compare(summary, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""Connection options shared by the benchmark scripts (local MySQL from docker-compose.yml)."""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def add_connection_args(parser):
+    group = parser.add_argument_group("database (defaults match benchmarks/docker-compose.yml)")
+    group.add_argument("--host", default="127.0.0.1")
+    group.add_argument("--port", type=int, default=3307)
+    group.add_argument("--user", default="quokka")
+    group.add_argument("--password", default="quokka")
+    group.add_argument("--database", default="quokka_bench")
+
+
+def configure_db(args):
+    """Point utils.db at the benchmark database and return its connect() arguments."""
+    from utils import db
+
+    db.configure(args.host, args.port, args.user, args.password, args.database)
+    return db.db_config()
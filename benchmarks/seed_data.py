@@ -0,0 +1,190 @@
+"""
+Fill a local database with synthetic data at production-like volume.
+
+The schema comes from migrations/ (applied first), the values follow the
+enums and relationships the pages rely on: project managers own a share of
+the demands, Milestone/Status rows are spread one per minute per demand, and
+about a third of Issues/Risks are still pending. At --scale 1:
+
+    Employee 3,000   Company 60   Vendor 200   Demand 30,000   DAB 30,000
+    Milestone ~300,000   Status ~300,000   Issues 150,000   Risk 150,000
+
+Every employee can log in with the password "benchmark";
+admin@example.com is an admin and pm1@example.com .. pmN@example.com are the
+project managers. The same --seed always produces the same rows.
+
+Usage:
+    python benchmarks/seed_data.py [--scale 1.0] [--seed 7] [--truncate]
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import bcrypt
+import mysql.connector
+
+from common import add_connection_args, configure_db
+
+from utils.migrate import load_migrations, migrate  # noqa: E402
+
+CHUNK = 5000
+# Child tables first so TRUNCATE never trips over a foreign key
+TABLES = ["Issues", "Risk", "Status", "Milestone", "DAB", "Meeting", "Proposal", "Demand", "Vendor", "Company", "Employee"]
+
+WORDS = (
+    "platform rollout vendor integration data migration workflow approval dashboard "
+    "pilot budget sign-off security review onboarding training license renewal "
+    "automation sensor analytics model accuracy delay dependency stakeholder "
+    "procurement contract scope change testing deployment go-live support handover"
+).split()
+SECTORS = [
+    "Purification", "Hand Protection", "Agriculture", "BPO", "Plantations", "Investments and Services",
+    "Eco Solutions", "Textile Manufacturing", "Consumer & Retail", "Leisure", "Construction Materials",
+    "Industrial Solutions", "Power & Energy", "Transportation and Logistics", "Tea Exports", "Projects and Engineering",
+]
+DOMAINS = [
+    "Workflow Automation", "Application Modernization", "IOT Driven Digitalization", "AI and Machine Learning",
+    "Digital Literacy and Learning", "Data Intelligence & Analytics", "Agriculture Process Automation",
+]
+LEVELS = ["Low", "Medium", "High"]
+
+
+def sentence(rng, low=6, high=24):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+
+def insert(cursor, conn, table, columns, rows):
+    """Insert an iterable of rows in CHUNK-sized multi-row INSERTs. Returns the count."""
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    total, chunk = 0, []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            cursor.executemany(sql, chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        cursor.executemany(sql, chunk)
+        total += len(chunk)
+    conn.commit()
+    return total
+
+
+def employees(rng, count, pm_count, password_hash):
+    yield ("Benchmark Admin", "Administrator", "admin@example.com", "0770000000", "Active", "Projects and Engineering", "Head Office", password_hash, 1)
+    for i in range(1, count):
+        email = f"pm{i}@example.com" if i <= pm_count else f"employee{i}@example.com"
+        title = "Project Manager" if i <= pm_count else rng.choice(["Analyst", "Engineer", "Executive", "Manager"])
+        status = "Resigned" if rng.random() < 0.05 else "Active"
+        yield (f"Employee {i}", title, email, f"07{rng.randrange(10**8):08d}", status, rng.choice(SECTORS), f"Company {rng.randrange(60)}", password_hash, 0)
+
+
+def demands(rng, count, companies, vendors, employee_count, pm_count):
+    start = date(2019, 1, 1)
+    for i in range(count):
+        received = start + timedelta(days=rng.randrange(6 * 365))
+        status = rng.choices(["Active", "Paused", "Abandoned"], weights=[7, 2, 1])[0]
+        phase = rng.choice(["Identify", "Discovery", "Planning", "Delivery", "Live"])
+        # A few project managers carry most of the portfolio
+        pm = 2 + int(rng.betavariate(1, 4) * pm_count)
+        yield (
+            f"Demand {i + 1}", sentence(rng, 20, 80), received, status,
+            received + timedelta(days=rng.randrange(60, 720)) if phase == "Live" else None,
+            sentence(rng) if status == "Abandoned" else None,
+            phase, rng.randint(1, companies), rng.choice(DOMAINS), rng.choice(["Implementation", "Advisory"]),
+            rng.choice(LEVELS), sentence(rng), rng.choice(LEVELS), rng.choice(LEVELS), rng.choice(LEVELS),
+            f"{rng.randint(1, 18)} months", pm, rng.randint(1, employee_count), rng.randint(1, employee_count),
+            rng.randint(1, vendors) if rng.random() < 0.6 else None, rng.randint(1, employee_count),
+            f"Sponsor {rng.randrange(200)}",
+        )
+
+
+def timeline(rng, demand_count, per_demand, make_row):
+    """Rows keyed (DemandID, Date) with distinct minutes per demand."""
+    for demand_id in range(1, demand_count + 1):
+        day = datetime(2019, 1, 1) + timedelta(days=rng.randrange(6 * 365))
+        for _ in range(rng.randint(0, 2 * per_demand)):
+            day += timedelta(days=rng.randrange(0, 21), minutes=rng.randrange(1, 600))
+            yield make_row(demand_id, day)
+
+
+def raised(rng, count, demand_count, employee_count):
+    """Issues/Risk rows; TimeRaised steps forward so the primary key never collides."""
+    moment = datetime(2019, 1, 1)
+    for _ in range(count):
+        moment += timedelta(seconds=rng.randint(1, 600))
+        pending = rng.random() < 0.35
+        yield (
+            rng.randint(1, employee_count), rng.randint(1, demand_count), moment, sentence(rng),
+            "Pending" if pending else "Resolved",
+            None if pending else sentence(rng),
+            None if pending else moment + timedelta(days=rng.randint(1, 60)),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every row count by this factor")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--truncate", action="store_true", help="empty the tables before loading")
+    add_connection_args(parser)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    n = lambda count: max(1, int(count * args.scale))  # noqa: E731
+    employee_count, pm_count, company_count, vendor_count = n(3000), n(150), 60, n(200)
+    demand_count, raised_count = n(30_000), n(150_000)
+
+    conn = mysql.connector.connect(**configure_db(args))
+    cursor = conn.cursor()
+    applied = migrate(conn, load_migrations())
+    print(f"Applied {len(applied)} migration(s)")
+
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    cursor.execute("SET SESSION unique_checks = 0")
+    if args.truncate:
+        for table in TABLES:
+            cursor.execute(f"TRUNCATE TABLE {table}")
+
+    password_hash = bcrypt.hashpw(b"benchmark", bcrypt.gensalt()).decode("utf-8")
+    steps = [
+        ("Employee", ["Name", "Title", "Email", "PhoneNumber", "Status", "BusinessSector", "Company", "Password", "IsAdmin"],
+         employees(rng, employee_count, pm_count, password_hash)),
+        ("Company", ["Name", "SectorCategory", "OwnerName", "Description"],
+         ((f"Company {i}", rng.choice(SECTORS), f"Owner {i}", sentence(rng)) for i in range(company_count))),
+        ("Vendor", ["VendorName", "Description", "ServiceCategory", "ContactPersonName", "ContactPersonPhoneNumber", "ContactPersonEmail"],
+         ((f"Vendor {i}", sentence(rng), rng.choice(DOMAINS), f"Contact {i}", "0110000000", f"contact{i}@vendor.example")
+          for i in range(vendor_count))),
+        ("Demand", ["Name", "Description", "ReceivedDate", "Status", "GoLiveDate", "AbandonmentReason", "Phase",
+                    "CompanyID", "DeliveryDomain", "ServiceCategory", "CompanyPriority", "CompanyValueDescription",
+                    "CompanyValueClassification", "ImplementationComplexity", "ImplementationCostEstimate",
+                    "ImplementationDuration", "ProjectManagerID", "OwnerID", "ProductOwnerID", "VendorID", "DTOwnerID",
+                    "ProjectSponsor"],
+         demands(rng, demand_count, company_count, vendor_count, employee_count, pm_count)),
+        ("DAB", ["DemandID", "Date", "Status", "Notes"],
+         ((d, date(2019, 1, 1) + timedelta(days=rng.randrange(6 * 365)), rng.choice(["Approved", "Rejected"]), sentence(rng))
+          for d in range(1, demand_count + 1))),
+        ("Milestone", ["DemandID", "Date", "Description", "AchievedOrNot"],
+         timeline(rng, demand_count, 10, lambda d, at: (d, at, sentence(rng), rng.choice(["Achieved", "Not Achieved"])))),
+        ("Status", ["DemandID", "Date", "Description", "UpdatedBy"],
+         timeline(rng, demand_count, 10, lambda d, at: (d, at, sentence(rng, 10, 60), rng.randint(1, employee_count)))),
+        ("Issues", ["EmployeeID", "DemandID", "TimeRaised", "IssueDescription", "Status", "ResolutionDescription", "ResolutionTime"],
+         raised(rng, raised_count, demand_count, employee_count)),
+        ("Risk", ["EmployeeID", "DemandID", "TimeRaised", "RiskDescription", "Status", "ResolutionDescription", "ResolutionTime"],
+         raised(rng, raised_count, demand_count, employee_count)),
+    ]
+    for table, table_columns, rows in steps:
+        started = time.perf_counter()
+        count = insert(cursor, conn, table, table_columns, rows)
+        print(f"{table:<10} {count:>9,} rows in {time.perf_counter() - started:6.1f}s")
+
+    for table in TABLES:
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
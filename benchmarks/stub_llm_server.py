@@ -0,0 +1,132 @@
+"""
+A local stand-in for the LLM endpoint, speaking the OpenAI chat completions
+format (plain and streamed, with usage).
+
+The reply to a question from sql_agent_questions.json is its reference SQL in
+a ```sql fence; anything else gets INVALID QUERY. That makes the SQL Agent
+runnable without an API key: useful for checking the plumbing and measuring
+everything except the model. --latency and --chunk-delay imitate a real
+model's time to first token and generation speed.
+
+Usage:
+    python benchmarks/stub_llm_server.py [--port 8765] [--latency 0.8] [--chunk-delay 0.02]
+    # then in .streamlit/secrets.toml: [llm] api_url = "http://127.0.0.1:8765/v1/chat/completions"
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from common import ROOT  # noqa: F401  (puts the repository on sys.path)
+
+from utils.llm_cache import normalize_question  # noqa: E402
+from utils.prompts import approx_tokens  # noqa: E402
+
+QUESTIONS = Path(__file__).resolve().parent / "sql_agent_questions.json"
+
+
+def load_answers(path=QUESTIONS):
+    """{normalized question: reply} for every case in the question file."""
+    return {
+        normalize_question(case["question"]): f"```sql\n{case['sql']}\n```"
+        for case in json.loads(Path(path).read_text())
+    }
+
+
+def _chunks(text):
+    """Split a reply roughly the way a model streams it: words with their trailing whitespace."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def make_handler(answers, latency=0.0, chunk_delay=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def do_POST(self):
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                messages = body["messages"]
+            except (ValueError, KeyError):
+                return self._send_json(400, {"error": {"message": "expected a chat completions request"}})
+            question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+            reply = answers.get(normalize_question(question), "INVALID QUERY")
+            usage = {
+                "prompt_tokens": sum(approx_tokens(m["content"]) for m in messages),
+                "completion_tokens": approx_tokens(reply),
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            time.sleep(latency)
+            if body.get("stream"):
+                self._stream(body.get("model"), reply, usage)
+            else:
+                choices = [
+                    {"index": i, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                    for i in range(int(body.get("n", 1)))
+                ]
+                self._send_json(200, {"object": "chat.completion", "model": body.get("model"), "choices": choices, "usage": usage})
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _event(self, payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def _stream(self, model, reply, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in _chunks(reply):
+                self._event(json.dumps({"object": "chat.completion.chunk", "model": model,
+                                        "choices": [{"index": 0, "delta": {"content": chunk}}]}))
+                time.sleep(chunk_delay)
+            self._event(json.dumps({"object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage}))
+            self._event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=0, answers=None, latency=0.0, chunk_delay=0.0):
+    """Start the stub in a background thread; returns the server (its URL is url(server))."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(answers or load_answers(), latency, chunk_delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--questions", default=str(QUESTIONS))
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte of every reply")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    args = parser.parse_args()
+
+    server = serve(args.port, load_answers(args.questions), args.latency, args.chunk_delay)
+    print(f"Stub LLM listening on {url(server)} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
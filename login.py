@@ -2,27 +2,12 @@ import streamlit as st
 import mysql.connector
 import bcrypt
 import os
-
-# Load DB credentials from secrets.toml
-DB_HOST = st.secrets["db"]["host"]
-DB_NAME = st.secrets["db"]["name"]
-DB_USER = st.secrets["db"]["user"]
-DB_PASS = st.secrets["db"]["pass"]
-DB_PORT = int(st.secrets["db"]["port"])  # Ensure it's an integer
+from utils import db, prepared
 
 def get_connection():
+    """Borrow a pooled connection, reporting failures in the UI. Returns None on failure."""
     try:
-        # If using Railway's public URL (gondola.proxy...), enable SSL
-        ssl_required = "proxy.rlwy.net" in DB_HOST
-
-        return mysql.connector.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME,
-            ssl_disabled=not ssl_required
-        )
+        return db.get_connection()
     except mysql.connector.Error as e:
         st.error(f"❌ Database connection failed: {e}")
         return None
@@ -52,17 +37,9 @@ def login_gate():
             st.warning("⚠️ Please enter both email and password")
             return
 
-        conn = get_connection()
-        if not conn:
-            return
-
         try:
-            cursor = conn.cursor()
-            # Fetch Name, Password, IsAdmin
-            cursor.execute("SELECT Name, Password, IsAdmin FROM Employee WHERE Email = %s", (email,))
-            result = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            # Fetch Name, Password, IsAdmin (from the primary, so a new account or password works at once)
+            result = prepared.fetch_one("login_by_email", (email,), read_only=False)
 
             if result:
                 name, stored_password, is_admin = result
@@ -0,0 +1,141 @@
+-- Baseline schema as the application reads and writes it.
+-- Supersedes the hand-written DDL in Tables_info.txt.
+
+CREATE TABLE IF NOT EXISTS Employee (
+    ID INT PRIMARY KEY AUTO_INCREMENT,
+    Name VARCHAR(100) NOT NULL,
+    Title VARCHAR(50),
+    Email VARCHAR(100),
+    PhoneNumber VARCHAR(20),
+    Status ENUM('Active', 'Resigned') NOT NULL,
+    BusinessSector VARCHAR(100),
+    Company VARCHAR(100),
+    Password VARCHAR(255),
+    IsAdmin TINYINT(1) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS Company (
+    ID INT PRIMARY KEY AUTO_INCREMENT,
+    Name VARCHAR(100) NOT NULL,
+    SectorCategory ENUM('Purification', 'Hand Protection', 'Agriculture', 'BPO', 'Plantations', 'Investments and Services', 'Eco Solutions', 'Textile Manufacturing', 'Consumer & Retail', 'Leisure', 'Construction Materials', 'Industrial Solutions', 'Power & Energy', 'Transportation and Logistics', 'Tea Exports', 'Projects and Engineering') NOT NULL,
+    OwnerName VARCHAR(100),
+    Description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS Vendor (
+    ID INT PRIMARY KEY AUTO_INCREMENT,
+    VendorName VARCHAR(100) NOT NULL,
+    Description TEXT,
+    ServiceCategory ENUM('Workflow Automation', 'Application Modernization', 'IOT Driven Digitalization', 'AI and Machine Learning', 'Digital Literacy and Learning', 'Data Intelligence & Analytics', 'Agriculture Process Automation') NOT NULL,
+    ContactPersonName VARCHAR(100),
+    ContactPersonPhoneNumber VARCHAR(20),
+    ContactPersonEmail VARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS Demand (
+    ID INT PRIMARY KEY AUTO_INCREMENT,
+    Name VARCHAR(100) NOT NULL,
+    Description TEXT,
+    ReceivedDate DATE NOT NULL,
+    Status ENUM('Active', 'Paused', 'Abandoned') NOT NULL,
+    GoLiveDate DATE,
+    AbandonmentReason TEXT,
+    Phase ENUM('Identify', 'Discovery', 'Planning', 'Delivery', 'Live') NOT NULL,
+    CompanyID INT NOT NULL,
+    DeliveryDomain ENUM('Workflow Automation', 'Application Modernization', 'IOT Driven Digitalization', 'AI and Machine Learning', 'Digital Literacy and Learning', 'Data Intelligence & Analytics', 'Agriculture Process Automation') NOT NULL,
+    ServiceCategory ENUM('Implementation', 'Advisory') NOT NULL,
+    CompanyPriority ENUM('Low', 'Medium', 'High'),
+    CompanyValueDescription TEXT,
+    CompanyValueClassification ENUM('Low', 'Medium', 'High'),
+    ImplementationComplexity ENUM('Low', 'Medium', 'High'),
+    ImplementationCostEstimate ENUM('Low', 'Medium', 'High'),
+    ImplementationDuration VARCHAR(50),
+    ProjectManagerID INT,
+    OwnerID INT,
+    ProductOwnerID INT,
+    VendorID INT,
+    DTOwnerID INT,
+    ProjectSponsor VARCHAR(100),
+    FOREIGN KEY (CompanyID) REFERENCES Company(ID),
+    FOREIGN KEY (ProjectManagerID) REFERENCES Employee(ID),
+    FOREIGN KEY (OwnerID) REFERENCES Employee(ID),
+    FOREIGN KEY (ProductOwnerID) REFERENCES Employee(ID),
+    FOREIGN KEY (VendorID) REFERENCES Vendor(ID),
+    FOREIGN KEY (DTOwnerID) REFERENCES Employee(ID)
+);
+
+CREATE TABLE IF NOT EXISTS DAB (
+    DemandID INT,
+    Date DATE,
+    Status ENUM('Approved', 'Rejected') NOT NULL,
+    Notes TEXT,
+    PRIMARY KEY (DemandID, Date),
+    FOREIGN KEY (DemandID) REFERENCES Demand(ID)
+);
+
+-- Milestone and Status rows are keyed to the minute: several entries on the
+-- same day are spread across successive minutes by the Milestones page.
+CREATE TABLE IF NOT EXISTS Milestone (
+    DemandID INT,
+    Date DATETIME,
+    Description TEXT NOT NULL,
+    AchievedOrNot ENUM('Achieved', 'Not Achieved') NOT NULL,
+    PRIMARY KEY (DemandID, Date),
+    FOREIGN KEY (DemandID) REFERENCES Demand(ID)
+);
+
+CREATE TABLE IF NOT EXISTS Status (
+    DemandID INT,
+    Date DATETIME,
+    Description TEXT NOT NULL,
+    UpdatedBy INT,
+    PRIMARY KEY (DemandID, Date),
+    FOREIGN KEY (DemandID) REFERENCES Demand(ID),
+    FOREIGN KEY (UpdatedBy) REFERENCES Employee(ID)
+);
+
+CREATE TABLE IF NOT EXISTS Proposal (
+    DemandID INT,
+    DateReceived DATE,
+    ProposalFile LONGBLOB,
+    ProposalFileName VARCHAR(255),
+    ProposalStatus VARCHAR(50),
+    Comments TEXT,
+    PRIMARY KEY (DemandID, DateReceived),
+    FOREIGN KEY (DemandID) REFERENCES Demand(ID)
+);
+
+CREATE TABLE IF NOT EXISTS Meeting (
+    DemandID INT,
+    Date DATE,
+    Notes TEXT,
+    RecordingURL VARCHAR(255),
+    PRIMARY KEY (DemandID, Date),
+    FOREIGN KEY (DemandID) REFERENCES Demand(ID)
+);
+
+CREATE TABLE IF NOT EXISTS Issues (
+    EmployeeID INT,
+    DemandID INT,
+    TimeRaised DATETIME,
+    IssueDescription TEXT NOT NULL,
+    Status ENUM('Resolved', 'Pending') NOT NULL,
+    ResolutionDescription TEXT,
+    ResolutionTime DATETIME,
+    PRIMARY KEY (EmployeeID, DemandID, TimeRaised),
+    FOREIGN KEY (EmployeeID) REFERENCES Employee(ID),
+    FOREIGN KEY (DemandID) REFERENCES Demand(ID)
+);
+
+CREATE TABLE IF NOT EXISTS Risk (
+    EmployeeID INT,
+    DemandID INT,
+    TimeRaised DATETIME,
+    RiskDescription TEXT NOT NULL,
+    Status ENUM('Resolved', 'Pending') NOT NULL,
+    ResolutionDescription TEXT,
+    ResolutionTime DATETIME,
+    PRIMARY KEY (EmployeeID, DemandID, TimeRaised),
+    FOREIGN KEY (EmployeeID) REFERENCES Employee(ID),
+    FOREIGN KEY (DemandID) REFERENCES Demand(ID)
+);
@@ -0,0 +1,17 @@
+-- Indexes for the queries every page runs.
+
+-- login_gate and get_employee_id look employees up by email on every login/submit
+CREATE INDEX idx_employee_email ON Employee (Email);
+
+-- Non-admin demand lists: WHERE ProjectManagerID = ? ORDER BY Name
+-- (also serves the ProjectManagerID foreign key)
+CREATE INDEX idx_demand_pm_name ON Demand (ProjectManagerID, Name);
+
+-- Portfolio listing in main.py: ORDER BY ReceivedDate DESC
+CREATE INDEX idx_demand_received ON Demand (ReceivedDate);
+
+-- Risks & Issues: pending lists filter on Status, all lists sort by TimeRaised
+CREATE INDEX idx_issues_status_time ON Issues (Status, TimeRaised);
+CREATE INDEX idx_issues_time ON Issues (TimeRaised);
+CREATE INDEX idx_risk_status_time ON Risk (Status, TimeRaised);
+CREATE INDEX idx_risk_time ON Risk (TimeRaised);
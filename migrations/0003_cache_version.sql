@@ -0,0 +1,6 @@
+-- Per-table version counters bumped by every write path (see utils/db.py).
+-- Lets each Streamlit process tell when its cached lookup lists are stale.
+CREATE TABLE IF NOT EXISTS CacheVersion (
+    TableName VARCHAR(64) PRIMARY KEY,
+    Version BIGINT UNSIGNED NOT NULL DEFAULT 0
+);
@@ -1,5 +1,4 @@
 import streamlit as st
-import mysql.connector
 import os
 import bcrypt
 import secrets
@@ -11,7 +10,13 @@ st.title("🔐 Admin Panel")
 load_css_once()
 
 import os
-from login import login_gate, check_permission, logout
+from login import login_gate, check_permission, logout, get_connection
+from utils.metrics import start_rerun, finish_rerun
+from utils.db import mark_tables_changed, release_connection
+from utils.refdata import get_reference_data
+
+# Time this run and label its queries with the page name
+start_rerun("10_Admin_Panel")
 
 # Enforce login
 login_gate()
@@ -29,32 +34,10 @@ with st.sidebar:
     if st.button("Logout"):
         logout()
 
-# Load DB credentials from secrets.toml
-DB_HOST = st.secrets["db"]["host"]
-DB_NAME = st.secrets["db"]["name"]
-DB_USER = st.secrets["db"]["user"]
-DB_PASS = st.secrets["db"]["pass"]
-DB_PORT = st.secrets["db"]["port"]  # ✅ Added port
-
-def get_connection():
-    try:
-        return mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME,
-            port=DB_PORT  # ✅ Ensure correct port is used
-        )
-    except mysql.connector.Error as e:
-        st.error(f"❌ Database connection failed: {e}")
-        return None
-
-
 tabs = st.tabs(["👤 Employee Registration", "🏢 Company Registration"])
 
 # ---------------- EMPLOYEE REGISTRATION ----------------
 import streamlit as st
-import mysql.connector
 import bcrypt
 from login import get_connection
 from email_utils import send_registration_email
@@ -63,14 +46,8 @@ with tabs[0]:
     st.header("Register New Employee")
 
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT SectorCategory FROM Company;")
-        business_sectors = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT Name FROM Company;")
-        companies = [row[0] for row in cursor.fetchall()]
-        cursor.close()
-        conn.close()
+        business_sectors = [row[0] for row in get_reference_data("SELECT DISTINCT SectorCategory FROM Company")]
+        companies = [row[0] for row in get_reference_data("SELECT DISTINCT Name FROM Company")]
     except Exception as e:
         st.error(f"❌ Error fetching sector/company data: {e}")
         business_sectors = []
@@ -99,6 +76,7 @@ with tabs[0]:
         elif password != confirm_password:
             st.warning("⚠️ Passwords do not match.")
         else:
+            conn = cursor = None
             try:
                 # Hash the password securely
                 hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
@@ -119,14 +97,14 @@ with tabs[0]:
                         hashed_password, int(is_admin)
                     ))
                     conn.commit()
+                    mark_tables_changed("Employee")
                     # Send registration email with email and password
                     send_registration_email(email, password)
                     st.success("✅ Employee registered successfully. A confirmation email has been sent.")
             except Exception as e:
                 st.error(f"❌ Error: {e}")
             finally:
-                cursor.close()
-                conn.close()
+                release_connection(cursor, conn)
 
 # ---------------- COMPANY REGISTRATION ----------------
 with tabs[1]:
@@ -162,6 +140,7 @@ with tabs[1]:
         if not (company_name and sector_category and owner_name):
             st.warning("⚠️ Company name, sector, and owner are required.")
         else:
+            conn = cursor = None
             try:
                 conn = get_connection()
                 cursor = conn.cursor()
@@ -179,9 +158,11 @@ with tabs[1]:
                         VALUES (%s, %s, %s, %s)
                     """, (company_name, sector_category, owner_name, description))
                     conn.commit()
+                    mark_tables_changed("Company")
                     st.success("✅ Company registered successfully.")
             except Exception as e:
                 st.error(f"❌ Error: {e}")
             finally:
-                cursor.close()
-                conn.close()
+                release_connection(cursor, conn)
+
+finish_rerun()
@@ -1,11 +1,12 @@
 import streamlit as st
-from utils.llm import call_llm
-from utils.db import run_sql
+from utils import chat_context, intents, similarity, sql_candidates, sql_repair
+from utils.llm import call_llm, call_llm_candidates, forget_response
+from utils.db import run_sql, submit
 from utils.helpers import extract_sql_from_response
-import pandas as pd
 import os
 from login import login_gate, check_permission, logout
-from utils.utils import load_css_once
+from utils.metrics import start_rerun, finish_rerun
+from utils.utils import get_setting, load_css_once
 
 
 
@@ -15,6 +16,9 @@ st.title("🧠 SQL Agent for Demand Management")
 
 load_css_once()
 
+# Time this run and label its queries with the page name
+start_rerun("1_SQL_Agent")
+
 # Enforce login
 login_gate()
 
@@ -30,6 +34,19 @@ with st.sidebar:
     st.write(f"Logged in as: {name_display}")
     if st.button("Logout"):
         logout()
+    force_fresh = st.toggle("Always generate fresh SQL", key="force_fresh_sql",
+                            help="Skip built-in answers and answers reused from identical or similar earlier questions")
+    try_candidates = st.toggle("Try several SQL candidates", key="sql_candidates",
+                               help="Generate several queries at once and run the cheapest one that passes EXPLAIN")
+    if st.button("New conversation", help="Forget earlier questions; follow-ups refer to them"):
+        st.session_state.messages = []
+
+# Headings for the error kinds run_sql reports, keyed by message prefix
+ERROR_HEADINGS = {
+    "⏱️": "⏱️ Query Timeout",
+    "💸": "💸 Query Too Expensive",
+    "⏳": "⏳ Database Busy",
+}
 
 # Initialize chat history in session state
 if "messages" not in st.session_state:
@@ -47,6 +64,22 @@ for message in st.session_state.messages:
 # Chat input
 user_input = st.chat_input("Ask a question about the database (e.g., 'Show me all active demands')")
 
+def start_sql_early(chunks, started):
+    """
+    Pass the streamed chunks through, and start the query in the background as
+    soon as the SQL code block is closed, while the model may still be writing.
+    """
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        yield chunk
+        if "future" not in started and text.count("```") >= 2:
+            sql_query = extract_sql_from_response(text)
+            if sql_query:
+                started["sql"] = sql_query
+                started["future"] = submit(run_sql, sql_query, True)
+
+
 if user_input:
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": user_input})
@@ -55,34 +88,108 @@ if user_input:
     with st.chat_message("user"):
         st.markdown(user_input)
     
-    # Process LLM response
-    with st.spinner("Thinking..."):
-        llm_response = call_llm(user_input)
+    with st.chat_message("assistant"):
+        # Earlier turns, compacted to a fixed token budget, so follow-ups work
+        history = chat_context.history_messages(st.session_state.messages[:-1])
+        follow_up = bool(history) and chat_context.looks_like_follow_up(user_input)
+        if not follow_up:
+            # A standalone question gets the same prompt (and cache entry) in every session
+            history = []
+        # Common questions are answered from vetted templates without an LLM call
+        fast = None if force_fresh or follow_up else intents.match(user_input)
+        # A paraphrase of an earlier question reuses its SQL without an LLM call
+        match = None if fast or force_fresh or follow_up else similarity.find_similar(user_input)
+        st.markdown("#### 🧠 LLM Response:")
+        started = {}
+        best = None
+        if fast:
+            llm_response = f"```sql\n{fast.display_sql}\n```"
+            st.markdown(llm_response)
+        elif match:
+            llm_response = match.response
+            st.markdown(llm_response)
+        elif try_candidates:
+            count = int(get_setting("sql_agent", "candidates", 3))
+            with st.spinner(f"Generating and checking {count} candidate queries..."):
+                responses = call_llm_candidates(user_input, count, history=history)
+                best, candidates = sql_candidates.choose(responses)
+            llm_response = best.response if best else (responses[0] if responses else "LLM Error: no candidates returned")
+            st.markdown(llm_response)
+        else:
+            # Tokens are shown as they arrive instead of behind a spinner
+            llm_response = st.write_stream(
+                start_sql_early(call_llm(user_input, use_cache=not force_fresh, stream=True, history=history), started)
+            )
         
         # Prepare assistant message
-        assistant_message = {"role": "assistant", "content": f"#### 🧠 LLM Response:\n{llm_response}"}
+        assistant_message = {"role": "assistant", "content": f"#### 🧠 LLM Response:\n{llm_response}", "response": llm_response}
+        notes = []
+        if fast:
+            notes.append(f"⚡ Answered with a built-in query ({fast.describe()}); no LLM call needed")
+        if match:
+            notes.append(f"♻️ Reused SQL from a similar earlier question: \"{match.question}\" (similarity {match.score:.2f})")
+        if try_candidates and not (fast or match) and responses:
+            rejected = [f"{c.index + 1}: {c.problem}" for c in candidates if c.problem]
+            picked = f"Ran candidate {best.index + 1} of {len(candidates)}" if best else "No candidate passed EXPLAIN"
+            notes.append(f"🧪 {picked}" + (f" (rejected {'; '.join(rejected)})" if rejected else ""))
         
-        # Extract and execute SQL if present
+        # Extract and execute SQL if present (reusing the run started mid-stream)
         sql_query = extract_sql_from_response(llm_response)
         if sql_query:
             assistant_message["sql"] = sql_query
-            columns, result = run_sql(sql_query)
+            with st.spinner("Running query..."):
+                if fast:
+                    # The values go to MySQL as parameters; the SQL shown above is only for reading
+                    columns, result = run_sql(fast.sql, stream=True, cost_gate=False, params=fast.params)
+                elif started.get("sql") == sql_query:
+                    columns, result = started["future"].result()
+                else:
+                    # A chosen candidate already passed the EXPLAIN cost check
+                    columns, result = run_sql(sql_query, stream=True, cost_gate=best is None)
+            if not columns and not (fast or match or try_candidates or force_fresh) and sql_repair.repairable(result):
+                # The streamed answer was cached as it finished; do not replay broken SQL
+                forget_response(user_input, history=history)
+            if not columns and not fast and sql_repair.repairable(result):
+                # Feed the MySQL error back to the model, within a bounded number of attempts and time
+                first_error = result
+                with st.status("🔧 The query failed; asking the model to fix it...") as repair_status:
+                    for attempt in sql_repair.attempts(user_input, sql_query, result, history):
+                        st.markdown(f"Attempt {attempt.number}: {attempt.outcome} ({attempt.seconds:.1f}s)")
+                        if attempt.sql:
+                            st.code(attempt.sql, language="sql")
+                        if attempt.ok:
+                            sql_query, llm_response, columns, result = attempt.sql, attempt.response, attempt.columns, attempt.result
+                            assistant_message["sql"], assistant_message["response"] = sql_query, llm_response
+                            notes.append(f"🔧 Fixed automatically after {attempt.number} repair attempt(s); the first query failed with: {first_error}")
+                    repair_status.update(label="🔧 Query repaired" if columns else "🔧 Could not repair the query",
+                                         state="complete" if columns else "error", expanded=False)
+            assistant_message["summary"] = chat_context.result_summary(columns, result)
             if columns:
-                df = pd.DataFrame(result, columns=columns)
-                assistant_message["dataframe"] = df
+                assistant_message["dataframe"] = result
+                if not (fast or match or follow_up):
+                    similarity.remember(user_input, sql_query, llm_response)
+                if result.attrs.get("truncated"):
+                    limit = "row" if result.attrs["truncated_by"] == "rows" else "memory"
+                    notes.append(f"#### ✂️ Showing the first {len(result)} rows (result truncated by the {limit} limit).")
             else:
-                assistant_message["content"] += f"\n\n#### ⚠️ Database Error:\n{result}"
+                heading = next((h for prefix, h in ERROR_HEADINGS.items() if result.startswith(prefix)), "⚠️ Database Error")
+                notes.append(f"#### {heading}:\n{result}")
         else:
-            assistant_message["content"] += "\n\n#### ⚠️ No valid SQL found in the response."
+            assistant_message["summary"] = "no SQL in the answer"
+            notes.append("#### ⚠️ No valid SQL found in the response.")
+        
+        for note in notes:
+            assistant_message["content"] += f"\n\n{note}"
+            st.markdown(note)
         
         # Add assistant message to chat history
         st.session_state.messages.append(assistant_message)
         
-        # Display assistant response
-        with st.chat_message("assistant"):
-            st.markdown(assistant_message["content"])
-            if "sql" in assistant_message:
-                st.code(assistant_message["sql"], language="sql")
-            if "dataframe" in assistant_message:
-                st.markdown("#### 📊 Results:")
-                st.dataframe(assistant_message["dataframe"])
\ No newline at end of file
+        # Display the rest of the assistant response
+        if "sql" in assistant_message:
+            st.code(assistant_message["sql"], language="sql")
+        if "dataframe" in assistant_message:
+            st.markdown("#### 📊 Results:")
+            st.dataframe(assistant_message["dataframe"])
+
+finish_rerun()
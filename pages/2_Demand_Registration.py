@@ -9,7 +9,13 @@ st.title("📋 Demand Management")
 
 load_css_once()
 
-from login import login_gate, check_permission, logout
+from login import login_gate, check_permission, logout, get_connection
+from utils.metrics import start_rerun, finish_rerun
+from utils.db import mark_tables_changed, release_connection
+from utils.refdata import get_reference_data
+
+# Time this run and label its queries with the page name
+start_rerun("2_Demand_Registration")
 
 # Enforce login
 login_gate()
@@ -27,42 +33,12 @@ with st.sidebar:
     if st.button("Logout"):
         logout()
 
-# Load DB credentials from secrets.toml
-DB_HOST = st.secrets["db"]["host"]
-DB_NAME = st.secrets["db"]["name"]
-DB_USER = st.secrets["db"]["user"]
-DB_PASS = st.secrets["db"]["pass"]
-DB_PORT = st.secrets["db"]["port"]  # ✅ Added port
-
-def get_connection():
-    try:
-        return mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME,
-            port=DB_PORT  # ✅ Ensure correct port is used
-        )
-    except mysql.connector.Error as e:
-        st.error(f"❌ Database connection failed: {e}")
-        return None
-
 def get_dropdown_data(query):
-    conn = get_connection()
-    if not conn:
-        return []
     try:
-        cursor = conn.cursor()
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        return get_reference_data(query)
     except mysql.connector.Error as e:
         st.error(f"❌ Dropdown load error: {str(e)}")
         return []
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
 
 def get_id(selection):
     try:
@@ -108,6 +84,7 @@ with tab1:
         elif not (name and description and received_date and status and phase and delivery_domain and service_category and company_id):
             st.error("❌ Please fill all required fields except Project Sponsor, which is optional.")
         else:
+            conn = cursor = None
             try:
                 conn = get_connection()
                 cursor = conn.cursor()
@@ -121,13 +98,12 @@ with tab1:
                     company_id, pm_id, owner_id, dto_id, project_sponsor or None
                 ))
                 conn.commit()
+                mark_tables_changed("Demand")
                 st.success(f"✅ Demand '{name}' registered successfully.")
             except mysql.connector.Error as e:
                 st.error(f"❌ Error: {str(e)}")
             finally:
-                if conn.is_connected():
-                    cursor.close()
-                    conn.close()
+                release_connection(cursor, conn)
 
 with tab2:
     st.header("Update Demand Details")
@@ -138,16 +114,17 @@ with tab2:
 
     if selected_demand != "Select a demand":
         demand_id = get_id(selected_demand)
+        conn = cursor = None
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT * FROM Demand WHERE ID = %s", (demand_id,))
             demand = cursor.fetchone()
-            cursor.close()
-            conn.close()
         except mysql.connector.Error as e:
             st.error(f"❌ Error fetching demand: {str(e)}")
             demand = None
+        finally:
+            release_connection(cursor, conn)
 
         if demand:
             go_live_date = st.date_input("Go Live Date (optional)", value=demand['GoLiveDate'] if demand['GoLiveDate'] else None, key="update_go_live")
@@ -164,6 +141,7 @@ with tab2:
             vendor_id = get_id(vendor) if vendor != "No vendor selected" else None
 
             if st.button("Update Demand", key="update_submit"):
+                conn = cursor = None
                 try:
                     conn = get_connection()
                     cursor = conn.cursor()
@@ -181,13 +159,12 @@ with tab2:
                         complexity, cost_estimate, duration, vendor_id, demand_id
                     ))
                     conn.commit()
+                    mark_tables_changed("Demand")
                     st.success(f"✅ Demand '{selected_demand}' updated successfully.")
                 except mysql.connector.Error as e:
                     st.error(f"❌ Error: {str(e)}")
                 finally:
-                    if conn.is_connected():
-                        cursor.close()
-                        conn.close()
+                    release_connection(cursor, conn)
 
 with tab3:
     st.header("Admin Update - Initial Fields")
@@ -195,16 +172,17 @@ with tab3:
     selected_admin_demand = st.selectbox("Select Demand", demand_options, index=0, key="admin_demand")
     if selected_admin_demand != "Select a demand":
         demand_id = get_id(selected_admin_demand)
+        conn = cursor = None
         try:
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT * FROM Demand WHERE ID = %s", (demand_id,))
             demand = cursor.fetchone()
-            cursor.close()
-            conn.close()
         except mysql.connector.Error as e:
             st.error(f"❌ Error fetching demand: {str(e)}")
             demand = None
+        finally:
+            release_connection(cursor, conn)
 
         if demand:
             name = st.text_input("Demand Name", value=demand['Name'], key="admin_name")
@@ -236,6 +214,7 @@ with tab3:
                 if "Select a person" in [project_manager, owner, dto] or len({pm_id, owner_id, dto_id}) < 3:
                     st.error("❌ Project Manager, Product Owner, and Digital Transformation Owner must be selected and different.")
                 else:
+                    conn = cursor = None
                     try:
                         conn = get_connection()
                         cursor = conn.cursor()
@@ -252,10 +231,11 @@ with tab3:
                             project_sponsor or None, demand_id
                         ))
                         conn.commit()
+                        mark_tables_changed("Demand")
                         st.success(f"✅ Demand '{selected_admin_demand}' updated successfully.")
                     except mysql.connector.Error as e:
                         st.error(f"❌ Error: {str(e)}")
                     finally:
-                        if conn.is_connected():
-                            cursor.close()
-                            conn.close()
\ No newline at end of file
+                        release_connection(cursor, conn)
+
+finish_rerun()
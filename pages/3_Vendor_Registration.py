@@ -1,6 +1,5 @@
 
 import streamlit as st
-import mysql.connector
 import os
 from utils.utils import load_css_once
 
@@ -10,7 +9,13 @@ st.title("📋 Vendor Management")
 load_css_once()
 
 import os
-from login import login_gate, check_permission, logout
+from login import login_gate, check_permission, logout, get_connection
+from utils.metrics import start_rerun, finish_rerun
+from utils.db import mark_tables_changed, release_connection
+from utils.refdata import get_reference_data
+
+# Time this run and label its queries with the page name
+start_rerun("3_Vendor_Registration")
 
 # Enforce login
 login_gate()
@@ -28,27 +33,6 @@ with st.sidebar:
     if st.button("Logout"):
         logout()
 
-# Load DB credentials from secrets.toml
-DB_HOST = st.secrets["db"]["host"]
-DB_NAME = st.secrets["db"]["name"]
-DB_USER = st.secrets["db"]["user"]
-DB_PASS = st.secrets["db"]["pass"]
-DB_PORT = st.secrets["db"]["port"]  # ✅ Added port
-
-def get_connection():
-    try:
-        return mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME,
-            port=DB_PORT  # ✅ Ensure correct port is used
-        )
-    except mysql.connector.Error as e:
-        st.error(f"❌ Database connection failed: {e}")
-        return None
-
-
 service_categories = [
     'Workflow Automation',
     'Application Modernization',
@@ -63,17 +47,18 @@ tab1, tab2 = st.tabs(["Vendor Registration", "Vendor Details Update - Admin"])
 
 # Helper function to check if vendor exists
 def vendor_exists(vendor_name):
+    conn = cursor = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM Vendor WHERE VendorName = %s", (vendor_name,))
         result = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
         return result > 0
     except Exception as e:
         st.error(f"Error checking for existing vendor: {e}")
         return True  # Fail safe: prevent duplicate insert if check fails
+    finally:
+        release_connection(cursor, conn)
 
 # --- Vendor Registration Tab ---
 with tab1:
@@ -94,6 +79,7 @@ with tab1:
         elif vendor_exists(vendor_name):
             st.error(f"❌ Vendor with the name '{vendor_name}' already exists.")
         else:
+            conn = cursor = None
             try:
                 conn = get_connection()
                 cursor = conn.cursor()
@@ -105,12 +91,13 @@ with tab1:
                 values = (vendor_name, description, category, name, phone, email)
                 cursor.execute(query, values)
                 conn.commit()
-                cursor.close()
-                conn.close()
+                mark_tables_changed("Vendor")
 
                 st.success("✅ Vendor registered successfully!")
             except Exception as e:
                 st.error(f"❌ Error inserting vendor: {e}")
+            finally:
+                release_connection(cursor, conn)
 
 # --- Vendor Update Tab ---
 with tab2:
@@ -118,12 +105,7 @@ with tab2:
 
     # Fetch vendor list
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT ID, VendorName FROM Vendor")
-        vendors = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        vendors = get_reference_data("SELECT ID, VendorName FROM Vendor")
     except Exception as e:
         st.error(f"Error loading vendors: {e}")
         vendors = []
@@ -135,16 +117,17 @@ with tab2:
         if selected_vendor != "Select a vendor":
             selected_id = int(selected_vendor.split("(ID:")[1].split(")")[0])
 
+            conn = cursor = None
             try:
                 conn = get_connection()
                 cursor = conn.cursor(dictionary=True)
                 cursor.execute("SELECT * FROM Vendor WHERE ID = %s", (selected_id,))
                 vendor_data = cursor.fetchone()
-                cursor.close()
-                conn.close()
             except Exception as e:
                 st.error(f"Error fetching vendor details: {e}")
                 vendor_data = None
+            finally:
+                release_connection(cursor, conn)
 
             if vendor_data:
                 new_name = st.text_input("Vendor Name", value=vendor_data["VendorName"])
@@ -155,6 +138,7 @@ with tab2:
                 new_email = st.text_input("Contact Person Email", value=vendor_data["ContactPersonEmail"])
 
                 if st.button("Update Vendor"):
+                    conn = cursor = None
                     try:
                         conn = get_connection()
                         cursor = conn.cursor()
@@ -172,10 +156,13 @@ with tab2:
                             new_contact_name, new_phone, new_email, selected_id
                         ))
                         conn.commit()
-                        cursor.close()
-                        conn.close()
+                        mark_tables_changed("Vendor")
                         st.success("✅ Vendor updated successfully!")
                     except Exception as e:
                         st.error(f"❌ Error updating vendor: {e}")
+                    finally:
+                        release_connection(cursor, conn)
     else:
         st.info("No vendors found.")
+
+finish_rerun()
@@ -1,5 +1,4 @@
 import streamlit as st
-import mysql.connector
 import os
 from datetime import date
 import pandas as pd
@@ -13,7 +12,14 @@ st.title("📋 DAB Status Updater")
 load_css_once()
 
 import os
-from login import login_gate, check_permission, logout
+from login import login_gate, check_permission, logout, get_connection
+from utils.metrics import start_rerun, finish_rerun
+from utils import queries
+from utils.db import mark_tables_changed, release_connection
+from utils.refdata import get_reference_data
+
+# Time this run and label its queries with the page name
+start_rerun("4_DAB_Status_Updater")
 
 # Enforce login
 login_gate()
@@ -31,36 +37,10 @@ with st.sidebar:
     if st.button("Logout"):
         logout()
 
-# Load DB credentials from secrets.toml
-DB_HOST = st.secrets["db"]["host"]
-DB_NAME = st.secrets["db"]["name"]
-DB_USER = st.secrets["db"]["user"]
-DB_PASS = st.secrets["db"]["pass"]
-DB_PORT = st.secrets["db"]["port"]  # ✅ Added port
-
-def get_connection():
-    try:
-        return mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME,
-            port=DB_PORT  # ✅ Ensure correct port is used
-        )
-    except mysql.connector.Error as e:
-        st.error(f"❌ Database connection failed: {e}")
-        return None
-
 # --- Fetch Demand List ---
 def get_demand_list():
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT ID, Name FROM Demand")
-        result = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return result
+        return get_reference_data("SELECT ID, Name FROM Demand")
     except Exception as e:
         st.error(f"Error fetching demands: {e}")
         return []
@@ -68,18 +48,7 @@ def get_demand_list():
 # --- Fetch Previous DAB Entries ---
 def get_dab_updates(demand_id):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT Date, Status, Notes
-            FROM DAB
-            WHERE DemandID = %s
-            ORDER BY Date DESC
-        """, (demand_id,))
-        result = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return pd.DataFrame(result, columns=["Date", "Status", "Notes"])
+        return queries.dab_updates(demand_id)
     except Exception as e:
         st.error(f"Error fetching DAB updates: {e}")
         return pd.DataFrame()
@@ -120,6 +89,7 @@ if demand_id:
         if dab_status == "-- Select Status --":
             st.warning("⚠️ Please select a valid DAB status.")
         else:
+            conn = cursor = None
             try:
                 conn = get_connection()
                 cursor = conn.cursor()
@@ -129,13 +99,15 @@ if demand_id:
                     ON DUPLICATE KEY UPDATE Status = VALUES(Status), Notes = VALUES(Notes)
                 """, (demand_id, dab_date, dab_status, dab_notes))
                 conn.commit()
+                mark_tables_changed("DAB")
                 st.success("✅ DAB status updated successfully.")
                 st.session_state.dab_submitted = True
                 st.rerun() # Refresh page to reload table
             except Exception as e:
                 st.error(f"❌ Database error: {e}")
             finally:
-                cursor.close()
-                conn.close()
+                release_connection(cursor, conn)
 else:
     st.info("Please select a demand to view and submit DAB updates.")
+
+finish_rerun()
@@ -1,7 +1,6 @@
 import streamlit as st
-import mysql.connector
 import os
-from datetime import date, datetime, time, timedelta
+from datetime import date
 import pandas as pd
 from utils.utils import load_css_once
 
@@ -11,7 +10,14 @@ st.title("📌 Milestone and Status Update")
 
 load_css_once()
 
-from login import login_gate, check_permission, logout
+from login import login_gate, check_permission, logout, get_connection
+from utils.metrics import start_rerun, finish_rerun
+from utils import prepared, queries
+from utils.db import mark_tables_changed, release_connection, run_concurrently
+from utils.refdata import get_reference_data
+
+# Time this run and label its queries with the page name
+start_rerun("5_Milestone_and_Status_Updates")
 
 # Enforce login
 login_gate()
@@ -29,56 +35,21 @@ with st.sidebar:
     if st.button("Logout"):
         logout()
 
-# Load DB credentials from secrets.toml
-DB_HOST = st.secrets["db"]["host"]
-DB_NAME = st.secrets["db"]["name"]
-DB_USER = st.secrets["db"]["user"]
-DB_PASS = st.secrets["db"]["pass"]
-
-
-def get_connection():
-    return mysql.connector.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASS,
-        database=DB_NAME
-    )
-
 # --- Fetch Demands and Employees ---
 def get_demands():
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
         if st.session_state.is_admin:
             # Admins see all demands
-            cursor.execute("SELECT ID, Name FROM Demand")
-        else:
-            # Non-admins see only their assigned demands
-            cursor.execute("""
-                SELECT D.ID, D.Name
-                FROM Demand D
-                JOIN Employee E ON D.ProjectManagerID = E.ID
-                WHERE E.Email = %s
-            """, (st.session_state.email,))
-        
-        result = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return result
+            return get_reference_data("SELECT ID, Name FROM Demand")
+        # Non-admins see only their assigned demands
+        return get_reference_data(prepared.STATEMENTS["pm_demands"], (st.session_state.email,))
     except Exception as e:
         st.error(f"Error fetching demands: {e}")
         return []
 
 def get_employee_id(email):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT ID FROM Employee WHERE Email = %s", (email,))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return result[0] if result else None
+        return queries.employee_id(email)
     except Exception as e:
         st.error(f"Error fetching employee ID: {e}")
         return None
@@ -86,55 +57,21 @@ def get_employee_id(email):
 # --- Fetch Milestones and Statuses ---
 def get_milestones(demand_id):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT Date, Description, AchievedOrNot FROM Milestone WHERE DemandID = %s ORDER BY Date DESC", (demand_id,))
-        result = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return pd.DataFrame(result, columns=["Date", "Description", "AchievedOrNot"])
+        return queries.milestones(demand_id)
     except Exception as e:
         st.error(f"Error fetching milestones: {e}")
         return pd.DataFrame()
 
 def get_status_updates(demand_id):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT S.Date, S.Description, E.Name AS UpdatedBy 
-            FROM Status S
-            LEFT JOIN Employee E ON S.UpdatedBy = E.ID
-            WHERE S.DemandID = %s ORDER BY S.Date DESC
-        """, (demand_id,))
-        result = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return pd.DataFrame(result, columns=["Date", "Description", "Updated By"])
+        return queries.status_updates(demand_id)
     except Exception as e:
         st.error(f"Error fetching status updates: {e}")
         return pd.DataFrame()
 
 # --- Utility: Find next available datetime ---
 def get_next_available_datetime(demand_id, selected_date, is_milestone=True):
-    base_dt = datetime.combine(selected_date, time(0, 0))
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    while True:
-        table = "Milestone" if is_milestone else "Status"
-        cursor.execute(f"""
-            SELECT COUNT(*) FROM {table}
-            WHERE DemandID = %s AND Date = %s
-        """, (demand_id, base_dt))
-        (count,) = cursor.fetchone()
-        if count == 0:
-            break
-        base_dt += timedelta(minutes=1)
-
-    cursor.close()
-    conn.close()
-    return base_dt
+    return queries.next_available_datetime(demand_id, selected_date, is_milestone)
 
 # --- Demand Selection ---
 demands = get_demands()
@@ -145,15 +82,21 @@ selected_id = demand_options.get(selected_label) if selected_label != "-- Select
 
 # --- Main UI ---
 if selected_id:
+    # Both lists only depend on the selected demand, so load them together
+    loaded = run_concurrently({
+        "milestones": (get_milestones, selected_id),
+        "status_updates": (get_status_updates, selected_id),
+    })
+
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("🚩 Milestones")
-        milestone_df = get_milestones(selected_id)
+        milestone_df = loaded["milestones"]
         st.dataframe(milestone_df, use_container_width=True)
 
     with col2:
         st.subheader("📈 Status Updates")
-        st.dataframe(get_status_updates(selected_id), use_container_width=True)
+        st.dataframe(loaded["status_updates"], use_container_width=True)
 
     # --- Tabs ---
     tab1, tab2, tab3 = st.tabs(["➕ Add Milestone", "➕ Add Status Update", "✏️ Update Milestone Status"])
@@ -169,6 +112,7 @@ if selected_id:
             if milestone_description.strip() == "":
                 st.warning("Please enter a milestone description.")
             else:
+                conn = cursor = None
                 try:
                     milestone_dt = get_next_available_datetime(selected_id, milestone_date)
                     conn = get_connection()
@@ -178,13 +122,13 @@ if selected_id:
                         VALUES (%s, %s, %s, %s)
                     """, (selected_id, milestone_dt, milestone_description, achieved_status))
                     conn.commit()
+                    mark_tables_changed("Milestone")
                     st.success("✅ Milestone added successfully.")
                     st.rerun()  # Refresh the table
                 except Exception as e:
                     st.error(f"❌ Error adding milestone: {e}")
                 finally:
-                    cursor.close()
-                    conn.close()
+                    release_connection(cursor, conn)
 
     # --- Add Status Update ---
     with tab2:
@@ -201,6 +145,7 @@ if selected_id:
                 if not updated_by_id:
                     st.error("❌ Could not retrieve your employee ID. Please check your account.")
                 else:
+                    conn = cursor = None
                     try:
                         status_dt = get_next_available_datetime(selected_id, status_date, is_milestone=False)
                         conn = get_connection()
@@ -210,18 +155,18 @@ if selected_id:
                             VALUES (%s, %s, %s, %s)
                         """, (selected_id, status_dt, status_description, updated_by_id))
                         conn.commit()
+                        mark_tables_changed("Status")
                         st.success("✅ Status update added successfully.")
                         st.rerun()  # Refresh the table
                     except Exception as e:
                         st.error(f"❌ Error adding status update: {e}")
                     finally:
-                        cursor.close()
-                        conn.close()
+                        release_connection(cursor, conn)
 
     # --- Update Milestone Status ---
     with tab3:
         st.subheader("Update Milestone 'Achieved or Not' Status")
-        milestones_df = get_milestones(selected_id)
+        milestones_df = milestone_df.copy()
         if milestones_df.empty:
             st.info("No milestones to update.")
         else:
@@ -235,6 +180,7 @@ if selected_id:
                 selected_datetime = label_to_date[selected_label]
                 new_status = st.selectbox("New Achieved Status", ["Achieved", "Not Achieved"])
                 if st.button("Update Milestone Status"):
+                    conn = cursor = None
                     try:
                         conn = get_connection()
                         cursor = conn.cursor()
@@ -244,13 +190,15 @@ if selected_id:
                             WHERE DemandID = %s AND Date = %s
                         """, (new_status, selected_id, selected_datetime))
                         conn.commit()
+                        mark_tables_changed("Milestone")
                         st.success("✅ Milestone status updated.")
                         st.rerun()  # Refresh the table
                     except Exception as e:
                         st.error(f"❌ Error updating milestone: {e}")
                     finally:
-                        cursor.close()
-                        conn.close()
+                        release_connection(cursor, conn)
 
 else:
-    st.info("Please select a demand to view and update milestones or status.")
\ No newline at end of file
+    st.info("Please select a demand to view and update milestones or status.")
+
+finish_rerun()
@@ -11,7 +11,14 @@ st.title("🛠️ Risks and Issues Management")
 
 load_css_once()
 
-from login import login_gate, check_permission, logout
+from login import login_gate, check_permission, logout, get_connection
+from utils.metrics import start_rerun, finish_rerun
+from utils import prepared, queries
+from utils.db import mark_tables_changed, release_connection, run_concurrently
+from utils.refdata import get_reference_data
+
+# Time this run and label its queries with the page name
+start_rerun("7_Risks_and_Issues")
 
 # Enforce login
 login_gate()
@@ -29,88 +36,34 @@ with st.sidebar:
     if st.button("Logout"):
         logout()
 
-# Load DB credentials from secrets.toml
-DB_HOST = st.secrets["db"]["host"]
-DB_NAME = st.secrets["db"]["name"]
-DB_USER = st.secrets["db"]["user"]
-DB_PASS = st.secrets["db"]["pass"]
-
-def get_db_connection():
-    try:
-        return mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME
-        )
-    except mysql.connector.Error as e:
-        st.error(f"❌ Database connection failed: {str(e)}")
-        return None
-
 def get_employee_id(email):
-    conn = get_db_connection()
-    if not conn:
-        return None
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT ID FROM Employee WHERE Email = %s", (email,))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return result[0] if result else None
+        return queries.employee_id(email)
     except mysql.connector.Error as e:
         st.error(f"❌ Error fetching employee ID: {str(e)}")
         return None
 
 def fetch_employees():
-    conn = get_db_connection()
-    if not conn:
-        return []
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT ID, Name FROM Employee ORDER BY Name")
-        employees = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return employees
+        return get_reference_data("SELECT ID, Name FROM Employee ORDER BY Name")
     except mysql.connector.Error as e:
         st.error(f"❌ Error fetching employees: {str(e)}")
         return []
-    finally:
-        if conn.is_connected():
-            conn.close()
 
 def fetch_demands():
-    conn = get_db_connection()
-    if not conn:
-        return []
     try:
-        cursor = conn.cursor()
         if st.session_state.is_admin:
-            cursor.execute("SELECT ID, Name FROM Demand ORDER BY Name")
-        else:
-            cursor.execute("""
-                SELECT D.ID, D.Name
-                FROM Demand D
-                JOIN Employee E ON D.ProjectManagerID = E.ID
-                WHERE E.Email = %s
-                ORDER BY D.Name
-            """, (st.session_state.email,))
-        demands = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return demands
+            return get_reference_data("SELECT ID, Name FROM Demand ORDER BY Name")
+        return get_reference_data(prepared.STATEMENTS["pm_demands_by_name"], (st.session_state.email,))
     except mysql.connector.Error as e:
         st.error(f"❌ Error fetching demands: {str(e)}")
         return []
-    finally:
-        if conn.is_connected():
-            conn.close()
 
 def insert_issue(employee_id, demand_id, issue_description, status, resolution_description, resolution_time):
-    conn = get_db_connection()
+    conn = get_connection()
     if not conn:
         return False
+    cursor = None
     try:
         cursor = conn.cursor()
         time_raised = datetime.now()
@@ -125,61 +78,26 @@ def insert_issue(employee_id, demand_id, issue_description, status, resolution_d
                 VALUES (%s, %s, %s, %s, %s)
             """, (employee_id, demand_id, time_raised, issue_description, status))
         conn.commit()
+        mark_tables_changed("Issues")
         return True
     except mysql.connector.Error as e:
         st.error(f"❌ Error inserting issue: {str(e)}")
         return False
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+        release_connection(cursor, conn)
 
 def fetch_issues(order="DESC", only_pending=False):
-    conn = get_db_connection()
-    if not conn:
-        return pd.DataFrame()
     try:
-        cursor = conn.cursor(dictionary=True)
-        if st.session_state.is_admin:
-            query = f"""
-                SELECT I.EmployeeID, I.DemandID, I.TimeRaised,
-                       E.Name AS EmployeeName, D.Name AS DemandName,
-                       I.IssueDescription, I.Status, I.ResolutionDescription, I.ResolutionTime
-                FROM Issues I
-                JOIN Employee E ON I.EmployeeID = E.ID
-                JOIN Demand D ON I.DemandID = D.ID
-                {"WHERE I.Status = 'Pending'" if only_pending else ""}
-                ORDER BY I.TimeRaised {order}
-            """
-            cursor.execute(query)
-        else:
-            query = f"""
-                SELECT I.EmployeeID, I.DemandID, I.TimeRaised,
-                       E.Name AS EmployeeName, D.Name AS DemandName,
-                       I.IssueDescription, I.Status, I.ResolutionDescription, I.ResolutionTime
-                FROM Issues I
-                JOIN Employee E ON I.EmployeeID = E.ID
-                JOIN Demand D ON I.DemandID = D.ID
-                JOIN Employee E2 ON D.ProjectManagerID = E2.ID
-                WHERE E2.Email = %s
-                {"AND I.Status = 'Pending'" if only_pending else ""}
-                ORDER BY I.TimeRaised {order}
-            """
-            cursor.execute(query, (st.session_state.email,))
-        issues = cursor.fetchall()
-        return pd.DataFrame(issues)
+        return queries.issues(st.session_state.email, st.session_state.is_admin, order, only_pending)
     except mysql.connector.Error as e:
         st.error(f"❌ Error fetching issues: {str(e)}")
         return pd.DataFrame()
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
 
 def update_issue(employee_id, demand_id, time_raised, new_description, new_status, resolution_description=None, resolution_time=None):
-    conn = get_db_connection()
+    conn = get_connection()
     if not conn:
         return False
+    cursor = None
     try:
         cursor = conn.cursor()
         if new_status == "Resolved":
@@ -195,19 +113,19 @@ def update_issue(employee_id, demand_id, time_raised, new_description, new_statu
                 WHERE EmployeeID=%s AND DemandID=%s AND TimeRaised=%s
             """, (new_description, new_status, employee_id, demand_id, time_raised))
         conn.commit()
+        mark_tables_changed("Issues")
         return True
     except mysql.connector.Error as e:
         st.error(f"❌ Error updating issue: {str(e)}")
         return False
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+        release_connection(cursor, conn)
 
 def insert_risk(employee_id, demand_id, risk_description, status, resolution_description, resolution_time):
-    conn = get_db_connection()
+    conn = get_connection()
     if not conn:
         return False
+    cursor = None
     try:
         cursor = conn.cursor()
         time_raised = datetime.now()
@@ -222,61 +140,26 @@ def insert_risk(employee_id, demand_id, risk_description, status, resolution_des
                 VALUES (%s, %s, %s, %s, %s)
             """, (employee_id, demand_id, time_raised, risk_description, status))
         conn.commit()
+        mark_tables_changed("Risk")
         return True
     except mysql.connector.Error as e:
         st.error(f"❌ Error inserting risk: {str(e)}")
         return False
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+        release_connection(cursor, conn)
 
 def fetch_risks(order="DESC", only_pending=False):
-    conn = get_db_connection()
-    if not conn:
-        return pd.DataFrame()
     try:
-        cursor = conn.cursor(dictionary=True)
-        if st.session_state.is_admin:
-            query = f"""
-                SELECT I.EmployeeID, I.DemandID, I.TimeRaised,
-                       E.Name AS EmployeeName, D.Name AS DemandName,
-                       I.RiskDescription, I.Status, I.ResolutionDescription, I.ResolutionTime
-                FROM Risk I
-                JOIN Employee E ON I.EmployeeID = E.ID
-                JOIN Demand D ON I.DemandID = D.ID
-                {"WHERE I.Status = 'Pending'" if only_pending else ""}
-                ORDER BY I.TimeRaised {order}
-            """
-            cursor.execute(query)
-        else:
-            query = f"""
-                SELECT I.EmployeeID, I.DemandID, I.TimeRaised,
-                       E.Name AS EmployeeName, D.Name AS DemandName,
-                       I.RiskDescription, I.Status, I.ResolutionDescription, I.ResolutionTime
-                FROM Risk I
-                JOIN Employee E ON I.EmployeeID = E.ID
-                JOIN Demand D ON I.DemandID = D.ID
-                JOIN Employee E2 ON D.ProjectManagerID = E2.ID
-                WHERE E2.Email = %s
-                {"AND I.Status = 'Pending'" if only_pending else ""}
-                ORDER BY I.TimeRaised {order}
-            """
-            cursor.execute(query, (st.session_state.email,))
-        risks = cursor.fetchall()
-        return pd.DataFrame(risks)
+        return queries.risks(st.session_state.email, st.session_state.is_admin, order, only_pending)
     except mysql.connector.Error as e:
         st.error(f"❌ Error fetching risks: {str(e)}")
         return pd.DataFrame()
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
 
 def update_risk(employee_id, demand_id, time_raised, new_description, new_status, resolution_description=None, resolution_time=None):
-    conn = get_db_connection()
+    conn = get_connection()
     if not conn:
         return False
+    cursor = None
     try:
         cursor = conn.cursor()
         if new_status == "Resolved":
@@ -292,14 +175,13 @@ def update_risk(employee_id, demand_id, time_raised, new_description, new_status
                 WHERE EmployeeID=%s AND DemandID=%s AND TimeRaised=%s
             """, (new_description, new_status, employee_id, demand_id, time_raised))
         conn.commit()
+        mark_tables_changed("Risk")
         return True
     except mysql.connector.Error as e:
         st.error(f"❌ Error updating risk: {str(e)}")
         return False
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+        release_connection(cursor, conn)
 
 # Initialize session state for success message
 if 'success_message' not in st.session_state:
@@ -310,8 +192,24 @@ if st.session_state.success_message:
     st.success(st.session_state.success_message)
     st.session_state.success_message = None
 
+# The sort radios below keep their value in session state, so the lists they
+# drive can be loaded up front together with everything else the tabs need.
+issue_order = "DESC" if st.session_state.get("issue_sort", "Newest to Oldest") == "Newest to Oldest" else "ASC"
+risk_order = "DESC" if st.session_state.get("risk_sort", "Newest to Oldest") == "Newest to Oldest" else "ASC"
+page_reads = {
+    "demands": fetch_demands,
+    "employee_id": (get_employee_id, st.session_state.email),
+    "issues": (fetch_issues, issue_order),
+    "pending_issues": (fetch_issues, "DESC", True),
+    "risks": (fetch_risks, risk_order),
+    "pending_risks": (fetch_risks, "DESC", True),
+}
+if st.session_state.is_admin:
+    page_reads["employees"] = fetch_employees
+loaded = run_concurrently(page_reads)
+
 # Fetch demands
-demands = fetch_demands()
+demands = loaded["demands"]
 if not demands:
     st.error("❌ Failed to load demands. Please check your database connection or demand assignments.")
 else:
@@ -322,7 +220,7 @@ else:
     with tab1:
         with st.form("issue_form"):
             st.subheader("🚨 Raise a New Issue")
-            employee_id = get_employee_id(st.session_state.email)
+            employee_id = loaded["employee_id"]
             if not employee_id:
                 st.error("❌ Could not retrieve your employee ID. Please check your account.")
             else:
@@ -361,12 +259,12 @@ else:
         sort_order = st.radio("Sort by Time Raised", ["Newest to Oldest", "Oldest to Newest"], horizontal=True, key="issue_sort")
         order_sql = "DESC" if sort_order == "Newest to Oldest" else "ASC"
 
-        all_issues = fetch_issues(order=order_sql)
+        all_issues = loaded["issues"] if order_sql == issue_order else fetch_issues(order=order_sql)
 
         # Filtering
         st.markdown("### 🔍 Filter Issues")
         if st.session_state.is_admin:
-            emp_filter = st.selectbox("Filter by Employee", ["All"] + [f"{name} (ID: {eid})" for eid, name in fetch_employees()], key="issue_emp_filter")
+            emp_filter = st.selectbox("Filter by Employee", ["All"] + [f"{name} (ID: {eid})" for eid, name in loaded["employees"]], key="issue_emp_filter")
             demand_filter = st.selectbox("Filter by Demand", ["All"] + list(demand_map.keys()), key="issue_demand_filter")
             status_filter = st.selectbox("Filter by Status", ["All", "Pending", "Resolved"], key="issue_status_filter")
         else:
@@ -394,7 +292,7 @@ else:
 
     with tab2:
         st.subheader("✏️ Update an Existing Issue")
-        issues = fetch_issues(order="DESC", only_pending=True)
+        issues = loaded["pending_issues"]
         if issues.empty:
             st.info("No pending issues found.")
         else:
@@ -445,7 +343,7 @@ else:
     with tab3:
         with st.form("risk_form"):
             st.subheader("🚨 Raise a New Risk")
-            employee_id = get_employee_id(st.session_state.email)
+            employee_id = loaded["employee_id"]
             if not employee_id:
                 st.error("❌ Could not retrieve your employee ID. Please check your account.")
             else:
@@ -484,12 +382,12 @@ else:
         sort_order = st.radio("Sort by Time Raised", ["Newest to Oldest", "Oldest to Newest"], horizontal=True, key="risk_sort")
         order_sql = "DESC" if sort_order == "Newest to Oldest" else "ASC"
 
-        all_risks = fetch_risks(order=order_sql)
+        all_risks = loaded["risks"] if order_sql == risk_order else fetch_risks(order=order_sql)
 
         # Filtering
         st.markdown("### 🔍 Filter Risks")
         if st.session_state.is_admin:
-            emp_filter = st.selectbox("Filter by Employee", ["All"] + [f"{name} (ID: {eid})" for eid, name in fetch_employees()], key="risk_emp_filter")
+            emp_filter = st.selectbox("Filter by Employee", ["All"] + [f"{name} (ID: {eid})" for eid, name in loaded["employees"]], key="risk_emp_filter")
             demand_filter = st.selectbox("Filter by Demand", ["All"] + list(demand_map.keys()), key="risk_demand_filter")
             status_filter = st.selectbox("Filter by Status", ["All", "Pending", "Resolved"], key="risk_status_filter")
         else:
@@ -517,7 +415,7 @@ else:
 
     with tab4:
         st.subheader("✏️ Update an Existing Risk")
-        risks = fetch_risks(order="DESC", only_pending=True)
+        risks = loaded["pending_risks"]
         if risks.empty:
             st.info("No pending risks found.")
         else:
@@ -563,4 +461,6 @@ else:
                         )
                         if success:
                             st.session_state.success_message = "✅ Risk updated successfully."
-                            st.rerun()
\ No newline at end of file
+                            st.rerun()
+
+finish_rerun()
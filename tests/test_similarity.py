@@ -0,0 +1,48 @@
+from utils.similarity import SimilarityIndex, _compatible
+
+OPEN_ISSUES = "Show me all the open issues raised against demands managed by each project manager"
+OPEN_ISSUES_SQL = "SELECT E.Name, COUNT(*) FROM Issues I JOIN Demand D ON I.DemandID = D.ID JOIN Employee E ON D.ProjectManagerID = E.ID WHERE I.Status = 'Pending' GROUP BY E.Name"
+NEWEST_UPDATES = "Show the newest status updates for each demand"
+NEWEST_UPDATES_SQL = "SELECT DemandID, StatusUpdate FROM StatusUpdates ORDER BY UpdateTime DESC"
+
+
+def _best_score(question, stored_question, stored_sql):
+    index = SimilarityIndex()
+    index.add(stored_question, stored_sql, "")
+    index.add("List all vendors", "SELECT VendorName FROM Vendor", "")
+    return index.nearest(question, k=1)[0][0]
+
+
+def test_antonym_status_is_not_reused():
+    question = "Show me all the closed issues raised against demands managed by each project manager"
+    assert _best_score(question, OPEN_ISSUES, OPEN_ISSUES_SQL) >= 0.75
+    assert not _compatible(question, OPEN_ISSUES, OPEN_ISSUES_SQL)
+
+
+def test_antonym_ordering_is_not_reused():
+    question = "Show the oldest status updates for each demand"
+    assert _best_score(question, NEWEST_UPDATES, NEWEST_UPDATES_SQL) >= 0.75
+    assert not _compatible(question, NEWEST_UPDATES, NEWEST_UPDATES_SQL)
+
+
+def test_other_differing_words_are_not_reused():
+    stored = "Which project managers have the most demands?"
+    sql = "SELECT ProjectManagerID, COUNT(*) FROM Demand GROUP BY ProjectManagerID ORDER BY 2 DESC"
+    for question in (
+        "Which project managers have the least demands?",
+        "Which project managers have the most demands ascending?",
+        "Which project managers don't have the most demands?",
+    ):
+        assert not _compatible(question, stored, sql), question
+
+
+def test_numbers_and_literals_must_agree():
+    sql = "SELECT * FROM Issues WHERE DemandID = 12 AND Status = 'Pending'"
+    assert not _compatible("Pending issues for demand 21", "Pending issues for demand 12", sql)
+    assert not _compatible("Issues for Openwave", "Issues for Open", "SELECT * FROM Company WHERE Name = 'Open'")
+
+
+def test_rewording_is_reused():
+    assert _compatible("List the open issues raised against demands managed by every project manager", OPEN_ISSUES, OPEN_ISSUES_SQL)
+    assert _compatible("newest status update for each demand please", NEWEST_UPDATES, NEWEST_UPDATES_SQL)
+    assert _compatible("Show me all active demands", "active demands", "SELECT * FROM Demand WHERE Status = 'Active'")
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+from utils import metrics
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds and can be
+    evicted by table name. Shared by every session in the Streamlit process.
+    Lookups are reported to utils.metrics under `name`.
+    """
+
+    def __init__(self, name, maxsize=256, ttl=300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, tables, value)
+        self._by_table = {}  # table -> set of keys that read it
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None when absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                metrics.record_cache(self.name, hit=False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.record_cache(self.name, hit=True)
+            return entry[2]
+
+    def put(self, key, value, tables=()):
+        """Store value under key, remembering which tables it was read from."""
+        tables = frozenset(t.lower() for t in tables)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, tables, value)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tables(self, *tables):
+        """Drop every entry that reads any of the given tables. Returns the count removed."""
+        removed = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table.lower(), ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def discard(self, key):
+        """Drop one entry, if present."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
@@ -0,0 +1,81 @@
+"""
+Earlier SQL Agent turns, packed into a bounded slice of the prompt.
+
+Follow-ups such as "now only the high priority ones" need the previous
+query. The latest turn is sent as the model wrote it; older turns are
+compacted to their SQL plus a one-line result summary, and turns are
+dropped oldest-first once [sql_agent] history_tokens would be exceeded, so
+the request stays the same size however long the session runs. Result
+DataFrames never reach the prompt, only their shape. Only questions that
+looks_like_follow_up() are sent with history; the rest keep sharing the
+LLM cache and in-flight requests with every other session.
+"""
+import re
+
+from utils.prompts import approx_tokens
+from utils.utils import get_setting
+
+# Openers and pronouns that only make sense relative to the previous answer
+_FOLLOW_UP = re.compile(
+    r"^\s*(and|but|now|only|also|instead|then|just|same|what about|how about|sort|order|group|filter|exclude|limit)\b"
+    r"|\b(them|those|these|ones|it|its|that one|above|previous|earlier|same)\b",
+    re.IGNORECASE,
+)
+
+MAX_QUESTION_CHARS = 300
+
+
+def looks_like_follow_up(question):
+    """True when the question probably refers back to an earlier answer."""
+    return bool(_FOLLOW_UP.search(question))
+
+
+def result_summary(columns, result):
+    """One line describing what a run_sql call returned, without any of the data."""
+    if not columns:
+        first_line = str(result).strip().splitlines()[0] if str(result).strip() else "unknown error"
+        return f"failed: {first_line[:160]}"
+    shown = ", ".join(str(c) for c in list(columns)[:8]) + (", ..." if len(columns) > 8 else "")
+    rows = f"{len(result)}+" if result.attrs.get("truncated") else str(len(result))
+    return f"{rows} rows; columns: {shown}"
+
+
+def turns(messages):
+    """(question, assistant message) pairs from st.session_state.messages, oldest first."""
+    pairs = []
+    for message, reply in zip(messages, messages[1:]):
+        if message["role"] == "user" and reply["role"] == "assistant":
+            pairs.append((message["content"], reply))
+    return pairs
+
+
+def _full(reply):
+    text = reply.get("response") or reply.get("content", "")
+    return f"{text}\nResult: {reply['summary']}" if reply.get("summary") else text
+
+
+def _compact(reply):
+    sql = f"```sql\n{reply['sql']}\n```" if reply.get("sql") else "(no SQL)"
+    return f"{sql}\nResult: {reply.get('summary', 'not run')}"
+
+
+def history_messages(messages, budget=None, max_turns=None):
+    """
+    Chat-completion messages for the earlier turns, newest kept in full, all
+    within `budget` tokens ([sql_agent] history_tokens) and `max_turns` turns.
+    """
+    budget = int(budget if budget is not None else get_setting("sql_agent", "history_tokens", 1200))
+    max_turns = int(max_turns if max_turns is not None else get_setting("sql_agent", "history_turns", 6))
+    packed, used = [], 0
+    for age, (question, reply) in enumerate(reversed(turns(messages)[-max_turns:] if max_turns > 0 else [])):
+        question = question[:MAX_QUESTION_CHARS]
+        forms = [_full(reply), _compact(reply)] if age == 0 else [_compact(reply)]
+        for answer in forms:
+            cost = approx_tokens(question) + approx_tokens(answer)
+            if used + cost <= budget:
+                break
+        else:
+            break
+        packed[:0] = [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+        used += cost
+    return packed
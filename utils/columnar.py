@@ -0,0 +1,68 @@
+from mysql.connector import FieldFlag, FieldType
+import pyarrow as pa
+
+BINARY_CHARSET = 63  # MySQL's "binary" collation id: BLOB rather than TEXT
+
+_INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.INT24, FieldType.LONGLONG, FieldType.YEAR}
+_FLOAT_TYPES = {FieldType.FLOAT, FieldType.DOUBLE}
+_DATETIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP}
+_DATE_TYPES = {FieldType.DATE, FieldType.NEWDATE}
+_TEXT_TYPES = {
+    FieldType.VARCHAR, FieldType.VAR_STRING, FieldType.STRING, FieldType.ENUM, FieldType.SET,
+    FieldType.TINY_BLOB, FieldType.MEDIUM_BLOB, FieldType.LONG_BLOB, FieldType.BLOB, FieldType.JSON,
+}
+
+
+def arrow_type(column):
+    """
+    Arrow type for one cursor.description entry, or None to let pyarrow infer
+    it (DECIMAL and anything unusual). ENUM columns become dictionary-encoded
+    strings, TEXT becomes string and binary BLOB becomes binary.
+    """
+    type_code = column[1]
+    flags = column[7] if len(column) > 7 else 0
+    charset = column[8] if len(column) > 8 else None
+
+    if type_code in _INTEGER_TYPES:
+        if type_code == FieldType.LONGLONG and flags & FieldFlag.UNSIGNED:
+            return pa.uint64()
+        return pa.int64()
+    if type_code in _FLOAT_TYPES:
+        return pa.float64()
+    if type_code in _DATE_TYPES:
+        return pa.date32()
+    if type_code in _DATETIME_TYPES:
+        return pa.timestamp("us")
+    if type_code == FieldType.TIME:
+        return pa.duration("us")
+    if type_code in _TEXT_TYPES:
+        if type_code == FieldType.ENUM or flags & FieldFlag.ENUM:
+            return pa.dictionary(pa.int32(), pa.string())
+        if charset == BINARY_CHARSET and type_code != FieldType.JSON:
+            return pa.binary()
+        return pa.string()
+    return None
+
+
+def _column_array(values, type_):
+    try:
+        if type_ is not None and pa.types.is_dictionary(type_):
+            return pa.array(values, type=pa.string()).dictionary_encode()
+        return pa.array(values, type=type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # Value didn't match the declared type (e.g. a zero date); let Arrow infer it
+        return pa.array(values)
+
+
+def rows_to_record_batch(description, rows):
+    """Turn one batch of cursor rows into a RecordBatch, column by column."""
+    names = [column[0] for column in description]
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    arrays = [_column_array(list(values), arrow_type(column)) for values, column in zip(columns, description)]
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def batches_to_table(batches):
+    """Concatenate batches whose inferred types may differ (e.g. an all-NULL first batch)."""
+    tables = [pa.Table.from_batches([batch]) for batch in batches]
+    return pa.concat_tables(tables, promote_options="permissive")
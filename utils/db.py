@@ -1,29 +1,723 @@
+import contextvars
+import json
+import logging
+import random
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
 import mysql.connector
+from mysql.connector import errorcode, pooling
 import streamlit as st
-import re
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from utils import metrics
+from utils.cache import QueryCache
+from utils.columnar import batches_to_table, rows_to_record_batch
+from utils.explain import check_plan, summarize_plan
+from utils.singleflight import SingleFlight
+from utils.sqltext import add_execution_time_hint, inject_limit, is_select, is_volatile, normalize_sql, referenced_tables
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Client/server errors that are worth retrying: the server went away, the
+# connection dropped mid-flight, or the server is briefly out of connections.
+TRANSIENT_ERRNOS = {
+    errorcode.CR_CONN_HOST_ERROR,
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+    errorcode.ER_CON_COUNT_ERROR,
+}
+
+_pool = None
+_replica_pool = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "checkouts": 0,
+    "returns": 0,
+    "retries": 0,
+    "failures": 0,
+    "recycled": 0,
+    "wait_seconds": 0.0,
+    "replica_reads": 0,
+    "replica_fallbacks": 0,
+}
+_config_override = None
+_query_cache = None
+_executor = None
+_agent_slots = None
+# Identical SQL Agent queries running at the same time share one execution
+_sql_flight = SingleFlight("sql")
+# Pooled MySQLConnection -> (server-side connection id, time it was (re)opened);
+# weak keys, so entries go away with the pool's connections
+_connection_born = weakref.WeakKeyDictionary()
+# Replica health: unreachable until `down_until`, lag last measured at `lag_checked`
+_replica_state = {"down_until": 0.0, "lag_checked": 0.0, "lagging": False, "lag_unknown_logged": False}
+
+
+def _record(stat, amount=1):
+    with _stats_lock:
+        _stats[stat] += amount
+
+
+def configure(host, port, user, password, database, ssl_disabled=True):
+    """
+    Point the data layer at another server instead of the [db] block of
+    secrets.toml, e.g. the local benchmark database. Call before the first query.
+    """
+    global _config_override, _pool, _replica_pool
+    _config_override = {
+        "host": host,
+        "port": int(port),
+        "user": user,
+        "password": password,
+        "database": database,
+        "ssl_disabled": ssl_disabled,
+    }
+    _pool = _replica_pool = None
+
+
+def db_config():
+    """Build mysql.connector arguments from the [db] block of secrets.toml."""
+    if _config_override:
+        return dict(_config_override)
+    host = st.secrets["db"]["host"]
+    return {
+        "host": host,
+        "port": int(st.secrets["db"]["port"]),
+        "user": st.secrets["db"]["user"],
+        "password": st.secrets["db"]["pass"],
+        "database": st.secrets["db"]["name"],
+        # Railway's public proxy (*.proxy.rlwy.net) only accepts TLS connections
+        "ssl_disabled": "proxy.rlwy.net" not in host,
+    }
+
+
+def replica_config():
+    """
+    mysql.connector arguments from the optional [db_replica] block, or None.
+    user / pass / name default to the [db] values.
+    """
+    if _config_override:
+        return None
+    try:
+        replica = st.secrets["db_replica"]
+    except (KeyError, FileNotFoundError):
+        return None
+    config = db_config()
+    host = replica["host"]
+    config.update({
+        "host": host,
+        "port": int(replica.get("port", config["port"])),
+        "user": replica.get("user", config["user"]),
+        "password": replica.get("pass", config["password"]),
+        "database": replica.get("name", config["database"]),
+        "ssl_disabled": "proxy.rlwy.net" not in host,
+        "connection_timeout": int(replica.get("connect_timeout", 3)),
+    })
+    return config
+
+
+class _Pool(pooling.MySQLConnectionPool):
+    """
+    Connection pool that keeps count of connections handed back to it.
+
+    Sessions are not reset on return (that would deallocate the prepared
+    statements in utils.prepared), so a transaction left open by an
+    error path is rolled back here instead.
+    """
+
+    def add_connection(self, cnx=None):
+        if cnx is not None:
+            try:
+                if cnx.is_connected() and cnx.in_transaction:
+                    cnx.rollback()
+            except mysql.connector.Error as e:
+                logger.warning(f"Could not roll back returned connection: {e}")
+        super().add_connection(cnx)
+        if cnx is not None:
+            _record("returns")
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                size = int(get_setting("db", "pool_size", 5))
+                size = max(1, min(size, pooling.CNX_POOL_MAXSIZE))
+                _pool = _Pool(pool_name="quokka", pool_size=size, pool_reset_session=False, **db_config())
+                logger.info(f"Created MySQL connection pool with {size} connections")
+    return _pool
+
+
+def _get_replica_pool():
+    global _replica_pool
+    if _replica_pool is None:
+        with _pool_lock:
+            if _replica_pool is None:
+                size = int(get_setting("db_replica", "pool_size", get_setting("db", "pool_size", 5)))
+                size = max(1, min(size, pooling.CNX_POOL_MAXSIZE))
+                _replica_pool = _Pool(pool_name="quokka_replica", pool_size=size, pool_reset_session=False, **replica_config())
+                logger.info(f"Created MySQL read-replica pool with {size} connections")
+    return _replica_pool
+
+
+def is_transient_error(error):
+    """
+    True for connection-level MySQL errors. Pool exhaustion is not one:
+    _checkout has already waited [db] pool_timeout for a free slot.
+    """
+    if isinstance(error, mysql.connector.errors.PoolError):
+        return False
+    return isinstance(error, mysql.connector.Error) and error.errno in TRANSIENT_ERRNOS
+
+
+def with_retry(fn, *args, **kwargs):
+    """
+    Call fn, retrying transient MySQL errors with jittered exponential backoff.
+    The number of attempts and base delay come from [db] retry_attempts / retry_backoff.
+    """
+    attempts = int(get_setting("db", "retry_attempts", 3))
+    backoff = float(get_setting("db", "retry_backoff", 0.2))
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn(*args, **kwargs)
+        except mysql.connector.Error as e:
+            if attempt == attempts or not is_transient_error(e):
+                _record("failures")
+                raise
+            delay = backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            logger.warning(f"Transient database error ({e}); retry {attempt}/{attempts - 1} in {delay:.2f}s")
+            _record("retries")
+            time.sleep(delay)
+
+
+def _checkout(timeout, get_pool=_get_pool):
+    """Take a connection from the pool, waiting up to `timeout` seconds if it is exhausted."""
+    pool = get_pool()
+    deadline = time.monotonic() + timeout
+    started = time.monotonic()
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+    _record("wait_seconds", time.monotonic() - started)
+    _record("checkouts")
+    return conn
+
+
+def _recycle_if_old(conn):
+    recycle = float(get_setting("db", "pool_recycle", 1800))
+    now = time.monotonic()
+    cnx = getattr(conn, "_cnx", conn)
+    connection_id, born = _connection_born.get(cnx, (None, now))
+    if connection_id != conn.connection_id:
+        # First checkout, or the pool reconnected it since: its age starts now
+        born = now
+    if recycle and now - born > recycle:
+        try:
+            conn.reconnect()
+        except mysql.connector.Error:
+            # Hand the slot back (the pool reconnects it on a later checkout)
+            # rather than leaking it: pooled connections have no __del__
+            release_connection(None, conn)
+            raise
+        born = time.monotonic()
+        _record("recycled")
+    _connection_born[cnx] = (conn.connection_id, born)
+
+
+# --- Read/write routing ---
+# Reads that opt in with read_only=True go to the [db_replica] server when one
+# is configured, reachable and caught up; everything else uses the primary.
+def _in_session():
+    return get_script_run_ctx(suppress_warning=True) is not None
+
+
+def stick_to_primary():
+    """Send this session's reads to the primary for [db_replica] sticky_seconds (read-your-own-writes)."""
+    if _in_session():
+        st.session_state["_primary_until"] = time.monotonic() + float(get_setting("db_replica", "sticky_seconds", 30))
+
+
+def _pinned_to_primary():
+    """Whether this session wrote recently and must read from the primary."""
+    return _in_session() and time.monotonic() < st.session_state.get("_primary_until", 0.0)
+
+
+def _replica_allowed():
+    if replica_config() is None or time.monotonic() < _replica_state["down_until"]:
+        return False
+    return not _pinned_to_primary()
+
+
+def _replica_lag(conn):
+    """Seconds_Behind_Source of the replica: 0 when it is not a replica, None while replication is stopped."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.ProgrammingError:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL before 8.0.22
+        rows = cursor.fetchall()
+    except mysql.connector.Error as e:
+        if not _replica_state["lag_unknown_logged"]:
+            logger.warning(f"Cannot read replica lag, assuming it is caught up: {e}")
+            _replica_state["lag_unknown_logged"] = True
+        return 0
+    finally:
+        cursor.close()
+    if not rows:
+        return 0
+    return rows[0].get("Seconds_Behind_Source", rows[0].get("Seconds_Behind_Master"))
+
+
+def _replica_lagging(conn):
+    interval = float(get_setting("db_replica", "lag_check_interval", 10))
+    if time.monotonic() - _replica_state["lag_checked"] >= interval:
+        max_lag = float(get_setting("db_replica", "max_lag_seconds", 5))
+        lag = _replica_lag(conn)
+        _replica_state["lagging"] = lag is None or lag > max_lag
+        _replica_state["lag_checked"] = time.monotonic()
+        if _replica_state["lagging"]:
+            logger.warning(f"Replica lag is {lag if lag is not None else 'unknown (replication stopped)'}s; reading from primary")
+    return _replica_state["lagging"]
+
+
+def _replica_connection(timeout):
+    """A replica connection, or None when reads should fall back to the primary."""
+    try:
+        conn = _checkout(timeout, _get_replica_pool)
+        _recycle_if_old(conn)
+    except mysql.connector.Error as e:
+        retry_after = float(get_setting("db_replica", "retry_after", 30))
+        _replica_state["down_until"] = time.monotonic() + retry_after
+        logger.warning(f"Read replica unavailable, using primary for {retry_after:g}s: {e}")
+        return None
+    if _replica_lagging(conn):
+        conn.close()
+        return None
+    return conn
+
+
+def get_connection(read_only=False):
+    """
+    Borrow a connection from the process-wide pool.
+
+    The pool pings each connection as it is handed out and reconnects dead ones;
+    connections older than [db] pool_recycle seconds are reopened as well.
+    Calling close() on the returned connection hands it back to the pool.
+    Every query run on its cursors is recorded in utils.metrics.
+
+    With read_only=True the connection may come from the [db_replica] server,
+    unless it is down, lagging more than max_lag_seconds, or this session
+    wrote recently (see stick_to_primary). Writes must use the default.
+    Raises mysql.connector.Error when no connection can be obtained.
+    """
+    timeout = float(get_setting("db", "pool_timeout", 10))
+
+    if read_only and _replica_allowed():
+        conn = _replica_connection(timeout)
+        if conn is not None:
+            _record("replica_reads")
+            return metrics.InstrumentedConnection(conn)
+        _record("replica_fallbacks")
+
+    conn = with_retry(_checkout, timeout)
+    _recycle_if_old(conn)
+    return metrics.InstrumentedConnection(conn)
+
+
+def pool_stats():
+    """Snapshot of pool counters, e.g. for an admin page or log line."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pool_size"] = _pool.pool_size if _pool else 0
+    stats["replica_pool_size"] = _replica_pool.pool_size if _replica_pool else 0
+    stats["in_use"] = stats["checkouts"] - stats["returns"]
+    return stats
+
+
+def release_connection(cursor, conn, discard=False):
+    """Close the cursor and hand the connection back to the pool."""
+    if discard and conn:
+        # Unread rows are still in flight; drop the socket so the pool
+        # reconnects on next checkout instead of draining the rest of the result.
+        try:
+            conn.disconnect()
+        except mysql.connector.Error:
+            pass
+    for resource in (cursor, conn):
+        try:
+            if resource: resource.close()
+        except Exception:
+            pass
+
+
+def _stream_dataframe(cursor, max_rows, max_bytes, batch_size):
+    """
+    Build a DataFrame from `cursor` one fetchmany() batch at a time, stopping at
+    the row or byte budget. Each batch goes straight into an Arrow record batch,
+    so rows are never held as tuples and as a DataFrame at the same time.
+    Returns (df, truncated_by) where truncated_by is None, "rows" or "bytes".
+    """
+    batches = []
+    total_rows = total_bytes = 0
+    truncated_by = None
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        room = max_rows - total_rows
+        if room <= 0:
+            truncated_by = "rows"
+            break
+        if len(rows) > room:
+            rows = rows[:room]
+            truncated_by = "rows"
+        batch = rows_to_record_batch(cursor.description, rows)
+        if total_bytes + batch.nbytes > max_bytes:
+            # Keep the rows that fit, at the batch's average row size, and
+            # always at least one so a wide first batch is not dropped whole
+            truncated_by = "bytes"
+            fit = int(len(rows) * (max_bytes - total_bytes) / batch.nbytes)
+            if not batches:
+                fit = max(fit, 1)
+            if fit <= 0:
+                break
+            batch = rows_to_record_batch(cursor.description, rows[:fit])
+        batches.append(batch)
+        total_rows += batch.num_rows
+        total_bytes += batch.nbytes
+        if truncated_by:
+            break
+
+    if not batches:
+        batches.append(rows_to_record_batch(cursor.description, []))
+    return batches_to_table(batches).to_pandas(), truncated_by
+
+
+def _result_cache():
+    global _query_cache
+    if _query_cache is None:
+        with _pool_lock:
+            if _query_cache is None:
+                _query_cache = QueryCache(
+                    name="sql_agent",
+                    maxsize=int(get_setting("sql_agent", "cache_size", 256)),
+                    ttl=float(get_setting("sql_agent", "cache_ttl", 300)),
+                )
+    return _query_cache
+
+
+# --- Cross-process table version counters ---
+# Each write bumps a per-table counter stored in MySQL, so every Streamlit
+# worker process can tell when its cached copy of a table is stale. The
+# CacheVersion table comes from migrations/0003_cache_version.sql; until it is
+# applied (`python -m utils.migrate up`, reported by `verify`) lookups run
+# uncached and version bumps are logged as failed.
+_versions_memo = None  # (fetched_at, {table: version})
+
+
+def table_versions():
+    """
+    Current {table: version} map from the CacheVersion table on the primary.
+    The map is reused for [db] version_check_interval seconds so one rerun pays
+    for a single lookup.
+    """
+    global _versions_memo
+    interval = float(get_setting("db", "version_check_interval", 1.0))
+    memo = _versions_memo
+    if memo and time.monotonic() - memo[0] < interval:
+        return memo[1]
+
+    conn = cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT TableName, Version FROM CacheVersion")
+        versions = {name.lower(): version for name, version in cursor.fetchall()}
+    finally:
+        release_connection(cursor, conn)
+    _versions_memo = (time.monotonic(), versions)
+    return versions
+
 
-def run_sql(query):
+def read_table_versions(cursor, tables):
+    """
+    Version counters of `tables`, in order, as seen by the cursor's own
+    connection. Read before the data on a replica connection, they tell which
+    writes the rows already reflect.
+    """
+    cursor.execute("SELECT TableName, Version FROM CacheVersion")
+    versions = {name.lower(): version for name, version in cursor.fetchall()}
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def bump_table_versions(*tables):
+    """Increment the version counter of each table after a committed write."""
+    global _versions_memo
+    conn = cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO CacheVersion (TableName, Version) VALUES (%s, 1) "
+            "ON DUPLICATE KEY UPDATE Version = Version + 1",
+            [(table.lower(),) for table in tables],
+        )
+        conn.commit()
+    finally:
+        release_connection(cursor, conn)
+        _versions_memo = None
+
+
+def mark_tables_changed(*tables):
+    """
+    Call after committing a write so cached reads of those tables are dropped.
+    Every INSERT/UPDATE path in the pages reports the tables it touched here;
+    other worker processes notice through the CacheVersion counters. The
+    session's reads also stay on the primary for a while (read-your-own-writes).
+    """
+    stick_to_primary()
+    removed = _result_cache().invalidate_tables(*tables)
+    if removed:
+        logger.info(f"Invalidated {removed} cached SQL Agent results for {', '.join(tables)}")
+    try:
+        bump_table_versions(*tables)
+    except mysql.connector.Error as e:
+        # The write itself already committed; worst case other processes serve
+        # their cached lists until the entry expires.
+        logger.warning(f"Could not bump cache versions for {', '.join(tables)}: {e}")
+
+
+class QueryTimeout(Exception):
+    """Raised when an SQL Agent query runs past its time limit and is cancelled."""
+
+    def __init__(self, seconds):
+        super().__init__(f"Query exceeded {seconds:g} seconds and was cancelled.")
+        self.seconds = seconds
+
+
+class QueryRejected(Exception):
+    """Raised when EXPLAIN estimates a query to be too expensive to run."""
+
+
+class QueryBusy(Exception):
+    """Raised when every SQL Agent query slot stayed taken for [sql_agent] queue_timeout seconds."""
+
+
+def _limited_fetch(*args):
+    """
+    _fetch behind a cap of [sql_agent] max_concurrent_queries, so a burst of
+    ad-hoc queries cannot take every pooled connection from the other pages.
+    """
+    global _agent_slots
+    if _agent_slots is None:
+        with _pool_lock:
+            if _agent_slots is None:
+                _agent_slots = threading.BoundedSemaphore(int(get_setting("sql_agent", "max_concurrent_queries", 4)))
+    if not _agent_slots.acquire(timeout=float(get_setting("sql_agent", "queue_timeout", 10))):
+        raise QueryBusy()
+    try:
+        return _fetch(*args)
+    finally:
+        _agent_slots.release()
+
+
+def _explain(cursor, query, params=None):
+    cursor.execute("EXPLAIN FORMAT=JSON " + query, params or None)
+    rows = cursor.fetchall()
+    return summarize_plan(json.loads(rows[0][0]))
+
+
+def explain_query(query):
+    """
+    EXPLAIN a read-only query on a pooled connection and return its plan summary
+    (rows_examined, full_scans, full_scan_tables, query_cost).
+    Raises mysql.connector.Error when the query does not compile.
+    """
+    conn = cursor = None
+    try:
+        conn = get_connection(read_only=True)
+        cursor = conn.cursor()
+        return _explain(cursor, query)
+    finally:
+        release_connection(cursor, conn)
+
+
+def plan_problem(summary):
+    """Why a plan summary is over the [sql_agent] cost limits, or None."""
+    max_rows_examined = int(get_setting("sql_agent", "max_rows_examined", 5_000_000))
+    max_full_scans = get_setting("sql_agent", "max_full_scans", 3)
+    return check_plan(summary, max_rows_examined, max_full_scans)
+
+
+def _cost_gate(cursor, query, params=None):
+    problem = plan_problem(_explain(cursor, query, params))
+    if problem:
+        logger.warning(f"Rejected SQL Agent query ({problem}): {query}")
+        raise QueryRejected(problem)
+
+
+def _kill_query(connection_id, config):
+    """Abort the statement running on another connection (KILL QUERY keeps the session)."""
+    conn = None
+    try:
+        # Deliberately outside the pool: it may be the pool that is exhausted.
+        conn = mysql.connector.connect(**config)
+        cursor = conn.cursor()
+        cursor.execute(f"KILL QUERY {int(connection_id)}")
+        cursor.close()
+        logger.warning(f"Killed query on connection {connection_id} after client deadline")
+    except mysql.connector.Error as e:
+        logger.error(f"Could not kill query on connection {connection_id}: {e}")
+    finally:
+        if conn: conn.close()
+
+
+def _fetch(query, params, stream, max_rows, max_bytes, batch_size, timeout, cost_gate):
+    conn = cursor = None
+    truncated_by = None
+    watchdog = None
+    timed_out = threading.Event()
+    # Held by a firing watchdog until its KILL is sent; `finished` stops a
+    # late one from killing whatever the next borrower of `conn` runs
+    kill_lock = threading.Lock()
+    finished = False
+    try:
+        conn = get_connection(read_only=True)
+        from_replica = conn.pool_name == "quokka_replica"
+        cursor = conn.cursor()
+        # SHOW / DESCRIBE cannot be EXPLAINed and read no table data; they pass through as before
+        if cost_gate and is_select(query):
+            _cost_gate(cursor, query, params)
+        if timeout:
+            # Server-side limit for SELECTs as a per-statement hint (session
+            # state would outlive this call on the pooled connection), plus a
+            # client-side deadline that KILLs the query if the hint does not apply.
+            query = add_execution_time_hint(query, timeout * 1000)
+            connection_id = conn.connection_id
+            # KILL must be sent to the server that runs the query
+            server = replica_config() if from_replica else db_config()
+
+            def expire():
+                with kill_lock:
+                    if finished:
+                        return
+                    timed_out.set()
+                    _kill_query(connection_id, server)
+
+            watchdog = threading.Timer(timeout + 1, expire)
+            watchdog.daemon = True
+            watchdog.start()
+
+        cursor.execute(query, params or None)
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+
+        if not stream:
+            return columns, cursor.fetchall(), from_replica
+
+        df, truncated_by = _stream_dataframe(cursor, max_rows, max_bytes, batch_size)
+        df.attrs["truncated"] = truncated_by is not None
+        df.attrs["truncated_by"] = truncated_by
+        if truncated_by:
+            logger.info(f"SQL Agent result truncated at {len(df)} rows ({truncated_by} budget)")
+        return columns, df, from_replica
+    except mysql.connector.Error as e:
+        if timed_out.is_set() or e.errno in (errorcode.ER_QUERY_TIMEOUT, errorcode.ER_QUERY_INTERRUPTED):
+            raise QueryTimeout(timeout) from e
+        raise
+    finally:
+        if watchdog:
+            watchdog.cancel()
+            with kill_lock:  # waits out an expire() already running
+                finished = True
+        release_connection(cursor, conn, discard=truncated_by is not None)
+
+
+def run_sql(query, stream=False, max_rows=None, max_bytes=None, batch_size=None, timeout=None, cost_gate=True, params=()):
+    """
+    Run a read-only query from the SQL Agent.
+
+    Returns (columns, rows), or (None, error_message) on failure. With
+    stream=True the rows are fetched in batches into a DataFrame capped at
+    max_rows rows / max_bytes bytes (defaults from [sql_agent] in secrets.toml);
+    df.attrs["truncated"] tells whether the budget cut the result short.
+
+    Execution is limited to `timeout` seconds ([sql_agent] timeout_seconds,
+    default 15): a MAX_EXECUTION_TIME hint on the SELECT plus a client
+    deadline that KILLs the query, reported as "⏱️ Query exceeded N seconds".
+
+    With cost_gate=True a SELECT is first run through EXPLAIN FORMAT=JSON and
+    rejected when the estimated rows examined or full-scan count exceed
+    [sql_agent] max_rows_examined / max_full_scans. A SELECT whose outer query
+    has no LIMIT gets one ([sql_agent] auto_limit, or max_rows + 1 when
+    streaming so truncation is still detected).
+
+    `params` fill %s placeholders in the query (the intent templates in
+    utils/intents.py); LLM-written queries have none.
+
+    Results read from the primary are cached per normalized query text and
+    params until [sql_agent] cache_ttl expires or mark_tables_changed() is
+    called for a table the query reads; replica reads are never cached.
+    Identical queries arriving while one is running wait for its result, and
+    at most [sql_agent] max_concurrent_queries run at once ("⏳" when the
+    queue wait exceeds [sql_agent] queue_timeout).
+    """
     # Check for potentially dangerous operations
     lowered = query.strip().lower()
     if re.search(r"\b(delete|drop|alter|truncate|insert|update)\b", lowered):
         return None, "🚫 Unsafe SQL command detected. Only read-only SELECT queries are allowed."
 
+    if stream:
+        max_rows = max_rows or int(get_setting("sql_agent", "max_rows", 10000))
+        max_bytes = max_bytes or int(get_setting("sql_agent", "max_bytes", 50 * 1024 * 1024))
+        batch_size = batch_size or int(get_setting("sql_agent", "batch_size", 1000))
+
+    if timeout is None:
+        timeout = float(get_setting("sql_agent", "timeout_seconds", 15))
+
+    auto_limit = max_rows + 1 if stream else int(get_setting("sql_agent", "auto_limit", 10000))
+    query = inject_limit(query, auto_limit)
+
+    cache = _result_cache()
+    cacheable = not is_volatile(query)
+    params = tuple(params)
+    # Everything that changes what the caller may get back: an ungated or
+    # longer-running call must not answer for a gated or shorter one
+    key = (normalize_sql(query), params, stream, max_rows, max_bytes, cost_gate, timeout)
+    if cacheable:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    # A session that just wrote must not join a flight that reads the replica
+    flight_key = key + (_pinned_to_primary(),)
     try:
-        conn = mysql.connector.connect(
-            host=st.secrets["db"]["host"],
-            user=st.secrets["db"]["user"],
-            password=st.secrets["db"]["pass"],
-            database=st.secrets["db"]["name"],
-            port=st.secrets["db"]["port"]  # ✅ Include port here
+        *result, from_replica = _sql_flight.do(
+            flight_key, _limited_fetch, query, params, stream, max_rows, max_bytes, batch_size, timeout, cost_gate
         )
-        cursor = conn.cursor()
-        cursor.execute(query)
+        result = tuple(result)
 
-        # Fetch results
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+    except QueryBusy:
+        return None, "⏳ Too many SQL Agent queries are running right now. Please try again in a moment."
+
+    except QueryTimeout as qt:
+        return None, f"⏱️ {qt}"
 
-        return columns, rows
+    except QueryRejected as qr:
+        return None, f"💸 Query rejected as too expensive: {qr}. Try narrowing the question."
 
     except mysql.connector.ProgrammingError as pe:
         return None, f"❌ SQL Syntax Error: {pe}"
@@ -34,12 +728,114 @@ def run_sql(query):
     except Exception as e:
         return None, f"❌ Unexpected Error: {e}"
 
+    # Replica rows may predate a write the cache was just invalidated for;
+    # caching them would serve that lag to every session for the whole TTL
+    if cacheable and not from_replica:
+        cache.put(key, result, referenced_tables(query))
+    return result
+
+
+# --- Arrow-native reads for the data-entry pages ---
+def fetch_arrow(query, params=(), batch_size=10000):
+    """
+    Run a query on a pooled connection and return the result as a pyarrow.Table.
+
+    Rows are pulled with fetchmany() and converted one batch at a time, so the
+    full result never exists as a list of Python tuples. The table can be passed
+    straight to st.dataframe(). Raises mysql.connector.Error on failure.
+    """
+    conn = cursor = None
+    try:
+        conn = get_connection(read_only=True)
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        description = cursor.description or []
+        batches = []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batches.append(rows_to_record_batch(description, rows))
+        if not batches:
+            batches.append(rows_to_record_batch(description, []))
+        return batches_to_table(batches)
     finally:
+        release_connection(cursor, conn)
+
+
+def fetch_dataframe(query, params=(), batch_size=10000):
+    """fetch_arrow() converted to pandas, for pages that filter or relabel the rows."""
+    return fetch_arrow(query, params, batch_size).to_pandas()
+
+
+# --- Concurrent page reads ---
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                workers = int(get_setting("db", "query_workers", get_setting("db", "pool_size", 5)))
+                _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="quokka-query")
+    return _executor
+
+
+def _run_with_script_context(script_ctx, fn, args):
+    # Lets st.session_state / st.error work inside the worker thread.
+    if script_ctx is not None:
+        add_script_run_ctx(threading.current_thread(), script_ctx)
+    return fn(*args)
+
+
+def submit(fn, *args):
+    """
+    Start fn(*args) on the query thread pool and return its Future. The
+    Streamlit script context and contextvars (page label) go with it.
+    """
+    script_ctx = get_script_run_ctx(suppress_warning=True)
+    # Copy contextvars too, so queries stay labelled with the calling page
+    context = contextvars.copy_context()
+    return _get_executor().submit(context.run, _run_with_script_context, script_ctx, fn, args)
+
+
+def run_concurrently(tasks):
+    """
+    Run independent reads at the same time and return {name: result}.
+
+    `tasks` maps a name to a callable or a (callable, *args) tuple, e.g.
+        run_concurrently({"milestones": (get_milestones, demand_id),
+                          "status": (get_status_updates, demand_id)})
+    Tasks run on a bounded process-wide thread pool ([db] query_workers,
+    default pool_size) and each borrows its own pooled connection, so a page
+    waits for its slowest read instead of the sum of all of them. The first
+    exception raised by a task is re-raised once every task has finished.
+    Tasks must not call run_concurrently themselves.
+    """
+    futures = {}
+    for name, task in tasks.items():
+        fn, *args = task if isinstance(task, tuple) else (task,)
+        futures[name] = submit(fn, *args)
+
+    results, error = {}, None
+    for name, future in futures.items():
         try:
-            if cursor: cursor.close()
-            if conn: conn.close()
-        except:
-            pass
+            results[name] = future.result()
+        except Exception as e:
+            error = error or e
+    if error:
+        raise error
+    return results
+
 
+def _pool_metrics():
+    stats = pool_stats()
+    samples = [
+        ("quokka_db_pool_size", "gauge", "Connections in the pool", {}, stats["pool_size"]),
+        ("quokka_db_pool_in_use", "gauge", "Connections currently checked out", {}, stats["in_use"]),
+        ("quokka_db_pool_wait_seconds_total", "counter", "Time spent waiting for a free connection", {}, round(stats["wait_seconds"], 6)),
+    ]
+    for stat in ("checkouts", "retries", "failures", "recycled", "replica_reads", "replica_fallbacks"):
+        samples.append((f"quokka_db_pool_{stat}_total", "counter", f"Pool {stat}", {}, stats[stat]))
+    return samples
 
 
+metrics.register_collector(_pool_metrics)
@@ -0,0 +1,60 @@
+def _number(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _walk(node, summary, loops=1.0):
+    if isinstance(node, list):
+        for item in node:
+            _walk(item, summary, loops)
+        return
+    if not isinstance(node, dict):
+        return
+
+    for key, value in node.items():
+        if key == "nested_loop":
+            # Each table is scanned once per row produced by the join so far.
+            prefix = 1.0
+            for item in value:
+                table = item.get("table", {})
+                _add_table(table, summary, prefix)
+                prefix = _number(table.get("rows_produced_per_join"), prefix)
+                _walk(table, summary)
+        elif key == "table" and isinstance(value, dict):
+            _add_table(value, summary, loops)
+            _walk(value, summary)
+        elif key == "cost_info" and "query_cost" in value:
+            summary["query_cost"] += _number(value["query_cost"])
+        else:
+            _walk(value, summary, loops)
+
+
+def _add_table(table, summary, loops):
+    summary["rows_examined"] += loops * _number(table.get("rows_examined_per_scan"))
+    if table.get("access_type") == "ALL":
+        summary["full_scans"] += 1
+        summary["full_scan_tables"].append(table.get("table_name", "?"))
+
+
+def summarize_plan(plan):
+    """
+    Reduce an EXPLAIN FORMAT=JSON document to the numbers the cost gate uses:
+    estimated rows examined (accounting for nested-loop fan-out), the number of
+    full table scans and the optimizer's query cost.
+    """
+    summary = {"rows_examined": 0.0, "full_scans": 0, "full_scan_tables": [], "query_cost": 0.0}
+    _walk(plan, summary)
+    return summary
+
+
+def check_plan(summary, max_rows_examined, max_full_scans):
+    """Return a human-readable reason when the plan is over budget, else None."""
+    problems = []
+    if max_rows_examined and summary["rows_examined"] > max_rows_examined:
+        problems.append(f"about {summary['rows_examined']:,.0f} rows examined (limit {max_rows_examined:,})")
+    if max_full_scans is not None and summary["full_scans"] > max_full_scans:
+        tables = ", ".join(summary["full_scan_tables"])
+        problems.append(f"{summary['full_scans']} full table scans on {tables} (limit {max_full_scans})")
+    return "; ".join(problems) or None
@@ -0,0 +1,152 @@
+"""
+Shared HTTP client for calls to the LLM endpoint.
+
+One requests.Session per process keeps connections alive between questions,
+so only the first call pays for DNS, TCP and TLS setup. Transient failures
+(connection errors, connect timeouts, 429 and 5xx) are retried with jittered
+exponential backoff, waiting at least as long as the server's Retry-After
+asks. The number of requests in flight is capped by [llm] max_concurrent_requests.
+With [llm] transport = "record" or "replay" the session goes through
+utils/llm_transport.py instead of the network.
+
+    with http_client.post(url, json=payload, headers=headers) as response:
+        result = response.json()
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from utils import llm_transport, metrics
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_session = None
+_slots = None
+
+
+class QueueTimeout(requests.Timeout):
+    """All request slots stayed busy for [llm] queue_timeout seconds."""
+
+
+def _max_concurrent():
+    return int(get_setting("llm", "max_concurrent_requests", 4))
+
+
+def get_session():
+    """The process-wide session, created on first use."""
+    global _session, _slots
+    if _session is None:
+        with _lock:
+            if _session is None:
+                size = _max_concurrent()
+                session = requests.Session()
+                # Retries are handled here, not by urllib3, so Retry-After and metrics stay in one place
+                adapter = llm_transport.adapter(pool_connections=4, pool_maxsize=size, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _slots = threading.BoundedSemaphore(size)
+                _session = session
+    return _session
+
+
+def timeouts():
+    """(connect, read) timeout in seconds from [llm] connect_timeout / read_timeout."""
+    return (
+        float(get_setting("llm", "connect_timeout", 5)),
+        float(get_setting("llm", "read_timeout", 60)),
+    )
+
+
+def _is_retryable(error):
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    # A read timeout means the model may still be working on it; retrying would pay twice
+    return isinstance(error, (requests.ConnectionError, requests.ConnectTimeout)) and not isinstance(error, QueueTimeout)
+
+
+def _retry_after(error):
+    """Seconds requested by a Retry-After header (delta or HTTP date), or None."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _wait(backoff, max_wait):
+    jittered = wait_random_exponential(multiplier=backoff, max=max_wait)
+
+    def wait(retry_state):
+        delay = jittered(retry_state)
+        requested = _retry_after(retry_state.outcome.exception())
+        if requested is not None:
+            delay = max(delay, min(requested, max_wait))
+        return delay
+    return wait
+
+
+def _log_retry(retry_state):
+    error = retry_state.outcome.exception()
+    reason = f"http_{error.response.status_code}" if isinstance(error, requests.HTTPError) else type(error).__name__
+    metrics.record_llm_retry(reason)
+    logger.warning(f"LLM request failed ({error}); retry {retry_state.attempt_number} in {retry_state.next_action.sleep:.2f}s")
+
+
+def _send(method, url, **kwargs):
+    """One attempt. On success the response is returned with its request slot still held."""
+    get_session()
+    if not _slots.acquire(timeout=float(get_setting("llm", "queue_timeout", 60))):
+        raise QueueTimeout(f"All {_max_concurrent()} LLM request slots are busy")
+    try:
+        response = _session.request(method, url, **kwargs)
+        if response.status_code in RETRY_STATUSES:
+            response.close()
+            response.raise_for_status()
+        return response
+    except BaseException:
+        _slots.release()
+        raise
+
+
+@contextmanager
+def request(method, url, **kwargs):
+    """
+    Send a request through the shared session, retrying transient failures.
+    Yields the response (already checked with raise_for_status); it is closed
+    and its slot freed when the block exits, so streamed bodies can be read inside it.
+    """
+    kwargs.setdefault("timeout", timeouts())
+    retrying = Retrying(
+        stop=stop_after_attempt(int(get_setting("llm", "retry_attempts", 3))),
+        wait=_wait(float(get_setting("llm", "retry_backoff", 0.5)), float(get_setting("llm", "retry_max_wait", 20))),
+        retry=retry_if_exception(_is_retryable),
+        before_sleep=_log_retry,
+        reraise=True,
+    )
+    response = retrying(_send, method, url, **kwargs)
+    try:
+        response.raise_for_status()
+        yield response
+    finally:
+        response.close()
+        _slots.release()
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
@@ -0,0 +1,247 @@
+"""
+Answers for the most common SQL Agent questions without an LLM call.
+
+A question is matched against a few intents (demands by status, phase or
+company; issues or risks of a demand; milestones of a demand; vendors by
+service category). The values it names are looked up in the schema's ENUMs
+and in the Demand and Company tables (through the refdata cache), and the
+answer is a fixed SQL template with those values as parameters, so nothing
+from the question ever becomes SQL text.
+
+Only questions whose every word is understood are answered here: anything
+else (counts, dates, "not", a second company, an unknown name) goes to the
+model as before. Disabled with [sql_agent] intent_fast_path = false.
+
+    fast = intents.match("Show paused demands in the Delivery phase")
+    if fast:  # None: ask the model
+        columns, result = run_sql(fast.sql, stream=True, params=fast.params, cost_gate=False)
+"""
+import logging
+import threading
+from dataclasses import dataclass, field
+
+import mysql.connector
+
+from utils import metrics, prepared, prompts
+from utils.refdata import get_reference_data
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Pre-vetted templates; values only ever travel as %s parameters
+DEMANDS_SQL = """
+    SELECT D.ID AS DemandID, D.Name AS DemandName, D.Status, D.Phase, C.Name AS Company
+    FROM Demand D
+    LEFT JOIN Company C ON D.CompanyID = C.ID
+    WHERE {conditions}
+    ORDER BY D.Name
+"""
+DEMAND_FILTERS = {"status": "D.Status = %s", "phase": "D.Phase = %s", "company": "D.CompanyID = %s"}
+ISSUES_SQL = """
+    SELECT I.TimeRaised, I.IssueDescription, I.Status, E.Name AS `Raised By`
+    FROM Issues I
+    LEFT JOIN Employee E ON I.EmployeeID = E.ID
+    WHERE I.DemandID = %s{status}
+    ORDER BY I.TimeRaised DESC
+"""
+RISKS_SQL = """
+    SELECT R.TimeRaised, R.RiskDescription, R.Status, E.Name AS `Raised By`
+    FROM Risk R
+    LEFT JOIN Employee E ON R.EmployeeID = E.ID
+    WHERE R.DemandID = %s{status}
+    ORDER BY R.TimeRaised DESC
+"""
+VENDORS_SQL = """
+    SELECT VendorName, ServiceCategory, ContactPersonName, ContactPersonEmail
+    FROM Vendor
+    WHERE ServiceCategory = %s
+    ORDER BY VendorName
+"""
+
+# The same lookups the data-entry pages use, so they share refdata cache entries
+DEMAND_NAMES = "SELECT ID, Name FROM Demand"
+COMPANY_NAMES = "SELECT ID, Name FROM Company"
+
+SUBJECTS = {
+    "demand": "demands", "demands": "demands", "project": "demands", "projects": "demands",
+    "issue": "issues", "issues": "issues",
+    "risk": "risks", "risks": "risks",
+    "milestone": "milestones", "milestones": "milestones",
+    "vendor": "vendors", "vendors": "vendors", "supplier": "vendors", "suppliers": "vendors",
+}
+
+# Issue and risk statuses as people say them
+ITEM_STATUS = {
+    "pending": "Pending", "open": "Pending", "unresolved": "Pending", "outstanding": "Pending",
+    "resolved": "Resolved", "closed": "Resolved",
+}
+
+# Words that add nothing to what the template returns
+FILLER = {
+    "show", "list", "get", "give", "find", "display", "fetch", "see", "view", "me", "us", "all", "the", "a", "an",
+    "any", "which", "what", "are", "is", "were", "there", "in", "at", "for", "of", "on", "from", "with", "under",
+    "to", "that", "whose", "currently", "current", "please", "status", "phase", "stage", "company", "companies",
+    "service", "services", "category", "categories", "offering", "offer", "providing", "provide", "do", "does", "have", "has",
+    "raised", "logged", "belonging", "belong", "its", "their", "named", "called",
+}
+
+_PUNCTUATION = "\"'`?.,!:;()[]{}"
+
+_lock = threading.Lock()
+_indexes = {}  # query -> (rows, {normalized name: [(ID, Name), ...]})
+
+
+@dataclass
+class Match:
+    intent: str
+    sql: str
+    params: tuple
+    values: dict = field(default_factory=dict)  # what was recognized, for the note shown to the user
+
+    @property
+    def display_sql(self):
+        """The query with its values written in, for showing and for chat history. Never run this."""
+        parts = self.sql.split("%s")
+        text = parts[0]
+        for value, part in zip(self.params, parts[1:]):
+            text += (str(value) if isinstance(value, int) else "'" + str(value).replace("'", "''") + "'") + part
+        return "\n".join(line.strip() for line in text.strip().splitlines())
+
+    def describe(self):
+        return f"{self.intent}: " + ", ".join(f"{key} {value}" for key, value in self.values.items())
+
+
+def _words(text):
+    return [w for w in (word.strip(_PUNCTUATION) for word in text.lower().split()) if w]
+
+
+def _name_index(query):
+    """{normalized name: [(ID, Name), ...]} for a lookup list, rebuilt only when refdata reloads it."""
+    rows = get_reference_data(query)
+    with _lock:
+        cached = _indexes.get(query)
+        if cached and cached[0] is rows:
+            return cached[1]
+    index = {}
+    for row_id, name in rows:
+        key = " ".join(_words(str(name)))
+        if len(key) >= 3:
+            index.setdefault(key, []).append((row_id, name))
+    with _lock:
+        _indexes[query] = (rows, index)
+    return index
+
+
+def _enum_index(table, column):
+    schema = prompts.current_schema() or {}
+    column_type = schema.get(table, {}).get("columns", {}).get(column, "")
+    return {" ".join(_words(value)): [(value, value)] for value in prompts.enum_values(column_type)}
+
+
+def _spans(words, lookups):
+    """
+    (start, end, kind, entries) for every known name or value in `words`,
+    longest first, without overlaps. None when the same words could be two
+    different things, e.g. a demand named after a phase.
+    """
+    longest = max((len(key.split()) for index in lookups.values() for key in index), default=0)
+    found = []
+    for start in range(len(words)):
+        for end in range(min(len(words), start + longest), start, -1):
+            phrase = " ".join(words[start:end])
+            kinds = [(kind, index[phrase]) for kind, index in lookups.items() if phrase in index]
+            if kinds:
+                found.append((start, end, kinds))
+    taken, spans = set(), []
+    for start, end, kinds in sorted(found, key=lambda span: span[0] - span[1]):
+        if taken.isdisjoint(range(start, end)):
+            if len(kinds) > 1:
+                return None
+            taken.update(range(start, end))
+            spans.append((start, end, *kinds[0]))
+    return spans
+
+
+def _understand(question):
+    """(subject, {kind: entry}, item status) when every word is accounted for, else None."""
+    words = _words(question)
+    lookups = {
+        "status": _enum_index("Demand", "Status"),
+        "phase": _enum_index("Demand", "Phase"),
+        "category": _enum_index("Vendor", "ServiceCategory"),
+        "company": _name_index(COMPANY_NAMES),
+        "demand": _name_index(DEMAND_NAMES),
+    }
+    spans = _spans(words, lookups)
+    if spans is None:
+        return None
+    covered = {i for start, end, _, _ in spans for i in range(start, end)}
+    found = {}
+    for _, _, kind, entries in spans:
+        if kind in found or len(entries) > 1:
+            return None  # two values for one filter, or a name shared by several rows
+        found[kind] = entries[0]
+
+    subjects, item_status = set(), set()
+    for i, word in enumerate(words):
+        if i in covered or word in FILLER:
+            continue
+        if word in SUBJECTS:
+            subjects.add(SUBJECTS[word])
+        elif word in ITEM_STATUS:
+            item_status.add(ITEM_STATUS[word])
+        else:
+            return None
+    # "Issues for demand X" names the demand; the subject is the issues
+    if len(subjects) > 1:
+        subjects.discard("demands")
+    if len(subjects) != 1 or len(item_status) > 1:
+        return None
+    return subjects.pop(), found, next(iter(item_status), None)
+
+
+def _build(subject, found, item_status):
+    kinds = set(found)
+    if subject == "demands" and kinds and kinds <= set(DEMAND_FILTERS) and not item_status:
+        kinds = [kind for kind in DEMAND_FILTERS if kind in found]
+        conditions = " AND ".join(DEMAND_FILTERS[kind] for kind in kinds)
+        return Match(
+            "demands",
+            DEMANDS_SQL.format(conditions=conditions),
+            tuple(found[kind][0] for kind in kinds),
+            {kind: found[kind][1] for kind in kinds},
+        )
+    if subject in ("issues", "risks") and kinds == {"demand"}:
+        demand_id, demand = found["demand"]
+        template = ISSUES_SQL if subject == "issues" else RISKS_SQL
+        alias = "I" if subject == "issues" else "R"
+        values = {"demand": demand}
+        params = (demand_id,)
+        if item_status:
+            values["status"] = item_status
+            params += (item_status,)
+        status = f" AND {alias}.Status = %s" if item_status else ""
+        return Match(subject, template.format(status=status), params, values)
+    if subject == "milestones" and kinds == {"demand"} and not item_status:
+        demand_id, demand = found["demand"]
+        return Match("milestones", prepared.STATEMENTS["milestones_by_demand"], (demand_id,), {"demand": demand})
+    if subject == "vendors" and kinds == {"category"} and not item_status:
+        category = found["category"][0]
+        return Match("vendors", VENDORS_SQL, (category,), {"category": category})
+    return None
+
+
+def match(question):
+    """A Match with the SQL and parameters that answer `question`, or None to ask the model."""
+    if not get_setting("sql_agent", "intent_fast_path", True):
+        return None
+    try:
+        understood = _understand(question)
+        result = _build(*understood) if understood else None
+    except mysql.connector.Error as e:
+        logger.warning(f"Intent lookup failed, asking the model instead: {e}")
+        result = None
+    metrics.record_intent(result.intent if result else "none")
+    if result:
+        logger.info(f"Answered by intent template ({result.describe()})")
+    return result
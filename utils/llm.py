@@ -1,10 +1,19 @@
+import contextvars
+import hashlib
+import json
 import logging
 import requests
 import sys
-from pathlib import Path
-from typing import List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Union
 import streamlit as st
 
+from utils import http_client, llm_cache, metrics, prompts
+from utils.singleflight import SingleFlight
+from utils.utils import get_setting
+
 
 def configure_logger() -> logging.Logger:
     logger = logging.getLogger(__name__)
@@ -19,79 +28,342 @@ def configure_logger() -> logging.Logger:
 
 logger = configure_logger()
 
+_executor = None
+_executor_lock = threading.Lock()
+_endpoint_override = None
+# Identical prompts sent while one is in flight share its answer
+_llm_flight = SingleFlight("llm")
+
 
-def load_system_prompt(prompt_path: str = "prompts/sql_assistant.txt") -> str:
+def load_system_prompt(prompt_path: str = "prompts/sql_assistant.txt", question: Optional[str] = None) -> str:
     """
-    Load the system prompt from the given file path.
+    Load the system prompt from the given file path, with {schema} filled in
+    from the live database (see utils/prompts.py; both are cached). Given the
+    question, the schema is pruned to the tables it needs.
     Raises FileNotFoundError if the file is missing.
     """
-    prompt_file = Path(prompt_path)
-    if not prompt_file.is_file():
+    try:
+        return prompts.system_prompt(prompt_path, question)
+    except FileNotFoundError:
         logger.error(f"Prompt file not found: {prompt_path}")
-        raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
-    content = prompt_file.read_text(encoding="utf-8").strip()
-    logger.info(f"Loaded system prompt from {prompt_path}")
-    return content
+        raise
 
 
-def call_llm(user_query: str, prompt_path: str = "prompts/sql_assistant.txt") -> str:
+def call_llm(
+    user_query: str,
+    prompt_path: str = "prompts/sql_assistant.txt",
+    use_cache: bool = True,
+    stream: bool = False,
+    history: Optional[List[dict]] = None,
+    timeout: Optional[float] = None,
+) -> Union[str, Iterator[str]]:
     """
     Call the LLM API with the provided user query and system prompt.
     Returns the LLM's response content or an error string.
+    With stream=True, returns an iterator of text chunks instead (suitable for
+    st.write_stream); errors then arrive as a final "LLM Error: ..." chunk.
+    `history` holds earlier turns as chat messages (see utils/chat_context.py)
+    and is sent between the system prompt and the question. `timeout` caps
+    the read timeout of a non-streaming call (default [llm] read_timeout).
+    Successful responses are cached per (model, prompt, question, history); see utils/llm_cache.py.
+    forget_response() drops one whose SQL turned out not to run.
+    """
+    if not user_query or not user_query.strip():
+        logger.error("Empty user query")
+        raise ValueError("User query cannot be empty")
+
+    api_url, model, headers = _endpoint()
+    # The full prompt identifies the prompt version for caching; the request
+    # itself only carries the part of the schema this question needs
+    # (including the tables earlier turns used, for follow-ups)
+    history = history or []
+    messages = _messages(user_query, prompt_path, history)
+    cache_entry = _cache_entry(model, user_query, prompt_path, history)
+    if use_cache:
+        cached = llm_cache.get(*cache_entry)
+        if cached is not None:
+            logger.info("Answered from LLM response cache")
+            return iter([cached]) if stream else cached
+
+    if stream:
+        return _stream_llm(api_url, model, messages, headers, cache_entry if use_cache else None)
+
+    contents, ok = _llm_flight.do(_flight_key(model, messages, False), _complete, api_url, model, messages, headers, timeout=timeout)
+    if ok and use_cache:
+        llm_cache.put(*cache_entry, contents[0])
+    return contents[0]
+
+
+def _cache_entry(model, user_query, prompt_path, history):
+    """(model, full prompt, question, prompt path) as llm_cache keys a call_llm answer."""
+    # The same follow-up means something else after different turns
+    cache_question = "\n".join([m["content"] for m in history] + [user_query])
+    return model, load_system_prompt(prompt_path), cache_question, prompt_path
+
+
+def forget_response(user_query: str, prompt_path: str = "prompts/sql_assistant.txt", history: Optional[List[dict]] = None):
+    """
+    Drop the cached call_llm answer for this question, e.g. after its SQL
+    failed, so the next identical question asks the model again instead of
+    replaying the broken query.
+    """
+    _, model, _ = _endpoint()
+    llm_cache.discard(*_cache_entry(model, user_query, prompt_path, history or []))
+
+
+def call_llm_candidates(
+    user_query: str,
+    n: int = 3,
+    prompt_path: str = "prompts/sql_assistant.txt",
+    history: Optional[List[dict]] = None,
+) -> List[str]:
+    """
+    Ask for `n` independent answers at once and return the successful ones
+    (possibly fewer than n; an empty list only if every request failed).
+    [sql_agent] candidate_strategy "parallel" (default) sends n requests
+    concurrently, the first at the model's default temperature and the rest
+    at [sql_agent] candidate_temperature for variety; "n" sends one request
+    with the OpenAI `n` parameter, for servers that support it.
+    Candidates are not cached; the caller decides which one was right.
     """
     if not user_query or not user_query.strip():
         logger.error("Empty user query")
         raise ValueError("User query cannot be empty")
+    api_url, model, headers = _endpoint()
+    messages = _messages(user_query, prompt_path, history or [])
+    temperature = float(get_setting("sql_agent", "candidate_temperature", 0.8))
+
+    if get_setting("sql_agent", "candidate_strategy", "parallel") == "n":
+        contents, ok = _complete(api_url, model, messages, headers, n=n, temperature=temperature)
+        return contents if ok else []
+
+    options = [{}] + [{"temperature": temperature}] * (n - 1)
+    # Each request runs in a copy of this context so its metrics keep the page label
+    futures = [
+        _get_executor().submit(contextvars.copy_context().run, _complete, api_url, model, messages, headers, **extra)
+        for extra in options
+    ]
+    candidates = []
+    for future in futures:
+        contents, ok = future.result()
+        if ok:
+            candidates.extend(contents)
+    logger.info(f"Received {len(candidates)} of {n} SQL candidates")
+    return candidates
+
 
-    # Load LLM API config from secrets.toml
+def _flight_key(model, messages, stream):
+    # Streaming and plain calls settle with different result shapes, so they never share a flight
+    return hashlib.sha256(json.dumps([model, messages, stream], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def configure(api_url, model, api_key=""):
+    """
+    Use this endpoint instead of the [llm] block of secrets.toml, e.g. the
+    stub server in benchmarks/stub_llm_server.py.
+    """
+    global _endpoint_override
+    _endpoint_override = (api_url, model, api_key)
+
+
+def _endpoint():
+    """(api_url, model, headers) from configure() or the [llm] block of secrets.toml."""
+    if _endpoint_override:
+        api_url, model, api_key = _endpoint_override
+        return api_url, model, {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
     api_url = st.secrets["llm"]["api_url"]
     model = st.secrets["llm"]["model"]
     if not api_url or not model:
         error_msg = "Environment variables LLM_API_URL and LLM_MODEL must be set"
         logger.error(error_msg)
         raise EnvironmentError(error_msg)
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {st.secrets['llm']['api_key']}"
+    }
+    return api_url, model, headers
+
 
-    system_prompt = load_system_prompt(prompt_path)
-    messages = [
+def _messages(user_query, prompt_path, history):
+    system_prompt = load_system_prompt(prompt_path, " ".join([m["content"] for m in history] + [user_query]))
+    return [
         {"role": "system", "content": system_prompt},
+        *history,
         {"role": "user", "content": user_query.strip()}
     ]
 
+
+def _get_executor():
+    # Separate from the database query pool so slow completions never hold up page reads;
+    # http_client still caps how many requests are in flight
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(get_setting("llm", "max_concurrent_requests", 4)),
+                    thread_name_prefix="quokka-llm",
+                )
+    return _executor
+
+
+def _complete(api_url, model, messages, headers, timeout=None, **options):
+    """
+    One non-streaming completion request. Returns ([content, ...], True) with
+    one entry per choice, or (["LLM Error: ..."], False).
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    usage = None
+    connect_timeout, read_timeout = http_client.timeouts()
+    if timeout is not None:
+        read_timeout = min(read_timeout, timeout)
     try:
-        response = requests.post(
+        # Shared keep-alive session; transient 429/5xx and connection errors are retried there
+        with http_client.post(
             api_url,
-            json={"model": model, "messages": messages},
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {st.secrets['llm']['api_key']}"
-            },
-            timeout=30
-        )
-        response.raise_for_status()
-        result = response.json()
+            json={"model": model, "messages": messages, **options},
+            headers=headers,
+            timeout=(connect_timeout, read_timeout),
+        ) as response:
+            result = response.json()
+        usage = result.get("usage")
         choices = result.get("choices")
         if not choices:
             logger.error(f"No choices in LLM response: {result}")
             raise ValueError("Invalid LLM response: no choices")
-        content = choices[0]["message"]["content"].strip()
-        logger.info("Received LLM response")
-        return content
+        contents = [choice["message"]["content"].strip() for choice in choices]
+        outcome = "ok"
+        logger.info(f"Received LLM response in {time.perf_counter() - started:.2f}s")
+        return contents, True
+    except requests.Timeout:
+        outcome = "timeout"
+        logger.error("LLM API request timed out")
+        return ["LLM Error: Request timed out"], False
+    except requests.HTTPError as e:
+        outcome = "http_error"
+        status = e.response.status_code if e.response is not None else 'Unknown'
+        logger.error(f"LLM API HTTP error {status}: {e}")
+        return [f"LLM Error: HTTP {status}"], False
+    except requests.RequestException as e:
+        logger.error(f"LLM API request failed: {e}")
+        return [f"LLM Error: {e}"], False
+    except ValueError as e:
+        logger.error(f"Value error: {e}")
+        return [f"LLM Error: {e}"], False
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return ["LLM Error: Unexpected error occurred"], False
+    finally:
+        metrics.record_llm_call(model, time.perf_counter() - started, outcome, usage)
+
+def _sse_data(response):
+    """Payloads of the `data:` lines of a server-sent event stream, up to [DONE]."""
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue  # keep-alive blank lines, comments, event names
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        yield json.loads(data)
+
+
+def _error_chunk(parts, message):
+    # Keep an error that interrupts a partial answer on its own paragraph
+    return f"\n\n{message}" if parts else message
+
+
+def _stream_llm(api_url, model, messages, headers, cache_entry=None):
+    """
+    Generator behind call_llm(stream=True). If the same prompt is already
+    streaming for another session, waits for it and yields its full text as
+    one chunk instead of sending a second request.
+    """
+    key = _flight_key(model, messages, True)
+    future, leader = _llm_flight.claim(key)
+    if not leader:
+        try:
+            text = future.result()
+        except Exception:
+            # The other session stopped reading before the answer was complete
+            text = None
+        if text is not None:
+            yield text
+        else:
+            yield from _stream_request(api_url, model, messages, headers, cache_entry)
+        return
+    chunks = []
+    try:
+        for chunk in _stream_request(api_url, model, messages, headers, cache_entry):
+            chunks.append(chunk)
+            yield chunk
+    except BaseException as e:
+        _llm_flight.settle(key, future, error=e if isinstance(e, Exception) else RuntimeError("stream abandoned"))
+        raise
+    _llm_flight.settle(key, future, "".join(chunks))
+
+
+def _stream_request(api_url, model, messages, headers, cache_entry=None):
+    """Send a streaming request and yield content deltas as they arrive."""
+    started = time.perf_counter()
+    outcome = "error"
+    usage = None
+    parts = []
+    try:
+        with http_client.post(
+            api_url,
+            json={
+                "model": model,
+                "messages": messages,
+                "stream": True,
+                # Final chunk carries token usage (OpenAI and most compatible servers)
+                "stream_options": {"include_usage": True},
+            },
+            headers=headers,
+            stream=True,
+        ) as response:
+            for event in _sse_data(response):
+                usage = event.get("usage") or usage
+                for choice in event.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        if not parts:
+                            logger.info(f"First LLM token after {time.perf_counter() - started:.2f}s")
+                        parts.append(delta)
+                        yield delta
+        content = "".join(parts).strip()
+        if not content:
+            raise ValueError("Invalid LLM response: empty stream")
+        outcome = "ok"
+        logger.info(f"Streamed LLM response in {time.perf_counter() - started:.2f}s")
+        if cache_entry:
+            llm_cache.put(*cache_entry, content)
+    except GeneratorExit:
+        # The consumer stopped reading (e.g. the script was rerun); nothing to report
+        outcome = "cancelled"
+        raise
     except requests.Timeout:
+        outcome = "timeout"
         logger.error("LLM API request timed out")
-        return "LLM Error: Request timed out"
+        yield _error_chunk(parts, "LLM Error: Request timed out")
     except requests.HTTPError as e:
-        status = response.status_code if response is not None else 'Unknown'
+        outcome = "http_error"
+        status = e.response.status_code if e.response is not None else 'Unknown'
         logger.error(f"LLM API HTTP error {status}: {e}")
-        return f"LLM Error: HTTP {status}"
+        yield _error_chunk(parts, f"LLM Error: HTTP {status}")
     except requests.RequestException as e:
         logger.error(f"LLM API request failed: {e}")
-        return f"LLM Error: {e}"
+        yield _error_chunk(parts, f"LLM Error: {e}")
     except ValueError as e:
+        # Includes json.JSONDecodeError from a malformed event
         logger.error(f"Value error: {e}")
-        return f"LLM Error: {e}"
+        yield _error_chunk(parts, f"LLM Error: {e}")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        return "LLM Error: Unexpected error occurred"
+        yield _error_chunk(parts, "LLM Error: Unexpected error occurred")
+    finally:
+        metrics.record_llm_call(model, time.perf_counter() - started, outcome, usage)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+"""
+Exact-match cache for LLM responses.
+
+Keys are (model, hash of the system prompt, normalized question). Recent
+entries sit in an in-process LRU; everything is also written to a SQLite file
+([llm] cache_path) so answers survive restarts and are shared by every
+session and worker process. Changing a prompt file changes its hash, and the
+entries made with the previous version are purged the first time the new
+version is seen.
+"""
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils import metrics
+from utils.cache import QueryCache
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_response (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        prompt_path TEXT NOT NULL,
+        prompt_hash TEXT NOT NULL,
+        question TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+_lock = threading.RLock()  # _connection() is also entered with it held
+_memory = None
+_db = None
+_seen_prompts = {}  # prompt path -> hash whose predecessors were already purged
+
+
+def normalize_question(question):
+    """Case, surrounding whitespace, inner runs of whitespace and trailing ?/./! do not matter."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+
+def prompt_hash(system_prompt):
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+
+def cache_key(model, system_prompt, question):
+    raw = "\x1f".join([model, prompt_hash(system_prompt), normalize_question(question)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _memory_cache():
+    global _memory
+    if _memory is None:
+        with _lock:
+            if _memory is None:
+                _memory = QueryCache(
+                    name="llm",
+                    maxsize=int(get_setting("llm", "cache_size", 512)),
+                    ttl=float(get_setting("llm", "cache_ttl", 7 * 24 * 3600)),
+                )
+    return _memory
+
+
+def _connection():
+    global _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                path = Path(get_setting("llm", "cache_path", ".cache/llm_responses.sqlite3"))
+                path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+                # WAL lets several Streamlit workers read while one writes
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(SCHEMA)
+                conn.commit()
+                _db = conn
+                logger.info(f"Opened LLM response cache at {path}")
+    return _db
+
+
+@contextmanager
+def database():
+    """The shared SQLite connection, held under the cache lock for the block."""
+    with _lock:
+        yield _connection()
+
+
+def _purge_old_prompt_versions(prompt_path, current_hash):
+    if _seen_prompts.get(prompt_path) == current_hash:
+        return
+    with _lock:
+        conn = _connection()
+        removed = conn.execute(
+            "DELETE FROM llm_response WHERE prompt_path = ? AND prompt_hash != ?",
+            (prompt_path, current_hash),
+        ).rowcount
+        conn.commit()
+        _seen_prompts[prompt_path] = current_hash
+    if removed:
+        logger.info(f"{prompt_path} changed; dropped {removed} cached LLM responses")
+
+
+def get(model, system_prompt, question, prompt_path):
+    """Cached response text, or None."""
+    if not get_setting("llm", "cache_enabled", True):
+        return None
+    key = cache_key(model, system_prompt, question)
+    cached = _memory_cache().get(key)
+    if cached is not None:
+        return cached
+
+    ttl = float(get_setting("llm", "cache_ttl", 7 * 24 * 3600))
+    try:
+        _purge_old_prompt_versions(prompt_path, prompt_hash(system_prompt))
+        with _lock:
+            conn = _connection()
+            row = conn.execute(
+                "SELECT response FROM llm_response WHERE key = ? AND created_at > ?",
+                (key, time.time() - ttl),
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE llm_response SET hits = hits + 1 WHERE key = ?", (key,))
+                conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        return None
+    metrics.record_cache("llm_disk", hit=row is not None)
+    if row is None:
+        return None
+    _memory_cache().put(key, row[0])
+    return row[0]
+
+
+def put(model, system_prompt, question, prompt_path, response):
+    """Store a successful response in memory and on disk."""
+    if not get_setting("llm", "cache_enabled", True):
+        return
+    key = cache_key(model, system_prompt, question)
+    _memory_cache().put(key, response)
+    max_entries = int(get_setting("llm", "cache_max_entries", 10000))
+    try:
+        with _lock:
+            conn = _connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response (key, model, prompt_path, prompt_hash, question, response, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_path, prompt_hash(system_prompt), normalize_question(question), response, time.time()),
+            )
+            # Keep the file bounded: drop the oldest entries past the limit
+            conn.execute(
+                "DELETE FROM llm_response WHERE key IN ("
+                "SELECT key FROM llm_response ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not persist LLM response: {e}")
+
+
+def discard(model, system_prompt, question, prompt_path):
+    """Forget a cached response, e.g. one whose SQL MySQL rejected, so the next ask goes to the model."""
+    key = cache_key(model, system_prompt, question)
+    _memory_cache().discard(key)
+    try:
+        with _lock:
+            conn = _connection()
+            conn.execute("DELETE FROM llm_response WHERE key = ?", (key,))
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not discard cached LLM response: {e}")
+
+
+def stats():
+    """Memory-level hit rate plus the number of responses on disk."""
+    result = _memory_cache().stats()
+    try:
+        with _lock:
+            result["disk_entries"] = _connection().execute("SELECT COUNT(*) FROM llm_response").fetchone()[0]
+    except sqlite3.Error:
+        result["disk_entries"] = None
+    return result
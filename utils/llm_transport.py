@@ -0,0 +1,149 @@
+"""
+Record and replay of LLM requests, for running the SQL Agent offline.
+
+[llm] transport picks how http_client reaches the endpoint:
+
+    live    send requests as usual (default)
+    record  send them, and save every successful response under [llm] fixtures_dir
+    replay  answer from the saved responses only; nothing leaves the machine
+
+A fixture is keyed by a hash of the request body (model, messages and
+options), so any change to the prompt, the schema block or the history is
+a miss rather than a stale answer. Misses in replay mode fail with
+FixtureMissing, reported like any other LLM error. Headers, including the
+API key, are not stored. Streamed responses are stored as the raw SSE body
+and replayed through the same parser.
+
+    llm_transport.configure("replay", "benchmarks/llm_fixtures")
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+MODES = ("live", "record", "replay")
+
+_override = None  # (mode, directory, replay_latency)
+
+
+class FixtureMissing(requests.RequestException):
+    """Replay mode found no recorded response for a request."""
+
+
+def configure(mode, directory=None, replay_latency=False):
+    """
+    Use `mode` instead of [llm] transport, e.g. from a benchmark script.
+    Call before the first LLM request; the session is built once per process.
+    """
+    global _override
+    if mode not in MODES:
+        raise ValueError(f"Unknown LLM transport {mode!r}; expected one of {', '.join(MODES)}")
+    _override = (mode, directory, replay_latency)
+
+
+def settings():
+    """(mode, fixtures directory, replay_latency) from configure() or the [llm] block."""
+    if _override:
+        mode, directory, replay_latency = _override
+    else:
+        mode = get_setting("llm", "transport", "live")
+        directory = None
+        replay_latency = bool(get_setting("llm", "replay_latency", False))
+    directory = directory or get_setting("llm", "fixtures_dir", "benchmarks/llm_fixtures")
+    return mode, Path(directory), replay_latency
+
+
+def fixture_key(body):
+    """Hash of a request body; JSON bodies are canonicalized first so key order does not matter."""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False).encode("utf-8")
+    except (TypeError, ValueError):
+        pass
+    return hashlib.sha256(body or b"").hexdigest()
+
+
+class FixtureAdapter(HTTPAdapter):
+    """HTTPAdapter that records responses to, or replays them from, a fixtures directory."""
+
+    def __init__(self, mode, directory, replay_latency=False, **kwargs):
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.directory = Path(directory)
+        self.replay_latency = replay_latency
+
+    def _path(self, key):
+        return self.directory / f"{key}.json"
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = fixture_key(request.body)
+        if self.mode == "replay":
+            return self._replay(request, key)
+
+        started = time.perf_counter()
+        response = super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        body = response.content  # read it all, so streamed bodies can be saved; callers iterate the copy
+        if response.status_code == 200:
+            self._save(key, request, response, body, time.perf_counter() - started)
+        return response
+
+    def _save(self, key, request, response, body, elapsed):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fixture = {
+            "request": json.loads(request.body) if request.body else None,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", "application/json"),
+            "body": body.decode("utf-8"),
+            "elapsed_s": round(elapsed, 3),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(fixture, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        logger.info(f"Recorded LLM response {key[:12]}")
+
+    def _replay(self, request, key):
+        path = self._path(key)
+        try:
+            fixture = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise FixtureMissing(
+                f"No recorded response for request {key[:12]} in {self.directory}",
+                request=request,
+            ) from None
+        if self.replay_latency:
+            time.sleep(fixture.get("elapsed_s", 0))
+        response = requests.Response()
+        response.status_code = fixture["status"]
+        response.reason = "OK" if fixture["status"] == 200 else ""
+        response.headers = CaseInsensitiveDict({"Content-Type": fixture["content_type"]})
+        response.encoding = "utf-8"
+        response.raw = io.BytesIO(fixture["body"].encode("utf-8"))
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+
+def adapter(**kwargs):
+    """The adapter http_client mounts: a plain HTTPAdapter when live, else a FixtureAdapter."""
+    mode, directory, replay_latency = settings()
+    if mode == "live":
+        return HTTPAdapter(**kwargs)
+    if mode not in MODES:
+        raise ValueError(f"Unknown [llm] transport {mode!r}; expected one of {', '.join(MODES)}")
+    logger.info(f"LLM transport: {mode} ({directory})")
+    return FixtureAdapter(mode, directory, replay_latency, **kwargs)
@@ -0,0 +1,435 @@
+"""
+In-process metrics for database queries, LLM calls, caches and page reruns.
+
+Everything is aggregated in memory and exported in the Prometheus text format:
+    [metrics] port          serve /metrics on 127.0.0.1:<port> (off by default)
+    [metrics] textfile      rewrite this file, e.g. for node_exporter's textfile collector
+    [metrics] textfile_interval   seconds between textfile rewrites (default 15)
+    [metrics] max_fingerprints    distinct query labels before the rest share "other" (default 500)
+Queries slower than [metrics] slow_query_ms (default 500) are written as JSON
+lines to [metrics] slow_query_log, or to the application log when unset.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from utils.sqltext import fingerprint
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("quokka.slow_queries")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Page whose rerun is currently executing; copied into worker threads by run_concurrently
+current_page = contextvars.ContextVar("current_page", default="-")
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., count, sum]
+_help = {}  # name -> (type, help text)
+_fingerprints = {}  # fingerprint id -> fingerprint text, at most [metrics] max_fingerprints
+_collectors = []
+_exporter_started = False
+_textfile_written = 0.0
+_slow_handler_ready = False
+
+
+def _labels(**labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def describe(name, kind, text):
+    _help.setdefault(name, (kind, text))
+
+
+def inc(name, amount=1, **labels):
+    """Add `amount` to a counter."""
+    key = (name, _labels(**labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """Record one observation (in seconds) in a histogram."""
+    key = (name, _labels(**labels))
+    with _lock:
+        bucket = _histograms.get(key)
+        if bucket is None:
+            bucket = _histograms[key] = [0] * len(DURATION_BUCKETS) + [0, 0.0]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                bucket[i] += 1
+        bucket[-2] += 1
+        bucket[-1] += value
+
+
+def register_collector(fn):
+    """
+    Add a callable returning [(name, type, help, labels_dict, value), ...],
+    sampled at export time (e.g. connection pool gauges).
+    """
+    _collectors.append(fn)
+
+
+describe("quokka_db_query_duration_seconds", "histogram", "Time spent executing and fetching a query")
+describe("quokka_db_query_rows_total", "counter", "Rows fetched (or affected) by queries")
+describe("quokka_db_query_bytes_total", "counter", "Approximate bytes fetched by queries")
+describe("quokka_db_query_errors_total", "counter", "Queries that raised an error")
+describe("quokka_db_slow_queries_total", "counter", "Queries slower than [metrics] slow_query_ms")
+describe("quokka_llm_request_duration_seconds", "histogram", "LLM API round-trip time")
+describe("quokka_llm_tokens_total", "counter", "Tokens reported by the LLM API")
+describe("quokka_llm_retries_total", "counter", "LLM API requests retried, by reason")
+describe("quokka_cache_requests_total", "counter", "Cache lookups by cache and result")
+describe("quokka_coalesced_requests_total", "counter", "Calls that joined an identical call already in flight")
+describe("quokka_sql_intents_total", "counter", "SQL Agent questions by intent template matched (none = sent to the LLM)")
+describe("quokka_sql_candidates_total", "counter", "SQL Agent candidates by validation outcome")
+describe("quokka_sql_repair_attempt_seconds", "histogram", "Time per SQL Agent repair attempt (LLM call plus query) by outcome")
+describe("quokka_rerun_duration_seconds", "histogram", "Wall time of a full page script run")
+describe("quokka_reruns_total", "counter", "Page script runs by outcome")
+
+
+# --- Database queries ---
+# Label for queries first seen after [metrics] max_fingerprints distinct ones:
+# nearly every SQL Agent query is new, and each label keeps its series forever
+OTHER_FINGERPRINT = "other"
+
+
+def fingerprint_id(query):
+    """
+    Short stable id for a query's fingerprint, used as a metric label, or
+    OTHER_FINGERPRINT once [metrics] max_fingerprints (default 500) are known.
+    """
+    text = fingerprint(query)
+    fid = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+    limit = int(get_setting("metrics", "max_fingerprints", 500))
+    with _lock:
+        if fid not in _fingerprints:
+            if len(_fingerprints) >= limit:
+                return OTHER_FINGERPRINT
+            _fingerprints[fid] = text
+    return fid
+
+
+def fingerprints():
+    """{fingerprint id: normalized query text} for every query with its own label."""
+    with _lock:
+        return dict(_fingerprints)
+
+
+def _slow_log():
+    global _slow_handler_ready
+    if not _slow_handler_ready:
+        path = get_setting("metrics", "slow_query_log")
+        if path and not slow_logger.handlers:
+            handler = logging.FileHandler(path, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            slow_logger.addHandler(handler)
+            slow_logger.setLevel(logging.INFO)
+            slow_logger.propagate = False
+        _slow_handler_ready = True
+    return slow_logger
+
+
+def record_query(query, duration, rows=0, nbytes=0, error=None):
+    """Record one finished query; logs it as slow past [metrics] slow_query_ms."""
+    page = current_page.get()
+    fid = fingerprint_id(query)
+    observe("quokka_db_query_duration_seconds", duration, page=page, fingerprint=fid)
+    inc("quokka_db_query_rows_total", rows, page=page, fingerprint=fid)
+    inc("quokka_db_query_bytes_total", nbytes, page=page, fingerprint=fid)
+    if error is not None:
+        inc("quokka_db_query_errors_total", page=page, fingerprint=fid, errno=getattr(error, "errno", None) or "-")
+
+    threshold = float(get_setting("metrics", "slow_query_ms", 500)) / 1000
+    if duration >= threshold:
+        inc("quokka_db_slow_queries_total", page=page)
+        _slow_log().warning(json.dumps({
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "page": page,
+            "duration_ms": round(duration * 1000, 1),
+            "rows": rows,
+            "bytes": nbytes,
+            "fingerprint": fid,
+            "error": str(error) if error is not None else None,
+            "sql": " ".join(query.split()),
+        }))
+
+
+def _row_bytes(rows):
+    total = 0
+    for row in rows:
+        for value in row:
+            total += len(value) if isinstance(value, (str, bytes, bytearray)) else 8
+    return total
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times execute + fetch and records each query on completion."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._query = None
+        self._elapsed = 0.0
+        self._rows = self._bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _finish(self, error=None):
+        if self._query is not None:
+            record_query(self._query, self._elapsed, self._rows, self._bytes, error)
+            self._query = None
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception as e:
+            self._elapsed += time.perf_counter() - started
+            self._finish(e)
+            raise
+        finally:
+            if self._query is not None:
+                self._elapsed += time.perf_counter() - started
+
+    def _start(self, query):
+        self._finish()
+        self._query = query if isinstance(query, str) else query.decode("utf-8", "replace")
+        self._elapsed = 0.0
+        self._rows = self._bytes = 0
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._start(operation)
+        result = self._timed(lambda: self._cursor.execute(operation, params, *args, **kwargs))
+        if self._query is not None and not self._cursor.description:
+            self._rows = max(self._cursor.rowcount, 0)
+            self._finish()
+        return result
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._start(operation)
+        result = self._timed(lambda: self._cursor.executemany(operation, seq_params, *args, **kwargs))
+        self._rows = max(self._cursor.rowcount, 0)
+        self._finish()
+        return result
+
+    def _fetched(self, rows):
+        if self._query is not None and rows:
+            self._rows += len(rows)
+            self._bytes += _row_bytes(rows)
+        return rows
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._fetched([row])
+        return row
+
+    def fetchmany(self, size=1):
+        return self._fetched(self._timed(self._cursor.fetchmany, size))
+
+    def fetchall(self):
+        rows = self._fetched(self._timed(self._cursor.fetchall))
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+
+class InstrumentedConnection:
+    """Pooled-connection wrapper whose cursors are InstrumentedCursors."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+
+# --- LLM calls and caches ---
+def record_llm_call(model, duration, outcome, usage=None):
+    """Record one LLM API call; `usage` is the OpenAI-style usage block if any."""
+    observe("quokka_llm_request_duration_seconds", duration, model=model, outcome=outcome, page=current_page.get())
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage and usage.get(kind):
+            inc("quokka_llm_tokens_total", usage[kind], model=model, kind=kind.split("_")[0])
+
+
+def record_llm_retry(reason):
+    inc("quokka_llm_retries_total", reason=reason, page=current_page.get())
+
+
+def record_repair_attempt(duration, outcome):
+    observe("quokka_sql_repair_attempt_seconds", duration, outcome=outcome, page=current_page.get())
+
+
+def record_intent(intent):
+    inc("quokka_sql_intents_total", intent=intent, page=current_page.get())
+
+
+def record_coalesced(flight):
+    inc("quokka_coalesced_requests_total", flight=flight, page=current_page.get())
+
+
+def record_cache(cache, hit):
+    inc("quokka_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+# --- Page reruns ---
+def start_rerun(page):
+    """
+    Call at the top of a page script. Labels every query made during this run
+    with `page` and starts the rerun timer that finish_rerun() stops. Runs that
+    end in st.stop()/st.rerun() never reach finish_rerun() and are counted as
+    "stopped" when the next run of the session starts.
+    """
+    current_page.set(page)
+    _start_exporter()
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return
+    previous = st.session_state.get("_rerun_timer")
+    if previous is not None:
+        inc("quokka_reruns_total", page=previous[0], outcome="stopped")
+    st.session_state["_rerun_timer"] = (page, time.perf_counter())
+
+
+def finish_rerun():
+    """Call as the last statement of a page script."""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return
+    timer = st.session_state.pop("_rerun_timer", None)
+    if timer is not None:
+        observe("quokka_rerun_duration_seconds", time.perf_counter() - timer[1], page=timer[0])
+        inc("quokka_reruns_total", page=timer[0], outcome="completed")
+    _maybe_write_textfile()
+
+
+# --- Export ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _format_labels(labels, extra=()):
+    items = [*labels, *extra]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    samples = {}
+    for (name, labels), value in sorted(counters.items()):
+        samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), bucket in sorted(histograms.items()):
+        lines = samples.setdefault(name, [])
+        for bound, count in zip(DURATION_BUCKETS, bucket):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {bucket[-2]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {bucket[-2]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {bucket[-1]:.6f}")
+    for collector in _collectors:
+        try:
+            for name, kind, text, labels, value in collector():
+                describe(name, kind, text)
+                samples.setdefault(name, []).append(f"{name}{_format_labels(_labels(**labels))} {value}")
+        except Exception as e:
+            logger.warning(f"Metrics collector {collector.__name__} failed: {e}")
+
+    out = []
+    for name in sorted(samples):
+        kind, text = _help.get(name, ("untyped", ""))
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(samples[name])
+    return "\n".join(out) + "\n"
+
+
+def write_textfile(path):
+    """Atomically replace `path` with the current metrics."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+def _maybe_write_textfile():
+    global _textfile_written
+    path = get_setting("metrics", "textfile")
+    if not path:
+        return
+    interval = float(get_setting("metrics", "textfile_interval", 15))
+    now = time.monotonic()
+    if now - _textfile_written < interval:
+        return
+    _textfile_written = now
+    try:
+        write_textfile(path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {path}: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_exporter():
+    global _exporter_started
+    if _exporter_started:
+        return
+    with _lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+    port = get_setting("metrics", "port")
+    if not port:
+        return
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+    except OSError as e:
+        # Another worker process already serves this port
+        logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+        return
+    threading.Thread(target=server.serve_forever, name="quokka-metrics", daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on http://127.0.0.1:{port}/metrics")
@@ -0,0 +1,301 @@
+"""
+Ordered, idempotent schema migrations.
+
+Migrations live in migrations/NNNN_description.sql and are applied in order,
+each exactly once, with the applied versions recorded in SchemaMigration.
+
+    python -m utils.migrate up        # apply pending migrations
+    python -m utils.migrate status    # list applied / pending migrations
+    python -m utils.migrate verify    # diff the live schema against the migrations
+
+Connection details come from the [db] block of .streamlit/secrets.toml.
+"""
+import argparse
+import hashlib
+import logging
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from utils.db import db_config
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+LOCK_NAME = "quokka_schema_migrations"
+
+# Re-running a statement whose effect is already present is not an error:
+# the migration is idempotent against a database that was changed by hand.
+ALREADY_APPLIED_ERRNOS = {
+    errorcode.ER_DUP_KEYNAME,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_TABLE_EXISTS_ERROR,
+}
+
+TRACKING_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS SchemaMigration (
+        Version INT PRIMARY KEY,
+        Name VARCHAR(255) NOT NULL,
+        Checksum CHAR(64) NOT NULL,
+        AppliedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self):
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def statements(self):
+        return split_statements(self.sql)
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """All migrations in version order. Raises ValueError on duplicate versions."""
+    migrations = {}
+    for path in sorted(Path(directory).glob("*.sql")):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", path.name)
+        if not match:
+            logger.warning(f"Ignoring {path.name}: expected NNNN_description.sql")
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {path.name}")
+        migrations[version] = Migration(version, match.group(2), path.read_text(encoding="utf-8"))
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def split_statements(sql):
+    """Split a migration file into statements, dropping -- comments."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in re.split(r";\s*(?:\n|$)", "\n".join(lines)) if stmt.strip()]
+
+
+# --- Expected schema, derived from the migration files ---
+_COLUMN_END = re.compile(
+    r"\s+(?:NOT\s+NULL|NULL|DEFAULT|PRIMARY\s+KEY|AUTO_INCREMENT|UNIQUE|COMMENT|REFERENCES|ON\s+UPDATE)\b.*$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def _split_top_level(body):
+    parts, depth, quote, current = [], 0, None, []
+    for char in body:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _columns_list(text):
+    return [c.strip().strip("`") for c in text.split(",")]
+
+
+def normalize_type(column_type):
+    """Comparable form of a column type: lower case, no int display width, no padding."""
+    column_type = column_type.strip().lower()
+    column_type = re.sub(r"\b(tinyint|smallint|mediumint|int|bigint)\(\d+\)", r"\1", column_type)
+    column_type = re.sub(r"\s*,\s*", ",", column_type)
+    column_type = re.sub(r"\s+", " ", column_type)
+    return column_type
+
+
+def expected_schema(migrations=None, normalize=True):
+    """
+    {table: {"columns": {name: type}, "indexes": {name: [columns]}, "foreign_keys": {column: (table, column)}}}
+    built by reading the CREATE TABLE / CREATE INDEX / ALTER TABLE statements of the migrations.
+    With normalize=False column types are kept as written (ENUM values keep their case).
+    """
+    def column_type(text):
+        text = _COLUMN_END.sub("", text)
+        return normalize_type(text) if normalize else " ".join(text.split())
+
+    schema = {}
+    for migration in migrations or load_migrations():
+        for stmt in migration.statements():
+            create = re.match(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?\s*\((.*)\)\s*[^)]*$", stmt, re.I | re.S)
+            index = re.match(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+`?(\w+)`?\s+ON\s+`?(\w+)`?\s*\((.*)\)", stmt, re.I | re.S)
+            add_column = re.match(r"ALTER\s+TABLE\s+`?(\w+)`?\s+ADD\s+(?:COLUMN\s+)?`?(\w+)`?\s+(.*)", stmt, re.I | re.S)
+            if create:
+                table = schema.setdefault(create.group(1), {"columns": {}, "indexes": {}, "foreign_keys": {}})
+                for item in _split_top_level(create.group(2)):
+                    head = item.split()[0].upper()
+                    if head == "PRIMARY":
+                        table["indexes"]["PRIMARY"] = _columns_list(re.search(r"\((.*?)\)", item).group(1))
+                    elif head == "FOREIGN":
+                        fk = re.search(r"\((\w+)\)\s+REFERENCES\s+(\w+)\s*\((\w+)\)", item, re.I)
+                        table["foreign_keys"][fk.group(1)] = (fk.group(2), fk.group(3))
+                    elif head in ("KEY", "INDEX", "UNIQUE", "CONSTRAINT"):
+                        key = re.search(r"(?:KEY|INDEX)\s+`?(\w+)`?\s*\((.*?)\)", item, re.I)
+                        if key:
+                            table["indexes"][key.group(1)] = _columns_list(key.group(2))
+                    else:
+                        name, rest = item.split(None, 1)
+                        name = name.strip("`")
+                        table["columns"][name] = column_type(rest)
+                        if re.search(r"\bPRIMARY\s+KEY\b", rest, re.I):
+                            table["indexes"]["PRIMARY"] = [name]
+            elif index:
+                table = schema.setdefault(index.group(2), {"columns": {}, "indexes": {}, "foreign_keys": {}})
+                table["indexes"][index.group(1)] = _columns_list(index.group(3))
+            elif add_column:
+                table = schema.setdefault(add_column.group(1), {"columns": {}, "indexes": {}, "foreign_keys": {}})
+                table["columns"][add_column.group(2)] = column_type(add_column.group(3))
+    return schema
+
+
+def live_schema(cursor):
+    """Columns and indexes of the connected database, in the expected_schema() shape."""
+    schema = {}
+    cursor.execute("""
+        SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """)
+    for table, column, column_type in cursor.fetchall():
+        if isinstance(column_type, (bytes, bytearray)):
+            column_type = column_type.decode("utf-8")
+        schema.setdefault(table, {"columns": {}, "indexes": {}})["columns"][column] = normalize_type(column_type)
+    cursor.execute("""
+        SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+    """)
+    for table, index, column in cursor.fetchall():
+        schema.setdefault(table, {"columns": {}, "indexes": {}})["indexes"].setdefault(index, []).append(column)
+    return schema
+
+
+def diff_schema(expected, live):
+    """Human-readable differences between the expected and live schema (empty when in sync)."""
+    problems = []
+    for table, spec in expected.items():
+        actual = live.get(table)
+        if actual is None:
+            problems.append(f"missing table {table}")
+            continue
+        for column, column_type in spec["columns"].items():
+            if column not in actual["columns"]:
+                problems.append(f"missing column {table}.{column} {column_type}")
+            elif actual["columns"][column] != column_type:
+                problems.append(f"type of {table}.{column}: expected {column_type}, found {actual['columns'][column]}")
+        for column in actual["columns"]:
+            if column not in spec["columns"]:
+                problems.append(f"unexpected column {table}.{column} (not in any migration)")
+        for index, columns in spec["indexes"].items():
+            if actual["indexes"].get(index) != columns:
+                found = actual["indexes"].get(index)
+                problems.append(f"index {table}.{index}: expected ({', '.join(columns)}), found {'(' + ', '.join(found) + ')' if found else 'nothing'}")
+    return problems
+
+
+# --- Runner ---
+def _applied(cursor):
+    cursor.execute(TRACKING_TABLE_DDL)
+    cursor.execute("SELECT Version, Checksum FROM SchemaMigration")
+    return dict(cursor.fetchall())
+
+
+def migrate(conn, migrations=None):
+    """Apply pending migrations in order. Returns the versions applied."""
+    migrations = migrations or load_migrations()
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Another migration run holds the schema lock")
+    try:
+        applied = _applied(cursor)
+        done = []
+        for migration in migrations:
+            if migration.version in applied:
+                if applied[migration.version] != migration.checksum:
+                    logger.warning(f"Migration {migration.version:04d}_{migration.name} changed after it was applied")
+                continue
+            logger.info(f"Applying {migration.version:04d}_{migration.name}")
+            for stmt in migration.statements():
+                try:
+                    cursor.execute(stmt)
+                except mysql.connector.Error as e:
+                    if e.errno not in ALREADY_APPLIED_ERRNOS:
+                        raise
+                    logger.info(f"  already in place: {e.msg}")
+            cursor.execute(
+                "INSERT INTO SchemaMigration (Version, Name, Checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum),
+            )
+            conn.commit()
+            done.append(migration.version)
+        return done
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchall()
+        cursor.close()
+
+
+def verify(conn):
+    """Differences between the live schema and the one the migrations describe."""
+    cursor = conn.cursor()
+    try:
+        return diff_schema(expected_schema(), live_schema(cursor))
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m utils.migrate", description="Apply or check schema migrations.")
+    parser.add_argument("command", choices=["up", "status", "verify"])
+    args = parser.parse_args(argv)
+
+    conn = mysql.connector.connect(**db_config())
+    try:
+        if args.command == "up":
+            done = migrate(conn)
+            print(f"Applied {len(done)} migration(s)" + (f": {', '.join(f'{v:04d}' for v in done)}" if done else ""))
+        elif args.command == "status":
+            cursor = conn.cursor()
+            applied = _applied(cursor)
+            cursor.close()
+            for migration in load_migrations():
+                state = "applied" if migration.version in applied else "pending"
+                if migration.version in applied and applied[migration.version] != migration.checksum:
+                    state = "applied (file changed since)"
+                print(f"{migration.version:04d}_{migration.name}: {state}")
+        else:
+            problems = verify(conn)
+            for problem in problems:
+                print(f"- {problem}")
+            print("Schema matches migrations." if not problems else f"{len(problems)} difference(s) found.")
+            return 1 if problems else 0
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
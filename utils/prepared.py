@@ -0,0 +1,163 @@
+"""
+Server-side prepared statements for the hot parameterized reads.
+
+Each pooled connection keeps one prepared cursor per statement, created on
+first use and reused on later checkouts, so MySQL parses and plans the
+statement once per connection instead of on every rerun, and rows come back
+over the binary protocol. The pool is created with pool_reset_session=False
+for this reason (a session reset deallocates prepared statements).
+
+    rows = prepared.fetch_all("pm_demands", (email,))
+    row = prepared.fetch_one("employee_by_email", (email,))
+    table = prepared.fetch_arrow("milestones_by_demand", (demand_id,))
+"""
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from utils.columnar import batches_to_table, rows_to_record_batch
+from utils.db import get_connection, release_connection
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+STATEMENTS = {
+    "login_by_email": "SELECT Name, Password, IsAdmin FROM Employee WHERE Email = %s",
+    "employee_by_email": "SELECT ID FROM Employee WHERE Email = %s",
+    "pm_demands": """
+        SELECT D.ID, D.Name
+        FROM Demand D
+        JOIN Employee E ON D.ProjectManagerID = E.ID
+        WHERE E.Email = %s
+    """,
+    "pm_demands_by_name": """
+        SELECT D.ID, D.Name
+        FROM Demand D
+        JOIN Employee E ON D.ProjectManagerID = E.ID
+        WHERE E.Email = %s
+        ORDER BY D.Name
+    """,
+    "milestones_by_demand": "SELECT Date, Description, AchievedOrNot FROM Milestone WHERE DemandID = %s ORDER BY Date DESC",
+    "status_updates_by_demand": """
+        SELECT S.Date, S.Description, E.Name AS `Updated By`
+        FROM Status S
+        LEFT JOIN Employee E ON S.UpdatedBy = E.ID
+        WHERE S.DemandID = %s ORDER BY S.Date DESC
+    """,
+    "dab_by_demand": """
+        SELECT Date, Status, Notes
+        FROM DAB
+        WHERE DemandID = %s
+        ORDER BY Date DESC
+    """,
+    "milestone_times": "SELECT Date FROM Milestone WHERE DemandID = %s AND Date >= %s AND Date < %s",
+    "status_times": "SELECT Date FROM Status WHERE DemandID = %s AND Date >= %s AND Date < %s",
+}
+
+# Statement handle no longer valid on the server (e.g. after a reconnect)
+_STALE_ERRNOS = {errorcode.ER_UNKNOWN_STMT_HANDLER, errorcode.ER_NEED_REPREPARE}
+
+_lock = threading.Lock()
+# Underlying connection -> (server connection id, OrderedDict of sql -> cursor)
+_bound = weakref.WeakKeyDictionary()
+
+
+def register(name, sql):
+    """Add a named statement (parameters as %s) to the registry."""
+    STATEMENTS[name] = sql
+
+
+def _underlying(conn):
+    # get_connection() returns metrics.InstrumentedConnection(PooledMySQLConnection(cnx));
+    # prepared statements live as long as the innermost cnx, across checkouts.
+    conn = getattr(conn, "_conn", conn)
+    return getattr(conn, "_cnx", conn)
+
+
+def _cursors(conn):
+    raw = _underlying(conn)
+    with _lock:
+        entry = _bound.get(raw)
+        if entry is None or entry[0] != conn.connection_id:
+            # New connection, or reconnected since: its old statement handles are gone
+            entry = _bound[raw] = (conn.connection_id, OrderedDict())
+    return entry[1]
+
+
+def _cursor_for(conn, sql):
+    """
+    The prepared cursor for `sql` on this connection. MySQL Connector only reuses
+    a statement when execute() receives the very same string object, so the
+    cursor is returned together with the string it was prepared from.
+    """
+    cursors = _cursors(conn)
+    if sql in cursors:
+        cursors.move_to_end(sql)
+        return cursors[sql]
+    cursor = conn.cursor(prepared=True)
+    cursors[sql] = (cursor, sql)
+    limit = int(get_setting("db", "prepared_per_connection", 32))
+    while len(cursors) > limit:
+        _, (old, _) = cursors.popitem(last=False)
+        try:
+            old.close()
+        except mysql.connector.Error:
+            pass
+    return cursors[sql]
+
+
+def _drop(conn, sql):
+    _cursors(conn).pop(sql, None)
+
+
+def _execute(sql, params, conn=None, read_only=True):
+    """
+    Run a statement and return (description, rows). Uses `conn` when given,
+    otherwise a pooled connection: one that may come from the read replica,
+    unless read_only=False asks for the primary (reads that must see the
+    latest writes, such as logins or the keys of an INSERT that follows).
+    """
+    borrowed = conn is None
+    try:
+        if borrowed:
+            conn = get_connection(read_only=read_only)
+        for attempt in (1, 2):
+            cursor, statement = _cursor_for(conn, sql)
+            try:
+                cursor.execute(statement, tuple(params))
+                return cursor.description, cursor.fetchall()
+            except mysql.connector.Error as e:
+                _drop(conn, sql)
+                if attempt == 2 or e.errno not in _STALE_ERRNOS:
+                    raise
+                logger.info(f"Re-preparing statement after {e}")
+    finally:
+        # The cursor stays open with the connection; only the connection goes back
+        if borrowed:
+            release_connection(None, conn)
+
+
+def fetch_sql(sql, params=(), conn=None):
+    """All rows of an arbitrary parameterized statement, prepared on first use."""
+    return _execute(sql, params, conn)[1]
+
+
+def fetch_all(name, params=(), read_only=True):
+    """All rows of the named statement (read_only=False: from the primary)."""
+    return _execute(STATEMENTS[name], params, read_only=read_only)[1]
+
+
+def fetch_one(name, params=(), read_only=True):
+    """First row of the named statement, or None (read_only=False: from the primary)."""
+    rows = fetch_all(name, params, read_only)
+    return rows[0] if rows else None
+
+
+def fetch_arrow(name, params=()):
+    """Result of the named statement as a pyarrow.Table (see db.fetch_arrow)."""
+    description, rows = _execute(STATEMENTS[name], params)
+    return batches_to_table([rows_to_record_batch(description or [], rows)])
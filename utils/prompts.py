@@ -0,0 +1,347 @@
+"""
+System prompts with the database schema filled in from the live database.
+
+A prompt template may contain a {schema} placeholder. It is replaced by a
+block listing every table with its columns, ENUM values and foreign keys,
+read from INFORMATION_SCHEMA. The block is rendered once and kept until a
+cheap fingerprint query (checked at most every [llm] schema_check_interval
+seconds) shows the schema changed. Templates are re-read only when their
+file's mtime changes. If the database cannot be reached, the schema the
+migrations describe is used instead.
+
+Given the user's question, the block is pruned to the tables the question
+is about (plus the tables needed to join them), see prune_schema().
+"""
+import logging
+import math
+import re
+import threading
+import time
+from pathlib import Path
+
+import mysql.connector
+
+from utils.db import get_connection, release_connection
+from utils.migrate import expected_schema
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PLACEHOLDER = "{schema}"
+
+# Bookkeeping tables the SQL Agent has no business querying
+INTERNAL_TABLES = {"SchemaMigration", "CacheVersion"}
+
+# Types worth spelling out; for the rest the column name says enough
+_SHOWN_TYPES = re.compile(r"^(enum|set|date|datetime|timestamp|time|year)\b", re.IGNORECASE)
+
+_lock = threading.Lock()
+_templates = {}  # path -> (mtime_ns, text)
+_schema = {"schema": None, "block": None, "fingerprint": None, "checked": 0.0}
+
+
+def approx_tokens(text):
+    """Rough token count (words plus punctuation marks); close to BPE counts for prompts and SQL."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def load_template(prompt_path):
+    """Template text, re-read from disk only when the file's mtime changes."""
+    path = Path(prompt_path)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
+    cached = _templates.get(prompt_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    text = path.read_text(encoding="utf-8").strip()
+    _templates[prompt_path] = (mtime, text)
+    logger.info(f"Loaded prompt template from {prompt_path}")
+    return text
+
+
+# --- Schema introspection ---
+def fingerprint(cursor):
+    """Changes whenever a column, its type or a foreign key is added, dropped or altered."""
+    cursor.execute("""
+        SELECT COUNT(*),
+               COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE))), 0),
+               (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))), 0)
+                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+                WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL)
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+    """)
+    return tuple(int(value) for value in cursor.fetchone())
+
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else value
+
+
+def introspect(cursor):
+    """{table: {"columns": {name: type}, "foreign_keys": {column: (table, column)}}} of the connected database."""
+    schema = {}
+    cursor.execute("""
+        SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """)
+    for table, column, column_type in cursor.fetchall():
+        schema.setdefault(_text(table), {"columns": {}, "foreign_keys": {}})["columns"][_text(column)] = _text(column_type)
+    cursor.execute("""
+        SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+    """)
+    for table, column, ref_table, ref_column in cursor.fetchall():
+        if _text(table) in schema:
+            schema[_text(table)]["foreign_keys"][_text(column)] = (_text(ref_table), _text(ref_column))
+    return schema
+
+
+def render_schema(schema):
+    """
+    One line per table in the style the prompts already use, e.g.
+    * Milestone(DemandID -> Demand.ID, Date DATETIME, Description, AchievedOrNot ENUM('Achieved','Not Achieved'))
+    """
+    lines = []
+    for table in sorted(schema):
+        if table in INTERNAL_TABLES:
+            continue
+        spec = schema[table]
+        columns = []
+        for column, column_type in spec["columns"].items():
+            item = column
+            if _SHOWN_TYPES.match(column_type):
+                kind, _, rest = column_type.partition("(")
+                item += f" {kind.upper()}" + (f"({rest}" if rest else "")
+            if column in spec.get("foreign_keys", {}):
+                ref_table, ref_column = spec["foreign_keys"][column]
+                item += f" -> {ref_table}.{ref_column}"
+            columns.append(item)
+        lines.append(f"* {table}({', '.join(columns)})")
+    return "\n".join(lines)
+
+
+def _refresh():
+    interval = float(get_setting("llm", "schema_check_interval", 300))
+    if _schema["block"] is not None and time.monotonic() - _schema["checked"] < interval:
+        return _schema
+    with _lock:
+        if _schema["block"] is not None and time.monotonic() - _schema["checked"] < interval:
+            return _schema
+        conn = cursor = None
+        try:
+            conn = get_connection(read_only=True)
+            cursor = conn.cursor()
+            current = fingerprint(cursor)
+            if current != _schema["fingerprint"]:
+                schema = introspect(cursor)
+                _schema.update(schema=schema, block=render_schema(schema), fingerprint=current)
+                logger.info(f"Rendered schema for prompts from {len(schema)} live tables")
+        except mysql.connector.Error as e:
+            logger.warning(f"Schema introspection failed ({e}); using the schema from the migrations")
+            if _schema["block"] is None:
+                schema = expected_schema(normalize=False)
+                _schema.update(schema=schema, block=render_schema(schema), fingerprint=None)
+        finally:
+            if conn is not None:
+                release_connection(cursor, conn)
+        _schema["checked"] = time.monotonic()
+    return _schema
+
+
+def pin_schema(schema):
+    """
+    Use `schema` for every prompt from now on instead of introspecting the
+    database, e.g. the migrations' schema for reproducible offline runs.
+    """
+    with _lock:
+        # "checked" in the infinite future: _refresh never looks again
+        _schema.update(schema=schema, block=render_schema(schema), fingerprint=None, checked=math.inf)
+
+
+def current_schema():
+    """The schema dict behind schema_block(), refreshed on the same schedule."""
+    return _refresh()["schema"]
+
+
+def schema_block(question=None):
+    """
+    The rendered schema: of the whole database, or pruned to `question` when
+    one is given and [llm] schema_pruning is on (the default).
+    """
+    state = _refresh()
+    if not question or not get_setting("llm", "schema_pruning", True):
+        return state["block"]
+    return render_schema(prune_schema(state["schema"], question))
+
+
+def system_prompt(prompt_path, question=None):
+    """The template at `prompt_path` with {schema} filled in (pruned to `question` if given)."""
+    template = load_template(prompt_path)
+    if SCHEMA_PLACEHOLDER not in template:
+        return template
+    return template.replace(SCHEMA_PLACEHOLDER, schema_block(question))
+
+
+# --- Question-aware pruning ---
+# Words people use for a table that its own name does not contain
+TABLE_SYNONYMS = {
+    "Employee": {"employee", "staff", "people", "person", "who", "user", "manager", "pm", "owner", "sponsor", "admin"},
+    "Demand": {"demand", "project", "request", "initiative", "go live", "phase"},
+    "Company": {"company", "client", "sector"},
+    "Vendor": {"vendor", "supplier", "contact person"},
+    "DAB": {"dab", "board", "approval"},
+    "Milestone": {"milestone", "achieved"},
+    "Status": {"status update", "update", "progress"},
+    "Proposal": {"proposal"},
+    "Meeting": {"meeting", "recording", "minutes"},
+    "Issues": {"issue", "problem", "blocker"},
+    "Risk": {"risk"},
+}
+
+# Column-name words too common to point at any one table on their own
+_GENERIC_WORDS = {"id", "name", "date", "description", "status", "notes", "time", "type", "by"}
+
+
+def _stem(word):
+    # Crude suffix stripping, repeated so "meetings" and "Meeting" both end up as "meet"
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix, replacement in (("ies", "y"), ("ing", ""), ("es", "e"), ("s", "")):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[: -len(suffix)] + replacement
+                stripped = True
+                break
+    return word
+
+
+def _words(text):
+    """Stemmed lower-case words; CamelCase identifiers are split (GoLiveDate -> go live date)."""
+    text = re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", text)
+    return [_stem(word) for word in re.findall(r"[a-z0-9]+", text.lower())]
+
+
+def _mentions(question_words, phrase):
+    """True if the words of `phrase` appear consecutively in the question."""
+    words = _words(phrase)
+    n = len(words)
+    return n > 0 and any(question_words[i:i + n] == words for i in range(len(question_words) - n + 1))
+
+
+def enum_values(column_type):
+    """Values of an ENUM(...) or SET(...) column type, as written; [] for other types."""
+    return re.findall(r"'((?:[^']|'')*)'", column_type) if re.match(r"(enum|set)\(", column_type, re.I) else []
+
+
+def _distinctive(column):
+    return [w for w in _words(column) if w not in _GENERIC_WORDS]
+
+
+def _matched_columns(schema, question_words):
+    """{table: {column}} for columns named by the question or holding a value it mentions."""
+    table_words = {tuple(_words(table)) for table in schema}
+    matched = {}
+    for table, spec in schema.items():
+        for column, column_type in spec["columns"].items():
+            if column in spec.get("foreign_keys", {}) or tuple(_words(column)) in table_words:
+                continue  # DemandID, Employee.Company, ... name another table, not this one
+            distinctive = _distinctive(column)
+            named = distinctive and _mentions(question_words, " ".join(distinctive))
+            valued = any(_mentions(question_words, value) for value in enum_values(column_type))
+            if named or valued:
+                matched.setdefault(table, set()).add(column)
+    return matched
+
+
+def _covered(schema, tables, column, column_type):
+    """True if one of `tables` has a column with the same distinctive words or ENUM values."""
+    words, values = set(_distinctive(column)), set(enum_values(column_type))
+    for table in tables:
+        for other, other_type in schema[table]["columns"].items():
+            if (words and words <= set(_words(other))) or values & set(enum_values(other_type)):
+                return True
+    return False
+
+
+def _fk_graph(schema):
+    graph = {table: set() for table in schema}
+    for table, spec in schema.items():
+        for ref_table, _ in spec.get("foreign_keys", {}).values():
+            if ref_table in graph:
+                graph[table].add(ref_table)
+                graph[ref_table].add(table)
+    return graph
+
+
+def _join_path(graph, start, targets):
+    """Shortest list of tables from `start` to any table in `targets` (BFS over foreign keys)."""
+    previous = {start: None}
+    queue = [start]
+    for table in queue:
+        if table in targets:
+            path = []
+            while table is not None:
+                path.append(table)
+                table = previous[table]
+            return path
+        for neighbour in sorted(graph[table]):
+            if neighbour not in previous:
+                previous[neighbour] = table
+                queue.append(neighbour)
+    return [start]
+
+
+def prune_schema(schema, question):
+    """
+    The part of `schema` relevant to `question`.
+
+    Tables are picked when the question names them (or a synonym), and
+    otherwise when it names one of their columns or ENUM values that none of
+    the named tables has. The picks are then joined up along the shortest
+    foreign-key paths; tables pulled in only to join keep just their key and
+    Name columns. A question that matches nothing gets the full schema.
+    """
+    schema = {table: spec for table, spec in schema.items() if table not in INTERNAL_TABLES}
+    question_words = _words(question)
+    named = [
+        table for table in sorted(schema)
+        if _mentions(question_words, table) or any(_mentions(question_words, s) for s in TABLE_SYNONYMS.get(table, ()))
+    ]
+    picked = list(named)
+    for table, columns in sorted(_matched_columns(schema, question_words).items()):
+        covered = all(_covered(schema, named, c, schema[table]["columns"][c]) for c in columns)
+        if table not in picked and not covered:
+            picked.append(table)
+    if not picked:
+        return schema
+
+    graph = _fk_graph(schema)
+    joined = [picked[0]]
+    for table in picked[1:]:
+        for step in _join_path(graph, table, set(joined)):
+            if step not in joined:
+                joined.append(step)
+
+    # Columns other tables point at, so bridge tables keep their join keys
+    referenced = {(t, c) for spec in schema.values() for t, c in spec.get("foreign_keys", {}).values()}
+    pruned = {}
+    for table in joined:
+        spec = schema[table]
+        if table in picked:
+            pruned[table] = spec
+            continue
+        keep = {
+            c for c in spec["columns"]
+            if c in spec.get("foreign_keys", {}) or (table, c) in referenced or c == "Name"
+        }
+        pruned[table] = {
+            "columns": {c: t for c, t in spec["columns"].items() if c in keep},
+            "foreign_keys": {c: ref for c, ref in spec.get("foreign_keys", {}).items() if c in keep},
+        }
+    return pruned
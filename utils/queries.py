@@ -0,0 +1,124 @@
+"""
+Read queries shared by the pages.
+
+The page scripts run Streamlit code at import time, so the SQL behind their
+lists and tables lives here: the pages wrap these functions with their own
+st.error handling, and benchmarks/bench_pages.py times them directly.
+Everything here raises mysql.connector.Error on failure.
+"""
+from datetime import datetime, time, timedelta
+
+from utils import prepared
+from utils.db import fetch_arrow, fetch_dataframe
+
+ALL_DEMANDS_QUERY = """
+    SELECT
+        d.ID,
+        d.Name AS DemandName,
+        d.Description,
+        d.ReceivedDate,
+        d.Status,
+        d.GoLiveDate,
+        d.AbandonmentReason,
+        d.Phase,
+        d.DeliveryDomain,
+        d.ServiceCategory,
+        d.CompanyPriority,
+        d.CompanyValueDescription,
+        d.CompanyValueClassification,
+        d.ImplementationComplexity,
+        d.ImplementationCostEstimate,
+        d.ImplementationDuration,
+
+        c.Name AS Company,
+        pm.Name AS ProjectManager,
+        ow.Name AS Owner,
+        v.Description AS Vendor,
+        dto.Name AS DTOwner
+
+    FROM Demand d
+    LEFT JOIN Company c ON d.CompanyID = c.ID
+    LEFT JOIN Employee pm ON d.ProjectManagerID = pm.ID
+    LEFT JOIN Employee ow ON d.OwnerID = ow.ID
+    LEFT JOIN Vendor v ON d.VendorID = v.ID
+    LEFT JOIN Employee dto ON d.DTOwnerID = dto.ID
+    ORDER BY d.ReceivedDate DESC
+"""
+
+
+def all_demands():
+    """Every demand with its company, people and vendor resolved, as a pyarrow.Table."""
+    return fetch_arrow(ALL_DEMANDS_QUERY)
+
+
+def employee_id(email):
+    """Employee.ID for a login email, or None. Read from the primary: it is written into the rows that follow."""
+    result = prepared.fetch_one("employee_by_email", (email,), read_only=False)
+    return result[0] if result else None
+
+
+# --- Milestones and status updates ---
+def milestones(demand_id):
+    return prepared.fetch_arrow("milestones_by_demand", (demand_id,)).to_pandas()
+
+
+def status_updates(demand_id):
+    return prepared.fetch_arrow("status_updates_by_demand", (demand_id,)).to_pandas()
+
+
+def dab_updates(demand_id):
+    return prepared.fetch_arrow("dab_by_demand", (demand_id,)).to_pandas()
+
+
+def next_available_datetime(demand_id, selected_date, is_milestone=True):
+    """
+    First minute on `selected_date` without a Milestone (or Status) row for the
+    demand; the (DemandID, Date) primary key allows one entry per minute.
+    The day's taken minutes are read in one query rather than probed one by one,
+    on the primary: the INSERT that uses the result goes there, and a lagging
+    replica would hand out a minute that is already taken.
+    """
+    base_dt = datetime.combine(selected_date, time(0, 0))
+    statement = "milestone_times" if is_milestone else "status_times"
+    while True:
+        day_end = datetime.combine(base_dt.date() + timedelta(days=1), time(0, 0))
+        taken = {row[0] for row in prepared.fetch_all(statement, (demand_id, base_dt, day_end), read_only=False)}
+        while base_dt < day_end and base_dt in taken:
+            base_dt += timedelta(minutes=1)
+        if base_dt < day_end:
+            return base_dt
+
+
+# --- Issues and risks ---
+def _raised_items(table, description_column, email, is_admin, order, only_pending):
+    order = "ASC" if str(order).upper() == "ASC" else "DESC"
+    columns = f"""
+        SELECT I.EmployeeID, I.DemandID, I.TimeRaised,
+               E.Name AS EmployeeName, D.Name AS DemandName,
+               I.{description_column}, I.Status, I.ResolutionDescription, I.ResolutionTime
+        FROM {table} I
+        JOIN Employee E ON I.EmployeeID = E.ID
+        JOIN Demand D ON I.DemandID = D.ID
+    """
+    if is_admin:
+        query = f"""{columns}
+            {"WHERE I.Status = 'Pending'" if only_pending else ""}
+            ORDER BY I.TimeRaised {order}
+        """
+        return fetch_dataframe(query)
+    # Project managers only see items on the demands they manage
+    query = f"""{columns}
+        JOIN Employee E2 ON D.ProjectManagerID = E2.ID
+        WHERE E2.Email = %s
+        {"AND I.Status = 'Pending'" if only_pending else ""}
+        ORDER BY I.TimeRaised {order}
+    """
+    return fetch_dataframe(query, (email,))
+
+
+def issues(email, is_admin, order="DESC", only_pending=False):
+    return _raised_items("Issues", "IssueDescription", email, is_admin, order, only_pending)
+
+
+def risks(email, is_admin, order="DESC", only_pending=False):
+    return _raised_items("Risk", "RiskDescription", email, is_admin, order, only_pending)
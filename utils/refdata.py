@@ -0,0 +1,71 @@
+import logging
+
+import mysql.connector
+
+from utils import prepared
+from utils.cache import QueryCache
+from utils.db import get_connection, read_table_versions, release_connection, table_versions
+from utils.sqltext import referenced_tables
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+_cache = QueryCache(
+    name="refdata",
+    maxsize=int(get_setting("db", "refdata_cache_size", 512)),
+    ttl=float(get_setting("db", "refdata_cache_ttl", 3600)),
+)
+
+
+def _load(query, params, tables=None):
+    """
+    Run the lookup on a read-only connection. With `tables`, their version
+    counters are read first on the same connection and returned with the rows:
+    on a lagging replica that records which writes the rows reflect, so the
+    entry is reloaded until the replica has caught up.
+    """
+    conn = cursor = None
+    try:
+        conn = get_connection(read_only=True)
+        cursor = conn.cursor()
+        versions = None
+        if tables is not None:
+            try:
+                versions = read_table_versions(cursor, tables)
+            except mysql.connector.Error as e:
+                logger.warning(f"Could not read versions alongside lookup: {e}")
+        if params:
+            # Role-filtered lists run once per user: reuse one server-side statement
+            rows = prepared.fetch_sql(query, params, conn=conn)
+        else:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        return versions, rows
+    finally:
+        release_connection(cursor, conn)
+
+
+def get_reference_data(query, params=()):
+    """
+    Rows for a rarely-changing lookup list such as "SELECT ID, Name FROM Company".
+
+    Results are cached per (query, params) together with the CacheVersion counters
+    of the tables the query reads; a cached copy is reused until one of those
+    counters moves. Raises mysql.connector.Error like a direct query would.
+    """
+    tables = sorted(referenced_tables(query))
+    key = (query, tuple(params))
+    try:
+        versions = table_versions()
+    except mysql.connector.Error as e:
+        logger.warning(f"Version check failed, loading lookup uncached: {e}")
+        return _load(query, params)[1]
+
+    current = tuple(versions.get(table, 0) for table in tables)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == current:
+        return cached[1]
+
+    loaded_versions, rows = _load(query, params, tables)
+    _cache.put(key, (loaded_versions, rows), tables)
+    return rows
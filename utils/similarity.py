@@ -0,0 +1,240 @@
+"""
+Similarity index over questions the SQL Agent has already answered.
+
+Questions are embedded as TF-IDF vectors of hashed character 3-5-grams
+(NumPy only, fully offline). A new question reuses the stored SQL of its
+nearest neighbour when the cosine similarity reaches
+[sql_agent] similarity_threshold and the two questions agree on every
+specific value and content word: numbers, quoted text, and every word that
+is not in STOPWORDS, so "closed issues" never reuses the SQL for "open
+issues", nor "oldest" the SQL for "newest". Only rewordings that differ in
+filler, word order or plurals are reused.
+
+Entries are kept in the LLM cache's SQLite file, tagged with the hash of the
+system prompt that produced them, so they survive restarts and stop being
+offered when the prompt changes.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from utils import llm_cache, metrics
+from utils.llm import load_system_prompt
+from utils.sqltext import tokenize
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = 4096
+NGRAM_SIZES = (3, 4, 5)
+
+# Words two questions may differ in and still ask the same thing. Everything
+# else (statuses, "oldest", "most", "not", ...) can change the answer, and a
+# single such word barely moves the n-gram score.
+STOPWORDS = {
+    "a", "an", "the", "me", "us", "i", "we", "you", "please", "can", "could", "would", "show", "list", "give",
+    "get", "display", "find", "fetch", "tell", "see", "view", "what", "which", "who", "whose", "that", "there",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "have", "has", "of", "for", "to", "in", "on",
+    "at", "by", "with", "from", "all", "each", "every", "any", "its", "their", "currently", "current",
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS answered_question (
+        question TEXT NOT NULL,
+        prompt_hash TEXT NOT NULL,
+        sql_text TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (question, prompt_hash)
+    )
+"""
+
+
+@dataclass
+class Match:
+    question: str
+    sql: str
+    response: str
+    score: float
+
+
+def _ngram_counts(question):
+    text = f" {llm_cache.normalize_question(question)} "
+    grams = [text[i:i + n] for n in NGRAM_SIZES for i in range(len(text) - n + 1)]
+    if not grams:
+        return np.zeros(DIMENSIONS, dtype=np.float32)
+    buckets = np.fromiter((zlib.crc32(g.encode("utf-8")) % DIMENSIONS for g in grams), dtype=np.int64, count=len(grams))
+    counts = np.bincount(buckets, minlength=DIMENSIONS).astype(np.float32)
+    # Sublinear term frequency: repeated n-grams should not dominate
+    return (counts > 0) + np.log(np.maximum(counts, 1))
+
+
+def _specifics(question):
+    """Values a question pins down: numbers and quoted text."""
+    numbers = set(re.findall(r"\d+(?:\.\d+)?", question))
+    quoted = {q.lower() for pair in re.findall(r"'([^']+)'|\"([^\"]+)\"", question) for q in pair if q}
+    return numbers, quoted
+
+
+def _words(text):
+    """Lowercase words, with "isn't" and friends as "not"."""
+    return ["not" if word.endswith("n't") else word for word in re.findall(r"[a-z0-9]+(?:'[a-z]+)?", text.lower())]
+
+
+def _content_words(words):
+    """The words outside STOPWORDS, plurals folded ("issues" and "issue" are one word)."""
+    return {word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+            for word in words if word not in STOPWORDS}
+
+
+def _mentions(words, literal):
+    """Whether the words of `literal` appear in `words` as a run, not just as part of a longer word."""
+    wanted = _words(literal)
+    return bool(wanted) and any(words[i:i + len(wanted)] == wanted for i in range(len(words) - len(wanted) + 1))
+
+
+def _sql_literals(sql):
+    return {text[1:-1].lower() for kind, text in tokenize(sql) if kind == "string" and len(text) > 2}
+
+
+def _compatible(question, stored_question, stored_sql):
+    if _specifics(question) != _specifics(stored_question):
+        return False
+    asked, stored = _words(question), _words(stored_question)
+    # "Closed issues" must not reuse the SQL for "open issues", however close the n-grams
+    if _content_words(asked) != _content_words(stored):
+        return False
+    # Literals the stored question spelled out (e.g. 'Pending', a company name)
+    # must also be named by the new question, or the SQL answers something else.
+    return all(_mentions(asked, literal) for literal in _sql_literals(stored_sql) if _mentions(stored, literal))
+
+
+class SimilarityIndex:
+    """In-memory TF-IDF matrix over answered questions, rebuilt lazily after changes."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = []  # (question, sql, response)
+        self._counts = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self._vectors = None
+        self._idf = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, question, sql, response):
+        counts = _ngram_counts(question)
+        with self._lock:
+            normalized = llm_cache.normalize_question(question)
+            for i, (existing, _, _) in enumerate(self._entries):
+                if llm_cache.normalize_question(existing) == normalized:
+                    self._entries[i] = (question, sql, response)
+                    return
+            self._entries.append((question, sql, response))
+            self._counts = np.vstack([self._counts, counts])
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+                self._counts = self._counts[-self.max_entries:]
+            self._vectors = None
+
+    def _rebuild(self):
+        documents = len(self._entries)
+        df = np.count_nonzero(self._counts, axis=0)
+        self._idf = (np.log((1 + documents) / (1 + df)) + 1).astype(np.float32)
+        vectors = self._counts * self._idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self._vectors = vectors / np.maximum(norms, 1e-9)
+
+    def nearest(self, question, k=3):
+        """Up to k (score, question, sql, response), best first."""
+        with self._lock:
+            if not self._entries:
+                return []
+            if self._vectors is None:
+                self._rebuild()
+            query = _ngram_counts(question) * self._idf
+            norm = float(np.linalg.norm(query))
+            if norm == 0:
+                return []
+            scores = self._vectors @ (query / norm)
+            best = np.argsort(scores)[::-1][:k]
+            return [(float(scores[i]), *self._entries[i]) for i in best]
+
+
+_index = None
+_index_prompt = None
+_index_lock = threading.Lock()
+
+
+def _current_prompt_hash(prompt_path):
+    return llm_cache.prompt_hash(load_system_prompt(prompt_path))
+
+
+def _get_index(prompt_path):
+    """The index for the current prompt version, loaded from disk on first use or after a prompt change."""
+    global _index, _index_prompt
+    current = _current_prompt_hash(prompt_path)
+    if _index is not None and _index_prompt == current:
+        return _index, current
+    with _index_lock:
+        if _index is None or _index_prompt != current:
+            index = SimilarityIndex(int(get_setting("sql_agent", "similarity_max_entries", 1000)))
+            try:
+                with llm_cache.database() as conn:
+                    conn.execute(SCHEMA)
+                    conn.execute("DELETE FROM answered_question WHERE prompt_hash != ?", (current,))
+                    conn.commit()
+                    rows = conn.execute(
+                        "SELECT question, sql_text, response FROM answered_question WHERE prompt_hash = ? "
+                        "ORDER BY created_at DESC LIMIT ?",
+                        (current, index.max_entries),
+                    ).fetchall()
+                for question, sql, response in reversed(rows):
+                    index.add(question, sql, response)
+                logger.info(f"Loaded {len(index)} answered questions into the similarity index")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not load answered questions: {e}")
+            _index, _index_prompt = index, current
+    return _index, current
+
+
+def find_similar(question, prompt_path="prompts/sql_assistant.txt"):
+    """A reusable earlier answer for `question`, or None."""
+    if not get_setting("sql_agent", "similarity_enabled", True):
+        return None
+    threshold = float(get_setting("sql_agent", "similarity_threshold", 0.75))
+    index, _ = _get_index(prompt_path)
+    for score, stored_question, sql, response in index.nearest(question):
+        if score < threshold:
+            break
+        if _compatible(question, stored_question, sql):
+            metrics.record_cache("similar_question", hit=True)
+            return Match(stored_question, sql, response, score)
+    metrics.record_cache("similar_question", hit=False)
+    return None
+
+
+def remember(question, sql, response, prompt_path="prompts/sql_assistant.txt"):
+    """Record a question whose SQL ran successfully so paraphrases can reuse it."""
+    if not get_setting("sql_agent", "similarity_enabled", True):
+        return
+    index, current = _get_index(prompt_path)
+    index.add(question, sql, response)
+    try:
+        with llm_cache.database() as conn:
+            conn.execute(SCHEMA)
+            conn.execute(
+                "INSERT OR REPLACE INTO answered_question (question, prompt_hash, sql_text, response, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (llm_cache.normalize_question(question), current, sql, response, time.time()),
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not persist answered question: {e}")
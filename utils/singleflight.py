@@ -0,0 +1,60 @@
+"""
+Process-wide coalescing of identical in-flight work.
+
+When several sessions ask for the same thing at the same moment (a question
+shared in a meeting and pasted by a dozen people), only the first caller
+does the work; the others wait for its result instead of hitting the LLM
+endpoint or the database again. Nothing is kept once the call finishes:
+caching is the job of QueryCache and llm_cache.
+
+    flight = SingleFlight("sql")
+    result = flight.do(key, run_query, sql)
+
+Results are shared between callers as-is, so they must not be mutated.
+"""
+import threading
+from concurrent.futures import Future
+
+from utils import metrics
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """
+        (future, leader). The leader must call settle() when done; everyone
+        else waits on future.result().
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                metrics.record_coalesced(self.name)
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def settle(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """fn(*args, **kwargs), or the result of an identical call already in flight."""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, result)
+        return result
@@ -0,0 +1,74 @@
+"""
+Choose which of several SQL Agent answers to run.
+
+Each candidate's SQL is checked with EXPLAIN against the live database (all
+candidates at once, one pooled connection each): queries that do not
+compile, are not plain SELECTs or exceed the [sql_agent] cost limits are
+dropped, and the cheapest remaining plan wins, earlier candidates breaking
+ties. Identical queries are explained once.
+"""
+import logging
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+import mysql.connector
+
+from utils import metrics
+from utils.db import explain_query, plan_problem, run_concurrently
+from utils.helpers import extract_sql_from_response
+from utils.sqltext import is_select, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Candidate:
+    index: int
+    response: str
+    sql: Optional[str]
+    cost: Optional[float] = None
+    problem: Optional[str] = None  # why it was not eligible to run
+
+
+def _check(sql):
+    """(plan summary, problem); the problem is None for a query that may run."""
+    try:
+        summary = explain_query(sql)
+    except mysql.connector.Error as e:
+        return None, f"EXPLAIN failed: {getattr(e, 'msg', None) or e}"
+    return summary, plan_problem(summary)
+
+
+def choose(responses):
+    """
+    Validate every response and return (best, candidates): `best` is the
+    Candidate to run, or None when none passed; `candidates` lists all of
+    them with their cost or the reason they were rejected.
+    """
+    candidates, to_check = [], {}
+    for index, response in enumerate(responses):
+        sql = extract_sql_from_response(response)
+        candidate = Candidate(index, response, sql)
+        if not sql or sql.strip().upper() == "INVALID QUERY":
+            candidate.problem = "no SQL"
+        elif not is_select(sql):
+            candidate.problem = "not a SELECT"
+        else:
+            to_check.setdefault(normalize_sql(sql), sql)
+        candidates.append(candidate)
+
+    checked = run_concurrently({key: (_check, sql) for key, sql in to_check.items()}) if to_check else {}
+    for candidate in candidates:
+        if candidate.problem is None:
+            summary, candidate.problem = checked[normalize_sql(candidate.sql)]
+            if summary is not None:
+                candidate.cost = summary["query_cost"]
+        outcome = "valid" if candidate.problem is None else "no_sql" if candidate.problem == "no SQL" else "rejected"
+        metrics.inc("quokka_sql_candidates_total", outcome=outcome, page=metrics.current_page.get())
+
+    valid = [c for c in candidates if c.problem is None]
+    best = min(valid, key=lambda c: (c.cost if c.cost is not None else math.inf, c.index)) if valid else None
+    if best is None:
+        logger.info(f"No valid SQL among {len(candidates)} candidates")
+    return best, candidates
@@ -0,0 +1,90 @@
+"""
+Automatic repair of SQL Agent queries that MySQL rejected.
+
+The failing query and MySQL's error text go back to the model with
+prompts/sql_repair.txt, and the corrected query is run. This repeats up to
+[sql_agent] repair_attempts times (default 2) and stops early once
+[sql_agent] repair_budget_seconds (default 30) of wall-clock time is spent,
+so a hopeless question costs a bounded amount of extra latency.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from utils import metrics
+from utils.db import run_sql
+from utils.helpers import extract_sql_from_response
+from utils.llm import call_llm
+from utils.sqltext import normalize_sql
+from utils.utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+REPAIR_PROMPT = "prompts/sql_repair.txt"
+
+# run_sql error prefixes for errors a different query could fix (not timeouts or unsafe SQL)
+REPAIRABLE_PREFIXES = ("❌",)
+
+
+@dataclass
+class Attempt:
+    number: int
+    response: str
+    sql: Optional[str]
+    columns: Any = None
+    result: Any = None
+    seconds: float = 0.0
+    outcome: str = "failed"  # fixed | failed | no_sql | unchanged
+
+    @property
+    def ok(self):
+        return self.outcome == "fixed"
+
+
+def repairable(result):
+    """True if a run_sql error message is one the model may be able to fix."""
+    return isinstance(result, str) and result.startswith(REPAIRABLE_PREFIXES)
+
+
+def _request(question, sql, error):
+    return (
+        f"Question: {question}\n\n"
+        f"Query:\n```sql\n{sql}\n```\n\n"
+        f"MySQL error:\n{error.removeprefix('❌').strip()}"
+    )
+
+
+def attempts(question, sql, error, history=None):
+    """
+    Yield one Attempt per repair round until a query runs, the attempts run
+    out or the time budget is spent. The last Attempt yielded is the outcome.
+    """
+    max_attempts = int(get_setting("sql_agent", "repair_attempts", 2))
+    deadline = time.monotonic() + float(get_setting("sql_agent", "repair_budget_seconds", 30))
+    tried = {normalize_sql(sql)}
+    for number in range(1, max_attempts + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 1:
+            logger.info(f"Repair budget spent after {number - 1} attempts")
+            return
+        started = time.perf_counter()
+        response = call_llm(_request(question, sql, error), prompt_path=REPAIR_PROMPT, use_cache=False,
+                            history=history, timeout=remaining)
+        attempt = Attempt(number, response, extract_sql_from_response(response))
+        if not attempt.sql or attempt.sql.strip().upper() == "INVALID QUERY":
+            attempt.outcome = "no_sql"
+        elif normalize_sql(attempt.sql) in tried:
+            attempt.outcome = "unchanged"
+        else:
+            tried.add(normalize_sql(attempt.sql))
+            timeout = min(float(get_setting("sql_agent", "timeout_seconds", 15)), max(1.0, deadline - time.monotonic()))
+            attempt.columns, attempt.result = run_sql(attempt.sql, stream=True, timeout=timeout)
+            attempt.outcome = "fixed" if attempt.columns else "failed"
+        attempt.seconds = time.perf_counter() - started
+        metrics.record_repair_attempt(attempt.seconds, attempt.outcome)
+        logger.info(f"Repair attempt {number}: {attempt.outcome} in {attempt.seconds:.2f}s")
+        yield attempt
+        if attempt.outcome != "failed" or not repairable(attempt.result):
+            return
+        sql, error = attempt.sql, attempt.result
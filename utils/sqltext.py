@@ -0,0 +1,203 @@
+import re
+
+# One token per match: comments, quoted strings/identifiers, numbers, words, operators.
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<hint>/\*\+.*?\*/)
+    | (?P<comment>/\*.*?\*/|--[^\n]*|\#[^\n]*)
+    | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    | (?P<ident>`(?:[^`]|``)*`)
+    | (?P<number>\d+\.\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?)
+    | (?P<word>[A-Za-z_@$][\w$@]*)
+    | (?P<space>\s+)
+    | (?P<op><=>|<=|>=|<>|!=|\|\||&&|:=|\S)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Functions whose result changes between calls; queries using them are never cached.
+VOLATILE_FUNCTIONS = {
+    "now", "curdate", "curtime", "current_date", "current_time", "current_timestamp",
+    "sysdate", "utc_date", "utc_time", "utc_timestamp", "localtime", "localtimestamp",
+    "unix_timestamp", "rand", "uuid", "uuid_short", "connection_id", "last_insert_id",
+}
+
+_FROM_LIST_END = {
+    "where", "group", "order", "having", "limit", "union", "on", "using", "join",
+    "inner", "left", "right", "cross", "straight_join", "natural", "window", "for",
+    "lock", "into",
+}
+
+
+def tokenize(query):
+    """Split SQL into (kind, text) tokens, dropping whitespace and comments."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        tokens.append((kind, match.group()))
+    return tokens
+
+
+def _canonical_string(text):
+    quote = text[0]
+    body = text[1:-1].replace(quote * 2, quote)
+    return "'" + body.replace("'", "''") + "'"
+
+
+def _canonical_number(text):
+    if re.fullmatch(r"\d+", text):
+        return str(int(text))
+    return text.lower()
+
+
+def normalize_sql(query):
+    """
+    Canonical form of a query for use as a cache key: comments and redundant
+    whitespace removed, keywords and identifiers lower-cased, string literals
+    single-quoted and integer literals without leading zeros.
+    """
+    parts = []
+    for kind, text in tokenize(query):
+        if kind == "string":
+            text = _canonical_string(text)
+        elif kind == "number":
+            text = _canonical_number(text)
+        elif kind == "word":
+            text = text.lower()
+        elif kind == "ident":
+            text = text.lower()
+        if parts and text not in (",", ";", ")", ".") and parts[-1] not in ("(", "."):
+            parts.append(" ")
+        parts.append(text)
+    return "".join(parts).rstrip("; ")
+
+
+def _table_name(text):
+    if text.startswith("`"):
+        text = text[1:-1].replace("``", "`")
+    return text.lower()
+
+
+def referenced_tables(query):
+    """Lower-cased names of the tables a query reads (FROM and JOIN targets)."""
+    tokens = tokenize(query)
+    tables = set()
+    in_from = False
+    expect_table = False
+    for i, (kind, text) in enumerate(tokens):
+        lowered = text.lower()
+        if kind == "word" and lowered in ("from", "join", "straight_join"):
+            expect_table = True
+            in_from = lowered == "from"
+            continue
+        if expect_table:
+            expect_table = False
+            if kind in ("word", "ident"):
+                name = text
+                # schema-qualified name: db.table
+                if i + 2 < len(tokens) and tokens[i + 1][1] == "." and tokens[i + 2][0] in ("word", "ident"):
+                    name = tokens[i + 2][1]
+                tables.add(_table_name(name))
+            continue
+        if in_from:
+            if text == ",":
+                expect_table = True
+            elif text in ("(", ")") or (kind == "word" and lowered in _FROM_LIST_END):
+                in_from = False
+    return tables
+
+
+def is_volatile(query):
+    """True when the query calls a function such as NOW() or RAND()."""
+    return any(
+        kind == "word" and text.lower() in VOLATILE_FUNCTIONS
+        for kind, text in tokenize(query)
+    )
+
+
+def _top_level_words(tokens):
+    """Lower-cased word tokens that sit outside any parentheses."""
+    depth = 0
+    for kind, text in tokens:
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word":
+            yield text.lower()
+
+
+def is_select(query):
+    """True for SELECT / WITH ... SELECT statements (optionally parenthesized)."""
+    tokens = tokenize(query)
+    first = next((text.lower() for kind, text in tokens if text != "("), "")
+    return first in ("select", "with")
+
+
+def has_top_level_limit(query):
+    """True when the outermost query already carries a LIMIT clause."""
+    return "limit" in _top_level_words(tokenize(query))
+
+
+def inject_limit(query, limit):
+    """
+    Append LIMIT `limit` to a SELECT whose outer query has none. Other
+    statements and queries that already limit themselves are returned unchanged.
+    """
+    if not is_select(query) or has_top_level_limit(query):
+        return query
+    # Newline first so a trailing "-- comment" cannot swallow the clause
+    return f"{query.strip().rstrip(';').rstrip()}\nLIMIT {int(limit)}"
+
+
+def add_execution_time_hint(query, milliseconds):
+    """
+    Put a /*+ MAX_EXECUTION_TIME(ms) */ optimizer hint on the outermost SELECT,
+    so the limit applies to this statement only and no session state changes.
+    An existing hint comment there gets the hint prepended (MySQL reads one
+    per query block). Other statements are returned unchanged.
+    """
+    if not is_select(query):
+        return query
+    hint = f"MAX_EXECUTION_TIME({int(milliseconds)})"
+    depth, first, target = 0, None, None
+    matches = [m for m in _TOKEN_RE.finditer(query) if m.lastgroup not in ("space", "comment")]
+    for i, match in enumerate(matches):
+        text = match.group()
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif match.lastgroup == "word" and text.lower() == "select":
+            if first is None:
+                first = i
+            if depth == 0:
+                target = i
+                break
+    target = first if target is None else target
+    if target is None:
+        return query
+    select = matches[target]
+    following = matches[target + 1] if target + 1 < len(matches) else None
+    if following is not None and following.lastgroup == "hint":
+        return f"{query[:following.start() + 3]} {hint}{query[following.start() + 3:]}"
+    return f"{query[:select.end()]} /*+ {hint} */{query[select.end():]}"
+
+
+def fingerprint(query):
+    """
+    normalize_sql() with every literal replaced by "?" and IN lists collapsed,
+    so "WHERE ID = 4" and "WHERE ID = 17" share one fingerprint.
+    """
+    parts = []
+    for kind, text in tokenize(query):
+        if kind in ("string", "number"):
+            text = "?"
+        elif parts and parts[-1] == "%" and text == "s":
+            # DB-API "%s" placeholder, split into two tokens by the tokenizer
+            parts[-1] = "?"
+            continue
+        parts.append(text)
+    return re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?+)", normalize_sql(" ".join(parts)))
@@ -12,3 +12,10 @@ def load_css_once(file_name="style.css"):
     if not st.session_state.get("css_loaded"):
         load_css(file_name)
         st.session_state["css_loaded"] = True
+
+def get_setting(section, key, default=None):
+    """Read an optional setting from secrets.toml, falling back to a default."""
+    try:
+        return st.secrets[section][key]
+    except (KeyError, FileNotFoundError):
+        return default